@@ -0,0 +1,173 @@
+"""
+JWT authentication without a user query on every request.
+
+CachedJWTAuthentication keeps the authenticated User in the 'users' cache
+for a short time, keyed by id. authentication.signals drops the entry
+whenever the user is saved or deleted. That covers profile updates,
+password changes and deactivation. With a process-local cache (the
+default) only the process that saved the user drops it; other processes
+serve the old row until the entry times out after USER_CACHE_TIMEOUT.
+
+With settings.JWT_STATELESS_READS enabled, GET/HEAD/OPTIONS requests skip
+the user lookup entirely and are served a User built from the token's
+claims (see tokens.UserClaimsRefreshToken). The claims are as old as the
+access token, so a deactivated user keeps read access until it expires;
+refreshing it reloads the user (serializers.UserClaimsTokenRefreshSerializer).
+
+With settings.JWT_CHECK_ACCESS_REVOCATION enabled, access tokens are also
+checked against the revocation store, and logout revokes the access token
+it was called with.
+
+EventStreamAuthentication also accepts an EventStreamToken in the
+``?stream_token=`` query parameter, for the lead event stream.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .revocation import revocations
+from .tokens import USER_CLAIMS, EventStreamToken
+
+USER_CACHE_ALIAS = 'users'
+
+
+def user_cache_key(user_id):
+    return f'user:{user_id}'
+
+
+def forget_user(user_id):
+    """Drop a cached user so the next request reloads it"""
+    caches[USER_CACHE_ALIAS].delete(user_cache_key(user_id))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication that serves users from a short-lived cache"""
+
+    def authenticate(self, request):
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        if getattr(settings, 'JWT_CHECK_ACCESS_REVOCATION', False) and revocations.is_revoked(
+            validated_token[api_settings.JTI_CLAIM]
+        ):
+            raise InvalidToken(_('Token is blacklisted'))
+        if self.is_stateless(request, validated_token):
+            return self.get_claims_user(validated_token), validated_token
+        return self.get_user(validated_token), validated_token
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views, querying only on a cache miss"""
+        validated_token = self.get_request_token(request)
+        if validated_token is None:
+            return None
+        if getattr(settings, 'JWT_CHECK_ACCESS_REVOCATION', False) and await revocations.ais_revoked(
+            validated_token[api_settings.JTI_CLAIM]
+        ):
+            raise InvalidToken(_('Token is blacklisted'))
+        if self.is_stateless(request, validated_token):
+            return self.get_claims_user(validated_token), validated_token
+        return await self.aget_user(validated_token), validated_token
+
+    def get_request_token(self, request):
+        """The validated token from the Authorization header, if any"""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        return self.get_validated_token(raw_token)
+
+    def get_user(self, validated_token):
+        cache = caches[USER_CACHE_ALIAS]
+        key = user_cache_key(self.get_user_id(validated_token))
+        user = cache.get(key)
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user)
+            return user
+        # Saves clear the cache, but keep the checks the database path makes
+        self.check_user(user, validated_token)
+        return user
+
+    async def aget_user(self, validated_token):
+        cache = caches[USER_CACHE_ALIAS]
+        user_id = self.get_user_id(validated_token)
+        user = await cache.aget(user_cache_key(user_id))
+        if user is None:
+            try:
+                user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+            except self.user_model.DoesNotExist:
+                raise AuthenticationFailed(_('User not found'), code='user_not_found')
+            self.check_user(user, validated_token)
+            await cache.aset(user_cache_key(user_id), user)
+            return user
+        self.check_user(user, validated_token)
+        return user
+
+    @staticmethod
+    def get_user_id(validated_token):
+        try:
+            return validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+    @staticmethod
+    def check_user(user, validated_token):
+        """The checks simplejwt makes on a user loaded from the database"""
+        if not user.is_active:
+            raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        if api_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            api_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed(
+                _("The user's password has been changed."), code='password_changed'
+            )
+
+    @staticmethod
+    def is_stateless(request, validated_token):
+        return (
+            getattr(settings, 'JWT_STATELESS_READS', False)
+            and request.method in SAFE_METHODS
+            # Tokens issued before the claims were added need a lookup
+            and all(claim in validated_token for claim in USER_CLAIMS)
+        )
+
+    def get_claims_user(self, validated_token):
+        """An unsaved User carrying the token's identity claims"""
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        model = get_user_model()
+        user = model(**{
+            api_settings.USER_ID_FIELD: validated_token[api_settings.USER_ID_CLAIM],
+            **{
+                claim: model._meta.get_field(claim).to_python(validated_token[claim])
+                for claim in USER_CLAIMS
+            },
+        })
+        # Behaves as the stored row for lookups such as created_by=request.user
+        user._state.adding = False
+        return user
+
+
+class EventStreamAuthentication(CachedJWTAuthentication):
+    """
+    CachedJWTAuthentication that, without an Authorization header, takes
+    an EventStreamToken from ``?stream_token=``
+    """
+    query_param = 'stream_token'
+
+    def get_request_token(self, request):
+        raw_token = request.GET.get(self.query_param)
+        if raw_token is None or self.get_header(request) is not None:
+            return super().get_request_token(request)
+        try:
+            return EventStreamToken(raw_token)
+        except TokenError as e:
+            raise InvalidToken(e.args[0])
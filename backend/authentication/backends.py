@@ -0,0 +1,32 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+from django.db.models.functions import Upper
+
+
+def users_by_email(email):
+    """
+    Users whose email matches ``email`` case-insensitively.
+
+    Written to match the auth_user_email_ci_uniq index expression and
+    condition so the lookup is a single index probe.
+    """
+    return get_user_model()._default_manager.alias(
+        email_upper=Upper('email')
+    ).filter(email__gt='', email_upper=email.upper())
+
+
+class EmailBackend(ModelBackend):
+    """Authenticate with email and password in one indexed query"""
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        if not email or password is None:
+            return None
+        user = users_by_email(email).first()
+        if user is None:
+            # Run the hasher anyway so unknown emails take as long as
+            # wrong passwords
+            get_user_model()().set_password(password)
+            return None
+        if user.check_password(password) and self.user_can_authenticate(user):
+            return user
+        return None
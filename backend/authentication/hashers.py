@@ -0,0 +1,12 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class ConfiguredPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """
+    PBKDF2 with the work factor from settings.PASSWORD_PBKDF2_ITERATIONS.
+
+    Stored hashes with another iteration count still verify and are
+    rehashed on the user's next successful login.
+    """
+    iterations = getattr(settings, 'PASSWORD_PBKDF2_ITERATIONS', None) or PBKDF2PasswordHasher.iterations
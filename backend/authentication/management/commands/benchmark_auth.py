@@ -0,0 +1,73 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from authentication.serializers import UserLoginSerializer, UserRegistrationSerializer
+from lead_management.testing import QueryCounter
+
+PASSWORD = 'bench-Pass-8421'
+
+
+class Command(BaseCommand):
+    help = 'Measure registrations and logins per second for each password hasher'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=20, help='Registrations and logins per hasher')
+        parser.add_argument(
+            '--hasher', action='append', dest='hashers', metavar='NAME',
+            help=f'Hasher to measure, one of {", ".join(settings.PASSWORD_HASHER_CLASSES)} '
+                 '(may be repeated; default: all that are installed)',
+        )
+
+    def handle(self, *args, users=20, hashers=None, **options):
+        names = hashers or list(settings.PASSWORD_HASHER_CLASSES)
+        unknown = set(names) - set(settings.PASSWORD_HASHER_CLASSES)
+        if unknown:
+            raise CommandError(f'Unknown hasher(s): {", ".join(sorted(unknown))}')
+
+        self.stdout.write(f'{"hasher":<10}{"register/s":>12}{"login/s":>10}{"queries/login":>15}')
+        for name in names:
+            path = settings.PASSWORD_HASHER_CLASSES[name]
+            with override_settings(PASSWORD_HASHERS=[path]):
+                try:
+                    get_hasher().encode('probe', get_hasher().salt())
+                except ValueError as e:
+                    self.stdout.write(f'{name:<10}skipped: {e}')
+                    continue
+                try:
+                    self.stdout.write(self.measure(name, users))
+                finally:
+                    User.objects.filter(username__startswith='auth-benchmark-').delete()
+
+    def measure(self, name, users):
+        emails = [f'auth-benchmark-{name}-{i}@example.com' for i in range(users)]
+
+        started = time.perf_counter()
+        for i, email in enumerate(emails):
+            serializer = UserRegistrationSerializer(data={
+                'username': f'auth-benchmark-{name}-{i}', 'email': email,
+                'password': PASSWORD, 'password_confirm': PASSWORD,
+            })
+            if not serializer.is_valid():
+                raise CommandError(f'Registration failed: {serializer.errors}')
+            serializer.save()
+        registering = time.perf_counter() - started
+
+        queries = QueryCounter()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            for email in emails:
+                serializer = UserLoginSerializer(data={'email': email, 'password': PASSWORD})
+                if not serializer.is_valid():
+                    raise CommandError(f'Login failed: {serializer.errors}')
+            logging_in = time.perf_counter() - started
+
+        return (
+            f'{name:<10}{users / registering:>12.1f}{users / logging_in:>10.1f}'
+            f'{queries.count / users:>15.1f}'
+        )
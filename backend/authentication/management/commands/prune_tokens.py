@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import OutstandingToken
+
+
+class Command(BaseCommand):
+    help = 'Delete expired outstanding and blacklisted tokens in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **options):
+        # Small batches keep each transaction, and the locks it holds, short.
+        # Blacklist rows go with their token through the cascade.
+        now = timezone.now()
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('pk')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                OutstandingToken.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired token(s)'))
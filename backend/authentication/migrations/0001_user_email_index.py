@@ -0,0 +1,39 @@
+from django.db import migrations
+from django.db.models import Count, Q, UniqueConstraint
+from django.db.models.functions import Upper
+
+# Indexes the lookup in authentication.backends.users_by_email. auth_user
+# belongs to django.contrib.auth, so the constraint is not in its model
+# state: a migration that remakes auth_user on SQLite must add it again.
+EMAIL_CONSTRAINT = UniqueConstraint(
+    Upper('email'), condition=Q(email__gt=''), name='auth_user_email_ci_uniq',
+)
+
+
+def add_email_constraint(apps, schema_editor):
+    User = apps.get_model('auth', 'User')
+    duplicates = (
+        User.objects.filter(email__gt='')
+        .values(email_upper=Upper('email'))
+        .annotate(n=Count('id'))
+        .filter(n__gt=1)
+    )
+    if duplicates.exists():
+        emails = ', '.join(row['email_upper'].lower() for row in duplicates[:10])
+        raise RuntimeError(f'Resolve duplicate user emails before migrating: {emails}')
+    schema_editor.add_constraint(User, EMAIL_CONSTRAINT)
+
+
+def remove_email_constraint(apps, schema_editor):
+    schema_editor.remove_constraint(apps.get_model('auth', 'User'), EMAIL_CONSTRAINT)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_email_constraint, remove_email_constraint),
+    ]
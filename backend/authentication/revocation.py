@@ -0,0 +1,83 @@
+"""
+In-memory view of revoked JWTs.
+
+The token_blacklist tables stay the source of truth. Each process keeps
+the jti of every unexpired blacklisted token in a dict. It pulls in rows
+blacklisted elsewhere at most every JWT_REVOCATION_SYNC_INTERVAL seconds,
+so checks cost a dict lookup. Revocations by other processes are seen
+within that interval; 0 syncs on every check. Expired entries are dropped
+from memory on each sync. The prune_tokens command deletes them from the
+database.
+"""
+import threading
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils import timezone
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+# Re-read rows blacklisted this long before the last sync, so rows from
+# transactions that committed late are not missed
+SYNC_OVERLAP = timedelta(seconds=60)
+
+
+class RevocationStore:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._revoked = {}
+        self._synced_at = None
+        self._next_sync = 0.0
+
+    def is_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            self.sync()
+        return jti in self._revoked
+
+    async def ais_revoked(self, jti):
+        if time.monotonic() >= self._next_sync:
+            await sync_to_async(self.sync)()
+        return jti in self._revoked
+
+    def revoke(self, token):
+        """Blacklist ``token`` in the database and in memory"""
+        jti, exp = token[api_settings.JTI_CLAIM], token['exp']
+        outstanding, _ = OutstandingToken.objects.get_or_create(
+            jti=jti,
+            defaults={'token': str(token), 'expires_at': datetime_from_epoch(exp)},
+        )
+        BlacklistedToken.objects.get_or_create(token=outstanding)
+        # sync() iterates the dict under the lock to drop expired entries
+        with self._lock:
+            self._revoked[jti] = exp
+
+    def sync(self):
+        with self._lock:
+            now = timezone.now()
+            rows = BlacklistedToken.objects.filter(token__expires_at__gt=now)
+            if self._synced_at is not None:
+                rows = rows.filter(blacklisted_at__gte=self._synced_at - SYNC_OVERLAP)
+            for jti, expires_at in rows.values_list('token__jti', 'token__expires_at'):
+                self._revoked[jti] = expires_at.timestamp()
+
+            cutoff = now.timestamp()
+            for jti in [jti for jti, exp in self._revoked.items() if exp <= cutoff]:
+                del self._revoked[jti]
+
+            self._synced_at = now
+            interval = getattr(settings, 'JWT_REVOCATION_SYNC_INTERVAL', 5)
+            self._next_sync = time.monotonic() + interval
+
+    def clear(self):
+        """Forget everything and reload from the database on the next check"""
+        with self._lock:
+            self._revoked.clear()
+            self._synced_at = None
+            self._next_sync = 0.0
+
+
+revocations = RevocationStore()
@@ -2,6 +2,13 @@ from rest_framework import serializers
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
 from django.contrib.auth.password_validation import validate_password
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from .authentication import CachedJWTAuthentication
+from .backends import users_by_email
+from .tokens import UserClaimsRefreshToken
 
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
@@ -18,7 +25,7 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return attrs
     
     def validate_email(self, value):
-        if User.objects.filter(email=value).exists():
+        if users_by_email(value).exists():
             raise serializers.ValidationError("A user with this email already exists.")
         return value
     
@@ -37,17 +44,13 @@ class UserLoginSerializer(serializers.Serializer):
         password = attrs.get('password')
         
         if email and password:
-            try:
-                user = User.objects.get(email=email)
-                user = authenticate(username=user.username, password=password)
-                if not user:
-                    raise serializers.ValidationError('Invalid credentials.')
-                if not user.is_active:
-                    raise serializers.ValidationError('User account is disabled.')
-                attrs['user'] = user
-                return attrs
-            except User.DoesNotExist:
+            # One indexed lookup through EmailBackend, which also rejects
+            # inactive users
+            user = authenticate(self.context.get('request'), email=email, password=password)
+            if not user:
                 raise serializers.ValidationError('Invalid credentials.')
+            attrs['user'] = user
+            return attrs
         else:
             raise serializers.ValidationError('Must include email and password.')
 
@@ -56,4 +59,41 @@ class UserSerializer(serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ['id', 'username', 'email', 'first_name', 'last_name', 'date_joined']
-        read_only_fields = ['id', 'username', 'date_joined'] 
\ No newline at end of file
+        read_only_fields = ['id', 'username', 'date_joined'] 
+
+    def validate_email(self, value):
+        users = users_by_email(value)
+        if self.instance is not None:
+            users = users.exclude(pk=self.instance.pk)
+        if users.exists():
+            raise serializers.ValidationError("A user with this email already exists.")
+        return value
+
+
+class UserClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that reloads the user on every refresh.
+
+    Deleted and deactivated users are refused, and the new tokens carry
+    USER_CLAIMS from the current row rather than the old token's.
+    """
+    token_class = UserClaimsRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        user_id = CachedJWTAuthentication.get_user_id(refresh)
+        user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+        if user is None:
+            raise AuthenticationFailed(_('User not found'), code='user_not_found')
+        CachedJWTAuthentication.check_user(user, refresh)
+        refresh.set_user_claims(user)
+
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION:
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
@@ -0,0 +1,12 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import forget_user
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def forget_cached_user(sender, instance, **kwargs):
+    """Profile, password and is_active changes take effect on the next request"""
+    forget_user(instance.pk)
@@ -1,3 +1,262 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from lead_management.metrics import login_attempts, registry
+from lead_management.testing import QueryBudgetMixin
+from leads.models import Lead
+
+from . import urls as auth_urls
+from .authentication import user_cache_key
+from .revocation import revocations
+from .serializers import UserSerializer
+from .tokens import UserClaimsRefreshToken
+
+
+# Password hashing is deliberately slow
+@override_settings(SLOW_REQUEST_MS=5000)
+class CachedJWTAuthenticationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            'cached', 'cached@example.com', 'pass12345', first_name='Ada'
+        )
+
+    def setUp(self):
+        caches['users'].clear()
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_user_is_loaded_once(self):
+        url = reverse('authentication:token-verify')
+        with self.assertNumQueries(1):
+            self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data['data']['user']['username'], 'cached')
+
+    def test_profile_update_is_visible_immediately(self):
+        url = reverse('authentication:profile')
+        self.client.get(url)
+        self.client.patch(url, {'first_name': 'Grace'})
+        self.assertEqual(self.client.get(url).data['data']['first_name'], 'Grace')
+
+    def test_deactivation_and_password_change_take_effect(self):
+        url = reverse('authentication:token-verify')
+        self.client.get(url)
+        self.client.post(
+            reverse('authentication:change-password'),
+            {'old_password': 'pass12345', 'new_password': 'changed12345'},
+        )
+        self.assertIsNone(caches['users'].get(user_cache_key(self.user.pk)))
+        user = User.objects.get(pk=self.user.pk)
+        user.is_active = False
+        user.save()
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_user_and_lead_caches_are_cleared_separately(self):
+        url = reverse('authentication:token-verify')
+        self.client.get(url)
+        caches['leads'].set('kept', 1)
+        caches['leads'].clear()
+        self.assertIsNotNone(caches['users'].get(user_cache_key(self.user.pk)))
+        caches['leads'].set('kept', 1)
+        caches['users'].clear()
+        self.assertEqual(caches['leads'].get('kept'), 1)
+
+    @override_settings(JWT_STATELESS_READS=True)
+    def test_stateless_reads_skip_the_user_query(self):
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('authentication:token-verify'))
+        self.assertEqual(response.data['data']['user'], UserSerializer(self.user).data)
+        Lead.objects.create(
+            name='Mine', phone='+1234567890', email='m@example.com',
+            lead_source='website', created_by=self.user,
+        )
+        response = self.client.get(reverse('leads:lead-list-create'))
+        self.assertEqual(response.data['count'], 1)
+
+
+# Password hashing is deliberately slow
+@override_settings(SLOW_REQUEST_MS=5000)
+class EmailLoginTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('email', 'Email.User@example.com', 'pass12345')
+
+    def login(self, email, password='pass12345'):
+        return self.client.post(
+            reverse('authentication:login'), {'email': email, 'password': password}
+        )
+
+    def test_login_is_one_case_insensitive_query(self):
+        # The user lookup, then recording the outstanding refresh token
+        with self.assertNumQueries(2):
+            response = self.login('email.user@EXAMPLE.com')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['data']['user']['id'], self.user.pk)
+
+    def test_logins_are_counted(self):
+        registry.clear()
+        self.login('email.user@example.com')
+        self.login('email.user@example.com', 'wrong-pass')
+        self.login('nobody@example.com')
+        samples = registry.collect()
+        self.assertEqual(samples[login_attempts.key({'outcome': 'success'})], 1)
+        self.assertEqual(samples[login_attempts.key({'outcome': 'failure'})], 2)
+
+    def test_bad_credentials_and_inactive_users_are_rejected(self):
+        self.assertEqual(self.login('email.user@example.com', 'wrong-pass').status_code, 400)
+        self.assertEqual(self.login('nobody@example.com').status_code, 400)
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login('email.user@example.com').status_code, 400)
+
+    def test_registration_rejects_email_differing_only_in_case(self):
+        response = self.client.post(reverse('authentication:register'), {
+            'username': 'other', 'email': 'EMAIL.USER@example.com',
+            'password': 'Another-pass-91', 'password_confirm': 'Another-pass-91',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data['errors'])
+
+    def test_profile_update_rejects_email_differing_only_in_case(self):
+        other = User.objects.create_user('other', 'other@example.com', 'pass12345')
+        token = UserClaimsRefreshToken.for_user(other).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        url = reverse('authentication:profile')
+        response = self.client.patch(url, {'email': 'EMAIL.USER@example.com'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('email', response.data['errors'])
+        response = self.client.patch(url, {'email': 'OTHER@example.com'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        with override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']):
+            self.user.set_password('pass12345')
+            self.user.save()
+        self.assertEqual(self.login('email.user@example.com').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+
+
+class TokenRevocationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('revoke', 'revoke@example.com', 'pass12345')
+
+    def setUp(self):
+        revocations.clear()
+        self.refresh = UserClaimsRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def refresh_with(self, token):
+        return self.client.post(reverse('authentication:token-refresh'), {'refresh': str(token)})
+
+    def test_logout_revokes_the_refresh_token(self):
+        self.client.post(reverse('authentication:logout'), {'refresh_token': str(self.refresh)})
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_rotated_refresh_token_cannot_be_reused(self):
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('username', UserClaimsRefreshToken(response.data['refresh']).payload)
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 200)
+
+    def test_refresh_reloads_the_user(self):
+        User.objects.filter(pk=self.user.pk).update(first_name='Renamed')
+        response = self.refresh_with(self.refresh)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserClaimsRefreshToken(response.data['refresh'])['first_name'], 'Renamed')
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.refresh_with(response.data['refresh']).status_code, 401)
+
+    def test_refresh_rejects_deleted_users(self):
+        User.objects.filter(pk=self.user.pk).delete()
+        self.assertEqual(self.refresh_with(self.refresh).status_code, 401)
+
+    def test_revocations_from_other_processes_are_synced(self):
+        jti = self.refresh['jti']
+        revocations.is_revoked(jti)
+        # Blacklisted straight in the database, as another process would
+        RefreshToken.blacklist(self.refresh)
+        with self.assertNumQueries(0):
+            self.assertFalse(revocations.is_revoked(jti))
+        revocations.sync()
+        with self.assertNumQueries(0):
+            self.assertTrue(revocations.is_revoked(jti))
+
+    @override_settings(JWT_CHECK_ACCESS_REVOCATION=True)
+    def test_logout_can_revoke_the_access_token(self):
+        url = reverse('authentication:token-verify')
+        self.assertEqual(self.client.get(url).status_code, 200)
+        self.client.post(reverse('authentication:logout'))
+        self.assertEqual(self.client.get(url).status_code, 401)
+
+    def test_prune_tokens_deletes_expired_tokens(self):
+        self.refresh.blacklist()
+        OutstandingToken.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        call_command('prune_tokens', batch_size=1, stdout=StringIO())
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+
+# Password hashing is deliberately slow
+@override_settings(SLOW_REQUEST_MS=5000)
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """Query budgets per authentication endpoint, with a cold user cache"""
+    query_budgets = {
+        'authentication:register': 5,
+        'authentication:login': 3,
+        'authentication:logout': 6,
+        'authentication:token-refresh': 7,
+        'authentication:token-verify': 1,
+        'GET authentication:profile': 1,
+        'PATCH authentication:profile': 2,
+        'authentication:change-password': 3,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'pass12345')
+
+    def setUp(self):
+        revocations.clear()
+        self.refresh = UserClaimsRefreshToken.for_user(self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.refresh.access_token}')
+
+    def test_every_route_has_a_budget(self):
+        names = {f'authentication:{pattern.name}' for pattern in auth_urls.urlpatterns}
+        self.assertEqual(names, {key.split()[-1] for key in self.query_budgets})
+
+    def test_endpoints_stay_within_budget(self):
+        for method, name, data in [
+            ('post', 'register', {
+                'username': 'new', 'email': 'new@example.com',
+                'password': 'Another-pass-91', 'password_confirm': 'Another-pass-91',
+            }),
+            ('post', 'login', {'email': 'budget@example.com', 'password': 'pass12345'}),
+            ('get', 'token-verify', None),
+            ('get', 'profile', None),
+            ('patch', 'profile', {'first_name': 'Ada'}),
+            ('post', 'token-refresh', {'refresh': str(self.refresh)}),
+            ('post', 'change-password', {'old_password': 'pass12345', 'new_password': 'changed12345'}),
+            ('post', 'logout', {'refresh_token': str(UserClaimsRefreshToken.for_user(self.user))}),
+        ]:
+            with self.subTest(method=method, name=name):
+                caches['users'].clear()
+                response = getattr(self.client, method)(reverse(f'authentication:{name}'), data)
+                self.assertLess(response.status_code, 300)
+                self.assertQueryBudget(response)
@@ -0,0 +1,56 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken, Token
+
+from .revocation import revocations
+
+# User fields copied into tokens, enough to render UserSerializer without a
+# query when stateless reads are enabled
+USER_CLAIMS = ('username', 'email', 'first_name', 'last_name', 'date_joined')
+
+
+class UserClaimsRefreshToken(RefreshToken):
+    """
+    Refresh token whose access tokens also carry USER_CLAIMS.
+
+    Blacklist checks go through the in-memory revocation store instead of
+    a query per refresh.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token.set_user_claims(user)
+        return token
+
+    def set_user_claims(self, user):
+        """Copy USER_CLAIMS from ``user``, for the access tokens made from here"""
+        for claim in USER_CLAIMS:
+            value = getattr(user, claim)
+            self[claim] = value.isoformat() if hasattr(value, 'isoformat') else value
+
+    def check_blacklist(self):
+        if revocations.is_revoked(self.payload[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        revocations.revoke(self)
+
+
+class EventStreamToken(Token):
+    """
+    Token that only opens the lead event stream, for LEAD_EVENTS_TOKEN_SECONDS.
+
+    Browsers' EventSource cannot send an Authorization header, so the
+    stream takes this token in its URL, where access logs keep it. Access
+    tokens are never accepted there.
+    """
+    token_type = 'event_stream'
+
+    @property
+    def lifetime(self):
+        return timedelta(seconds=settings.LEAD_EVENTS_TOKEN_SECONDS)
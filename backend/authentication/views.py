@@ -3,10 +3,13 @@ from rest_framework import status, generics
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework_simplejwt.tokens import RefreshToken
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth import authenticate
+from lead_management.metrics import login_attempts
 from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserSerializer
+from .revocation import revocations
+from .tokens import UserClaimsRefreshToken
 
 
 class UserRegistrationView(generics.CreateAPIView):
@@ -23,7 +26,7 @@ class UserRegistrationView(generics.CreateAPIView):
             user = serializer.save()
             
             # Generate JWT tokens
-            refresh = RefreshToken.for_user(user)
+            refresh = UserClaimsRefreshToken.for_user(user)
             access_token = str(refresh.access_token)
             refresh_token = str(refresh)
             
@@ -55,12 +58,13 @@ def login_view(request):
     """
     User login endpoint
     """
-    serializer = UserLoginSerializer(data=request.data)
+    serializer = UserLoginSerializer(data=request.data, context={'request': request})
     if serializer.is_valid():
         user = serializer.validated_data['user']
+        login_attempts.inc(outcome='success')
         
         # Generate JWT tokens
-        refresh = RefreshToken.for_user(user)
+        refresh = UserClaimsRefreshToken.for_user(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
         
@@ -77,6 +81,7 @@ def login_view(request):
             status=status.HTTP_200_OK
         )
     
+    login_attempts.inc(outcome='failure')
     return Response(
         {
             'success': False,
@@ -96,8 +101,10 @@ def logout_view(request):
     try:
         refresh_token = request.data.get('refresh_token')
         if refresh_token:
-            token = RefreshToken(refresh_token)
+            token = UserClaimsRefreshToken(refresh_token)
             token.blacklist()
+        if settings.JWT_CHECK_ACCESS_REVOCATION and request.auth is not None:
+            revocations.revoke(request.auth)
         
         return Response(
             {
@@ -0,0 +1,85 @@
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from authentication.authentication import USER_CACHE_ALIAS, CachedJWTAuthentication
+
+from .routers import replica_reads
+
+# Backends whose entries other server processes cannot see
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def pin_key(user_id):
+    return f'primary-pin:{user_id}'
+
+
+def request_user_id(request):
+    """The user id from the request's JWT, before DRF authenticates it"""
+    try:
+        token = CachedJWTAuthentication().get_request_token(request)
+    except (InvalidToken, TokenError):
+        return None
+    return token.get(api_settings.USER_ID_CLAIM) if token else None
+
+
+def written_by(request, response):
+    """The id of the user whose request just changed data, if any"""
+    user = getattr(request, 'user', None)
+    if request.method in SAFE_METHODS or response.status_code >= 400 or not user:
+        return None
+    return user.pk if user.is_authenticated else None
+
+
+@sync_and_async_middleware
+def replica_routing_middleware(get_response):
+    """
+    Serve safe-method requests from the read replicas.
+
+    A user who has just written reads from the primary for
+    REPLICA_PIN_SECONDS, so they see their own writes despite replica lag.
+    The pins are kept in the users cache, which must be shared by every
+    server process for the next request to see them.
+    """
+    if settings.READ_REPLICAS and settings.CACHES[USER_CACHE_ALIAS]['BACKEND'] in PROCESS_LOCAL_CACHES:
+        raise ImproperlyConfigured(
+            'READ_REPLICAS needs a users cache shared between processes, '
+            'set USER_CACHE_URL or LEAD_CACHE_BACKEND=file'
+        )
+    cache = caches[USER_CACHE_ALIAS]
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            use_replicas = False
+            if settings.READ_REPLICAS and request.method in SAFE_METHODS:
+                user_id = request_user_id(request)
+                use_replicas = user_id is None or not await cache.aget(pin_key(user_id))
+            with replica_reads(use_replicas):
+                response = await get_response(request)
+            user_id = written_by(request, response)
+            if user_id is not None and settings.READ_REPLICAS:
+                await cache.aset(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+    else:
+        def middleware(request):
+            use_replicas = False
+            if settings.READ_REPLICAS and request.method in SAFE_METHODS:
+                user_id = request_user_id(request)
+                use_replicas = user_id is None or not cache.get(pin_key(user_id))
+            with replica_reads(use_replicas):
+                response = get_response(request)
+            user_id = written_by(request, response)
+            if user_id is not None and settings.READ_REPLICAS:
+                cache.set(pin_key(user_id), True, settings.REPLICA_PIN_SECONDS)
+            return response
+
+    return middleware
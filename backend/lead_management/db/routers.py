@@ -0,0 +1,57 @@
+"""
+Read-replica routing.
+
+ReplicaRouter sends reads to the replica picked for the current request,
+which replica_routing_middleware does, at random from
+settings.READ_REPLICAS, for safe-method requests from clients that have
+not written recently. All reads of one request go to the same replica.
+Everything else, including every read made while serving a write, goes to
+the primary ('default').
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+PRIMARY = 'default'
+
+# The alias reads of the current request go to, None for the primary
+_read_alias = ContextVar('read_alias', default=None)
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Route reads made inside the block to one of the replicas (or not)"""
+    token = _read_alias.set(choose_replica() if enabled else None)
+    try:
+        yield
+    finally:
+        _read_alias.reset(token)
+
+
+def is_primary(alias):
+    """Whether ``alias`` points at the primary database, as test mirrors do"""
+    primary, other = connections[PRIMARY].settings_dict, connections[alias].settings_dict
+    return (primary['NAME'], primary['HOST']) == (other['NAME'], other['HOST'])
+
+
+def choose_replica():
+    replicas = [
+        alias for alias in getattr(settings, 'READ_REPLICAS', ()) if not is_primary(alias)
+    ]
+    return random.choice(replicas) if replicas else None
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return _read_alias.get() or PRIMARY
+
+    def db_for_write(self, model, **hints):
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        return True
@@ -0,0 +1,81 @@
+"""
+SQLite backend tuned for concurrent readers and writers.
+
+Extra ``OPTIONS`` on top of Django's sqlite3 backend:
+
+* ``pragmas``: PRAGMAs run on every new connection, e.g. WAL journaling,
+  ``synchronous=NORMAL``, ``busy_timeout``, ``mmap_size``, ``cache_size``.
+* ``transaction_mode``: how atomic blocks begin, e.g. ``IMMEDIATE`` so a
+  transaction takes the write lock (waiting up to busy_timeout) before
+  reading, instead of failing at its first write when another writer got
+  there first.
+* ``lock_retries``: how many times a statement outside a transaction is
+  retried, with backoff, after "database is locked".
+"""
+import random
+import time
+
+from django.db.backends.sqlite3 import base
+
+OPTIONS = ('pragmas', 'transaction_mode', 'lock_retries')
+
+
+def is_lock_error(error):
+    message = str(error)
+    return 'database is locked' in message or 'database table is locked' in message
+
+
+class RetryingCursorWrapper(base.SQLiteCursorWrapper):
+    """Retries statements outside a transaction that hit a lock"""
+    lock_retries = 0
+
+    def execute(self, query, params=None):
+        return self.retry(super().execute, query, params)
+
+    def executemany(self, query, param_list):
+        return self.retry(super().executemany, query, param_list)
+
+    def retry(self, method, *args):
+        attempt = 0
+        while True:
+            try:
+                return method(*args)
+            except base.Database.OperationalError as e:
+                # Inside a transaction the whole transaction has to be
+                # retried, which only the caller can do
+                if (
+                    attempt >= self.lock_retries
+                    or self.connection.in_transaction
+                    or not is_lock_error(e)
+                ):
+                    raise
+            attempt += 1
+            time.sleep(min(0.05 * 2 ** attempt, 1.0) * random.uniform(0.5, 1.5))
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.cursor_class = type('RetryingCursor', (RetryingCursorWrapper,), {
+            'lock_retries': self.settings_dict['OPTIONS'].get('lock_retries', 0),
+        })
+
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        for option in OPTIONS:
+            kwargs.pop(option, None)
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for pragma, value in self.settings_dict['OPTIONS'].get('pragmas', {}).items():
+            conn.execute(f'PRAGMA {pragma} = {value}')
+        return conn
+
+    def create_cursor(self, name=None):
+        return self.connection.cursor(factory=self.cursor_class)
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict['OPTIONS'].get('transaction_mode')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
@@ -0,0 +1,186 @@
+"""
+Per-request SQL, serializer and render timings.
+
+request_metrics_middleware counts the queries each request runs and the
+time spent in the database, building serializer ``.data`` and rendering,
+and reports them in a ``Server-Timing`` header that browser dev tools
+show next to the request. It logs a warning, tagged with the URL name,
+when a request takes longer than SLOW_REQUEST_MS or runs the same SQL
+statement N_PLUS_ONE_QUERIES times or more, the usual sign of a
+relationship loaded row by row.
+
+Queries are seen through an execute wrapper installed on every database
+connection; the request's RequestMetrics is found through a context
+variable, so queries run by async views in worker threads are counted
+too. Streamed response bodies are produced after the middleware returns
+and are not timed.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework import serializers
+
+from .metrics import record_request
+
+logger = logging.getLogger(__name__)
+
+current_metrics = ContextVar('current_metrics', default=None)
+
+
+class RequestMetrics:
+    """What one request spent its time on; durations are in seconds"""
+    __slots__ = ('started', 'route', 'queries', 'db', 'serialize', 'render', 'statements')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.route = None
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.render = 0.0
+        # Executions per SQL statement, before parameters are filled in
+        self.statements = Counter()
+
+    @property
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def repeated_statements(self, threshold):
+        return [(sql, count) for sql, count in self.statements.most_common() if count >= threshold]
+
+    def server_timing(self, total):
+        return ', '.join([
+            f'db;dur={self.db * 1000:.2f};desc="{self.queries} queries"',
+            f'serialize;dur={self.serialize * 1000:.2f}',
+            f'render;dur={self.render * 1000:.2f}',
+            f'total;dur={total * 1000:.2f}',
+        ])
+
+
+def record_query(execute, sql, params, many, context):
+    metrics = current_metrics.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.db += time.perf_counter() - started
+        metrics.queries += 1
+        metrics.statements[sql] += 1
+
+
+def install_query_recorder(connection, **kwargs):
+    # First in the list, so execute_wrapper() blocks opened earlier still
+    # pop their own wrapper on exit
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+connection_created.connect(install_query_recorder)
+
+
+@contextmanager
+def timed(phase):
+    """Add the time spent in the block, less its queries, to ``phase``"""
+    metrics = current_metrics.get()
+    if metrics is None:
+        yield
+        return
+    started, db = time.perf_counter(), metrics.db
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started - (metrics.db - db)
+        setattr(metrics, phase, getattr(metrics, phase) + elapsed)
+
+
+class TimedSerializerMixin:
+    """Count building ``.data`` as serializer time"""
+
+    @property
+    def data(self):
+        with timed('serialize'):
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    """``many=True`` counterpart; set as Meta.list_serializer_class"""
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else request.path
+
+
+def report(request, response, metrics):
+    total = metrics.total
+    metrics.route = view_name(request)
+    record_request(request, response, metrics, total)
+    if settings.SERVER_TIMING:
+        response['Server-Timing'] = metrics.server_timing(total)
+
+    details = {
+        'route': metrics.route,
+        'method': request.method,
+        'status': response.status_code,
+        'duration_ms': round(total * 1000, 2),
+        'queries': metrics.queries,
+        'db_ms': round(metrics.db * 1000, 2),
+        'serialize_ms': round(metrics.serialize * 1000, 2),
+        'render_ms': round(metrics.render * 1000, 2),
+    }
+    if total * 1000 >= settings.SLOW_REQUEST_MS:
+        logger.warning(
+            'Slow request %s %s: %.0f ms, %d queries',
+            request.method, metrics.route, total * 1000, metrics.queries,
+            extra={'event': 'slow_request', **details},
+        )
+    repeated = metrics.repeated_statements(settings.N_PLUS_ONE_QUERIES)
+    if repeated:
+        sql, count = repeated[0]
+        logger.warning(
+            'Possible N+1 queries in %s %s: %d runs of %s',
+            request.method, metrics.route, count, sql,
+            extra={'event': 'n_plus_one', 'statement': sql, 'executions': count, **details},
+        )
+
+
+@sync_and_async_middleware
+def request_metrics_middleware(get_response):
+    """Time each request's queries, serialization and rendering"""
+    # Connections opened before this module was loaded
+    for connection in connections.all(initialized_only=True):
+        install_query_recorder(connection)
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            request.metrics = metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            try:
+                response = await get_response(request)
+            finally:
+                current_metrics.reset(token)
+            report(request, response, metrics)
+            return response
+
+    else:
+        def middleware(request):
+            request.metrics = metrics = RequestMetrics()
+            token = current_metrics.set(metrics)
+            try:
+                response = get_response(request)
+            finally:
+                current_metrics.reset(token)
+            report(request, response, metrics)
+            return response
+
+    return middleware
@@ -0,0 +1,328 @@
+"""
+Prometheus metrics, served in the text exposition format at /metrics.
+
+Requests are recorded by lead_management.instrumentation: latency and
+database time histograms and a status counter, labeled with the URL name
+and method. Logins and lead cache lookups count themselves. Leads per
+status and the cache hit ratio are worked out when scraped.
+
+Each thread adds to its own dict of samples, so recording takes no lock;
+a scrape merges the threads' dicts. The dicts of threads that have ended
+are folded into one, so servers that start a thread per request do not
+pile them up. With several worker processes, as under gunicorn, set
+METRICS_DIR to a directory they share: a background thread in every
+process writes its samples there every METRICS_FLUSH_INTERVAL seconds,
+and once more at exit, and a scrape adds up all the files. Empty the
+directory before the server starts; files of workers that exit are kept,
+so their counts are not lost.
+"""
+import atexit
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+DB_DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Other request methods share the 'other' label, so clients cannot add series
+HTTP_METHODS = frozenset(('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS', 'TRACE', 'CONNECT'))
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        # {thread: its samples}, and the merged samples of ended threads
+        self._shards = {}
+        self._retired = {}
+        self._flushed = None
+        self._flusher_pid = None
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def collector(self, collect):
+        """Register ``collect(samples)``, which yields (name, labels, value) at scrape time"""
+        self.collectors.append(collect)
+        return collect
+
+    def shard(self):
+        """This thread's samples, {(name, label values): value}"""
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._retire_ended_threads()
+                self._shards[threading.current_thread()] = shard
+            return shard
+
+    def _retire_ended_threads(self):
+        # Called with self._lock held. An ended thread's dict no longer changes.
+        for thread in [thread for thread in self._shards if not thread.is_alive()]:
+            self._merge_into(self._retired, self._shards.pop(thread))
+
+    def _merge_into(self, samples, shard):
+        for key, value in shard.copy().items():
+            samples[key] = self.metrics[key[0]].merge(samples.get(key), value)
+
+    def snapshot(self):
+        """This process's samples"""
+        with self._lock:
+            self._retire_ended_threads()
+            samples = {}
+            self._merge_into(samples, self._retired)
+            shards = list(self._shards.values())
+        for shard in shards:
+            self._merge_into(samples, shard)
+        return samples
+
+    def flush(self):
+        """Write this process's samples to METRICS_DIR, when they changed"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        rows = [[name, list(labels), value] for (name, labels), value in self.snapshot().items()]
+        if rows == self._flushed:
+            return
+        Path(directory).mkdir(parents=True, exist_ok=True)
+        # Written aside and renamed, so a scrape never reads half a file
+        handle, path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        with os.fdopen(handle, 'w') as file:
+            json.dump(rows, file)
+        os.replace(path, os.path.join(directory, f'{os.getpid()}.json'))
+        self._flushed = rows
+
+    def start_flusher(self):
+        """Flush every METRICS_FLUSH_INTERVAL seconds from a thread of this process"""
+        # Forked workers do not inherit the thread, so each starts its own
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        threading.Thread(target=self._flush_periodically, name='metrics-flush', daemon=True).start()
+
+    def _flush_periodically(self):
+        while True:
+            time.sleep(settings.METRICS_FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Could not write metrics to %s', settings.METRICS_DIR)
+
+    def collect(self):
+        """The samples of every process, then those of the collectors"""
+        directory = settings.METRICS_DIR
+        if not directory:
+            samples = self.snapshot()
+        else:
+            self.flush()
+            samples = {}
+            for path in Path(directory).glob('*.json'):
+                try:
+                    rows = json.loads(path.read_text())
+                except (OSError, ValueError):
+                    continue
+                for name, labels, value in rows:
+                    metric = self.metrics.get(name)
+                    if metric is not None:
+                        key = (name, tuple(labels))
+                        samples[key] = metric.merge(samples.get(key), value)
+        for collect in self.collectors:
+            for name, labels, value in collect(samples):
+                samples[(name, labels)] = value
+        return samples
+
+    def exposition(self):
+        samples = self.collect()
+        by_metric = {}
+        for (name, labels), value in sorted(samples.items()):
+            by_metric.setdefault(name, []).append((labels, value))
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for labels, value in by_metric.get(metric.name, ()):
+                lines.extend(metric.lines(labels, value))
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self._lock:
+            for shard in self._shards.values():
+                shard.clear()
+            self._retired.clear()
+            self._flushed = None
+
+
+registry = Registry()
+# Samples recorded since the last flush would be lost with the process
+atexit.register(registry.flush)
+
+
+def format_labels(names, values):
+    if not names:
+        return ''
+    pairs = ','.join(f'{name}="{escape(value)}"' for name, value in zip(names, values))
+    return f'{{{pairs}}}'
+
+
+def escape(value):
+    return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=registry):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.registry = registry
+        registry.register(self)
+
+    def key(self, labels):
+        return self.name, tuple(str(labels[name]) for name in self.labelnames)
+
+    def merge(self, total, value):
+        return value if total is None else total + value
+
+    def lines(self, labels, value):
+        return [f'{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}']
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        shard = self.registry.shard()
+        key = self.key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """Set at scrape time by a collector"""
+    type = 'gauge'
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS, registry=registry):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        shard = self.registry.shard()
+        key = self.key(labels)
+        # A count per bucket, the +Inf bucket, then the sum and the count
+        counts = shard.get(key)
+        if counts is None:
+            counts = shard[key] = [0] * (len(self.buckets) + 3)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def merge(self, total, value):
+        if total is None:
+            return list(value)
+        return [a + b for a, b in zip(total, value)]
+
+    def lines(self, labels, value):
+        names = self.labelnames + ('le',)
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float('inf'),), value):
+            cumulative += count
+            lines.append(
+                f'{self.name}_bucket{format_labels(names, labels + (format_value(bound),))} {cumulative}'
+            )
+        label_text = format_labels(self.labelnames, labels)
+        lines.append(f'{self.name}_sum{label_text} {format_value(value[-2])}')
+        lines.append(f'{self.name}_count{label_text} {value[-1]}')
+        return lines
+
+
+request_duration = Histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by URL name and method.',
+    ['route', 'method'],
+)
+responses = Counter(
+    'http_responses_total', 'Responses by URL name, method and status code.',
+    ['route', 'method', 'status'],
+)
+db_queries = Histogram(
+    'db_queries_per_request', 'SQL queries run per request, by URL name.',
+    ['route'], buckets=QUERY_COUNT_BUCKETS,
+)
+db_duration = Histogram(
+    'db_query_duration_seconds', 'Time spent in SQL queries per request, by URL name.',
+    ['route'], buckets=DB_DURATION_BUCKETS,
+)
+login_attempts = Counter('login_attempts_total', 'Logins by outcome: success or failure.', ['outcome'])
+lead_cache_requests = Counter(
+    'lead_cache_requests_total', 'Lead response cache lookups by result: hit or miss.', ['result'],
+)
+lead_cache_hit_ratio = Gauge('lead_cache_hit_ratio', 'Share of lead response cache lookups that hit.')
+leads = Gauge('leads', 'Leads by status.', ['status'])
+
+
+def record_request(request, response, metrics, duration):
+    """Record a finished request from its RequestMetrics"""
+    # Unresolved paths share one label, so scanners cannot add series
+    route = metrics.route if getattr(request, 'resolver_match', None) else 'unmatched'
+    method = request.method if request.method in HTTP_METHODS else 'other'
+    request_duration.observe(duration, route=route, method=method)
+    responses.inc(route=route, method=method, status=response.status_code)
+    db_queries.observe(metrics.queries, route=route)
+    db_duration.observe(metrics.db, route=route)
+    if settings.METRICS_DIR:
+        registry.start_flusher()
+
+
+@registry.collector
+def collect_cache_hit_ratio(samples):
+    hits = samples.get((lead_cache_requests.name, ('hit',)), 0)
+    misses = samples.get((lead_cache_requests.name, ('miss',)), 0)
+    yield lead_cache_hit_ratio.name, (), hits / (hits + misses) if hits + misses else 0.0
+
+
+@registry.collector
+def collect_leads(samples):
+    # Summed from the per-user counters, in one query, rather than counted
+    # from the leads table
+    from django.db.models import IntegerField, Sum
+    from django.db.models.fields.json import KT
+    from django.db.models.functions import Cast
+
+    from leads.models import Lead, LeadCounter
+
+    totals = LeadCounter.objects.aggregate(**{
+        key: Sum(Cast(KT(f'by_status__{key}'), IntegerField()))
+        for key, label in Lead.STATUS_CHOICES
+    })
+    for status, count in totals.items():
+        yield leads.name, (status,), count or 0
@@ -0,0 +1,289 @@
+"""
+On-demand profiling of single requests, for staff users.
+
+With REQUEST_PROFILING on, a request sent with an ``X-Profile`` header or
+a ``?profile=`` query parameter by a staff user is run under a profiler:
+
+* ``1`` stores the profile in REQUEST_PROFILE_DIR, with a JSON summary of
+  the request and its hottest functions, and names it in the
+  ``X-Profile-Id`` response header. ``manage.py request_profiles`` lists
+  and summarizes the stored profiles.
+* ``download`` returns the profile as an attachment instead of the
+  response.
+
+pyinstrument, a sampling profiler, is used when it is installed and
+REQUEST_PROFILER allows it; its profiles download as HTML. Otherwise
+cProfile records every call; its ``.prof`` files open in pstats or
+snakeviz. cProfile only sees the thread it runs on, so in async views the
+ORM calls made in worker threads show as time spent waiting.
+
+One request per process is profiled at a time. Requests on one event
+loop share its thread, so concurrent profiles would record each other;
+a request asking while another is being profiled is served unprofiled,
+with an ``X-Profile-Skipped`` header.
+
+With REQUEST_PROFILING off the middleware is not installed at all.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.utils.decorators import sync_and_async_middleware
+from rest_framework.exceptions import APIException
+
+from authentication.authentication import CachedJWTAuthentication
+
+try:
+    import pyinstrument
+except ImportError:
+    pyinstrument = None
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_PARAM = 'profile'
+MODES = {'1': 'store', 'true': 'store', 'store': 'store', 'download': 'download'}
+HOT_FUNCTIONS = 20
+
+# Held while a request is being profiled
+_profiling = threading.Lock()
+
+
+def short_path(filename):
+    """``filename`` relative to the sys.path entry it was imported from"""
+    for prefix in sorted((path for path in sys.path if path), key=len, reverse=True):
+        if filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:]
+    return filename
+
+
+class CProfiler:
+    name = 'cprofile'
+    extension = '.prof'
+    content_type = 'application/octet-stream'
+
+    def __init__(self):
+        self.profile = cProfile.Profile()
+
+    def start(self):
+        self.profile.enable()
+
+    def stop(self):
+        self.profile.disable()
+
+    def hot_functions(self, limit=HOT_FUNCTIONS):
+        """The functions with the most time spent in their own code"""
+        stats = pstats.Stats(self.profile).stats
+        rows = sorted(stats.items(), key=lambda item: item[1][2], reverse=True)[:limit]
+        return [
+            {
+                'function': f'{short_path(filename)}:{line}({name})',
+                'calls': calls,
+                'self_ms': round(self_time * 1000, 3),
+                'cumulative_ms': round(cumulative * 1000, 3),
+            }
+            for (filename, line, name), (primitive, calls, self_time, cumulative, callers) in rows
+        ]
+
+    def save(self, path):
+        self.profile.dump_stats(path)
+
+    def artifact(self):
+        path = Path(settings.REQUEST_PROFILE_DIR) / f'.{uuid.uuid4().hex}{self.extension}'
+        path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            self.save(path)
+            return path.read_bytes()
+        finally:
+            path.unlink(missing_ok=True)
+
+
+class SamplingProfiler:
+    name = 'pyinstrument'
+    extension = '.pyisession'
+    content_type = 'text/html'
+
+    def __init__(self):
+        self.profiler = pyinstrument.Profiler(async_mode='enabled')
+        self.session = None
+
+    def start(self):
+        self.profiler.start()
+
+    def stop(self):
+        self.session = self.profiler.stop()
+
+    def hot_functions(self, limit=HOT_FUNCTIONS):
+        totals = {}
+        frames = [self.session.root_frame()]
+        while frames:
+            frame = frames.pop()
+            if frame is None:
+                continue
+            key = f'{frame.file_path_short}:{frame.line_no}({frame.function})'
+            totals[key] = totals.get(key, 0) + frame.self_time
+            frames.extend(frame.children)
+        rows = sorted(totals.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{'function': key, 'self_ms': round(seconds * 1000, 3)} for key, seconds in rows]
+
+    def save(self, path):
+        self.session.save(path)
+
+    def artifact(self):
+        return self.profiler.output_html().encode()
+
+
+def make_profiler():
+    if pyinstrument is not None and settings.REQUEST_PROFILER in ('auto', 'pyinstrument'):
+        return SamplingProfiler()
+    return CProfiler()
+
+
+def profile_mode(request):
+    """'store', 'download' or None, as the request asks"""
+    value = request.headers.get(PROFILE_HEADER) or request.GET.get(PROFILE_PARAM)
+    return MODES.get(value.lower()) if value else None
+
+
+def is_staff(user):
+    return user is not None and user.is_active and user.is_staff
+
+
+def request_user(request):
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return None
+    return result[0] if result else None
+
+
+async def arequest_user(request):
+    try:
+        result = await CachedJWTAuthentication().aauthenticate(request)
+    except APIException:
+        return None
+    return result[0] if result else None
+
+
+def finish(request, response, profiler, mode, duration):
+    if mode == 'download':
+        return download_response(profiler)
+
+    profile_id = f'{time.strftime("%Y%m%dT%H%M%S")}-{uuid.uuid4().hex[:8]}'
+    directory = Path(settings.REQUEST_PROFILE_DIR)
+    directory.mkdir(parents=True, exist_ok=True)
+    profiler.save(directory / f'{profile_id}{profiler.extension}')
+    match = request.resolver_match
+    summary = {
+        'id': profile_id,
+        'profiler': profiler.name,
+        'file': f'{profile_id}{profiler.extension}',
+        'created_at': time.time(),
+        'method': request.method,
+        'path': request.get_full_path(),
+        'route': match.view_name if match else None,
+        'status': response.status_code,
+        'duration_ms': round(duration * 1000, 3),
+        'user_id': request.profiled_by.pk,
+        'hot_functions': profiler.hot_functions(),
+    }
+    (directory / f'{profile_id}.json').write_text(json.dumps(summary, indent=2))
+    response[f'{PROFILE_HEADER}-Id'] = profile_id
+    return response
+
+
+def skipped(response):
+    response[f'{PROFILE_HEADER}-Skipped'] = 'another request is being profiled'
+    return response
+
+
+def download_response(profiler):
+    extension = '.html' if profiler.content_type == 'text/html' else profiler.extension
+    response = HttpResponse(profiler.artifact(), content_type=profiler.content_type)
+    response['Content-Disposition'] = f'attachment; filename="profile-{uuid.uuid4().hex[:8]}{extension}"'
+    return response
+
+
+@sync_and_async_middleware
+def profiling_middleware(get_response):
+    """Profile requests from staff users that ask for it"""
+    if not settings.REQUEST_PROFILING:
+        raise MiddlewareNotUsed
+
+    if iscoroutinefunction(get_response):
+        async def middleware(request):
+            mode = profile_mode(request)
+            if mode is None:
+                return await get_response(request)
+            user = await arequest_user(request)
+            if not is_staff(user):
+                return await get_response(request)
+            if not _profiling.acquire(blocking=False):
+                return skipped(await get_response(request))
+            try:
+                request.profiled_by = user
+                profiler = make_profiler()
+                started = time.perf_counter()
+                profiler.start()
+                try:
+                    response = await get_response(request)
+                finally:
+                    profiler.stop()
+            finally:
+                _profiling.release()
+            return finish(request, response, profiler, mode, time.perf_counter() - started)
+
+    else:
+        def middleware(request):
+            mode = profile_mode(request)
+            if mode is None:
+                return get_response(request)
+            user = request_user(request)
+            if not is_staff(user):
+                return get_response(request)
+            if not _profiling.acquire(blocking=False):
+                return skipped(get_response(request))
+            try:
+                request.profiled_by = user
+                profiler = make_profiler()
+                started = time.perf_counter()
+                profiler.start()
+                try:
+                    response = get_response(request)
+                finally:
+                    profiler.stop()
+            finally:
+                _profiling.release()
+            return finish(request, response, profiler, mode, time.perf_counter() - started)
+
+    return middleware
+
+
+def stored_profiles(directory=None):
+    """The stored profile summaries, newest first"""
+    directory = Path(directory or settings.REQUEST_PROFILE_DIR)
+    if not directory.is_dir():
+        return []
+    summaries = []
+    for path in directory.glob('*.json'):
+        try:
+            summaries.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return sorted(summaries, key=lambda summary: summary['created_at'], reverse=True)
+
+
+def print_stats(path, sort='cumulative', limit=HOT_FUNCTIONS):
+    """pstats' report of a stored cProfile profile, as text"""
+    out = io.StringIO()
+    pstats.Stats(str(path), stream=out).strip_dirs().sort_stats(sort).print_stats(limit)
+    return out.getvalue()
@@ -0,0 +1,39 @@
+"""
+JSON renderer backed by orjson, falling back to DRF's stdlib renderer.
+
+orjson encodes datetimes, dates, UUIDs and dataclasses in C. Anything it
+does not know, such as Decimal and lazy translation strings, goes through
+DRF's JSONEncoder.default, so output matches the stock renderer.
+"""
+from rest_framework.renderers import JSONRenderer
+
+from .instrumentation import timed
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        with timed('render'):
+            return self.encode(data, accepted_media_type, renderer_context)
+
+    def encode(self, data, accepted_media_type, renderer_context):
+        if orjson is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if data is None:
+            return b''
+
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_UTC_Z
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            option |= orjson.OPT_INDENT_2
+
+        ret = orjson.dumps(data, default=self.encoder_class().default, option=option)
+
+        # Keep the output a strict JavaScript subset, as JSONRenderer does
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
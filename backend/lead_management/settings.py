@@ -12,7 +12,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 from datetime import timedelta
-from decouple import config
+from decouple import Csv, config
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     # Third party apps
     'rest_framework',
     'rest_framework_simplejwt',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     
     # Local apps
@@ -51,10 +52,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'lead_management.instrumentation.request_metrics_middleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Inside CorsMiddleware, so downloaded profiles get CORS headers too
+    'lead_management.profiling.profiling_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'lead_management.db.middleware.replica_routing_middleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -85,14 +90,203 @@ WSGI_APPLICATION = 'lead_management.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+DATABASE_ENGINE = config('DATABASE_ENGINE', default='sqlite')
+# Seconds a connection is reused across requests (0: one per request)
+DB_CONN_MAX_AGE = config('DB_CONN_MAX_AGE', default=600, cast=int)
+
+if DATABASE_ENGINE == 'postgresql':
+    # Persistent connections, one per worker thread, checked before reuse.
+    # Put PgBouncer in front to share a pool across processes.
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': config('DB_NAME', default='lead_management'),
+            'USER': config('DB_USER', default=''),
+            'PASSWORD': config('DB_PASSWORD', default=''),
+            'HOST': config('DB_HOST', default=''),
+            'PORT': config('DB_PORT', default=''),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
+        }
+    }
+else:
+    # See lead_management/db/sqlite3/base.py for the extra OPTIONS
+    DATABASES = {
+        'default': {
+            'ENGINE': 'lead_management.db.sqlite3',
+            'NAME': config('DB_NAME', default=str(BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+                'lock_retries': config('DB_LOCK_RETRIES', default=5, cast=int),
+                'pragmas': {
+                    'journal_mode': 'WAL',
+                    'synchronous': 'NORMAL',
+                    'busy_timeout': config('DB_BUSY_TIMEOUT_MS', default=5000, cast=int),
+                    'mmap_size': 256 * 1024 * 1024,
+                    'cache_size': -64 * 1024,  # KiB
+                    'temp_store': 'MEMORY',
+                },
+            },
+        }
+    }
+
+
+# Read replicas: SQLite file paths or PostgreSQL hosts, comma separated. A copy
+# of db.sqlite3 works as a local stand-in. Safe-method requests read from a
+# replica unless their user wrote within the last REPLICA_PIN_SECONDS. Those
+# pins live in the 'users' cache, which must then be shared by all server
+# processes (USER_CACHE_URL or LEAD_CACHE_BACKEND=file).
+DB_REPLICAS = config('DB_REPLICAS', default='', cast=Csv())
+READ_REPLICAS = []
+for index, replica in enumerate(DB_REPLICAS):
+    alias = f'replica{index}'
+    location = {'HOST': replica} if DATABASE_ENGINE == 'postgresql' else {'NAME': replica}
+    # Tests read the primary test database through every replica alias
+    DATABASES[alias] = {**DATABASES['default'], **location, 'TEST': {'MIRROR': 'default'}}
+    READ_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ['lead_management.db.routers.ReplicaRouter']
+REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+
+
+# Serve the lead read and status endpoints from async views (leads/async_views.py)
+# under an ASGI server. Django 4.2's async ORM runs queries one at a time on a
+# shared thread, so compare with `manage.py load_test` before enabling.
+LEAD_ASYNC_VIEWS = config('LEAD_ASYNC_VIEWS', default=False, cast=bool)
+
+# Live lead events (leads/events.py), streamed from /api/leads/events/. The
+# stream needs an ASGI server; under WSGI it only replays missed events.
+# Set LEAD_EVENTS_REDIS_URL to share events between server processes.
+LEAD_EVENTS_REDIS_URL = config('LEAD_EVENTS_REDIS_URL', default='')
+LEAD_EVENTS_HISTORY = config('LEAD_EVENTS_HISTORY', default=100, cast=int)
+LEAD_EVENTS_HISTORY_USERS = config('LEAD_EVENTS_HISTORY_USERS', default=10000, cast=int)
+LEAD_EVENTS_QUEUE_SIZE = config('LEAD_EVENTS_QUEUE_SIZE', default=100, cast=int)
+LEAD_EVENTS_HEARTBEAT = config('LEAD_EVENTS_HEARTBEAT', default=15, cast=float)
+LEAD_EVENTS_MAX_AGE = config('LEAD_EVENTS_MAX_AGE', default=300, cast=float)
+LEAD_EVENTS_RETRY_MS = config('LEAD_EVENTS_RETRY_MS', default=3000, cast=int)
+# Lifetime of the ?stream_token= tokens from /api/leads/events/token/
+LEAD_EVENTS_TOKEN_SECONDS = config('LEAD_EVENTS_TOKEN_SECONDS', default=60, cast=int)
+
+# Incremental sync with ?updated_since= (leads/delta.py). Rows changed this
+# many seconds before the newest cursor are resent, in case their transaction
+# committed late. Deleted-lead markers are kept LEAD_TOMBSTONE_RETENTION_DAYS
+# (see the prune_tombstones command); older cursors must refetch everything.
+LEAD_SYNC_OVERLAP = config('LEAD_SYNC_OVERLAP', default=5, cast=float)
+LEAD_TOMBSTONE_RETENTION_DAYS = config('LEAD_TOMBSTONE_RETENTION_DAYS', default=30, cast=int)
+
+# Request timings (lead_management/instrumentation.py): a Server-Timing header
+# with DB, serializer and render time, and warnings in the
+# lead_management.instrumentation log for requests slower than SLOW_REQUEST_MS
+# or running one SQL statement N_PLUS_ONE_QUERIES times or more
+SERVER_TIMING = config('SERVER_TIMING', default=True, cast=bool)
+SLOW_REQUEST_MS = config('SLOW_REQUEST_MS', default=500, cast=float)
+N_PLUS_ONE_QUERIES = config('N_PLUS_ONE_QUERIES', default=10, cast=int)
+
+# Staff-only request profiling (lead_management/profiling.py): send
+# X-Profile: 1 or ?profile=1 to store a profile in REQUEST_PROFILE_DIR (see
+# `manage.py request_profiles`), or ?profile=download to get it back instead
+# of the response. REQUEST_PROFILER: auto (pyinstrument when installed),
+# pyinstrument or cprofile.
+REQUEST_PROFILING = config('REQUEST_PROFILING', default=False, cast=bool)
+REQUEST_PROFILE_DIR = config('REQUEST_PROFILE_DIR', default=str(BASE_DIR / '.profiles'))
+REQUEST_PROFILER = config('REQUEST_PROFILER', default='auto')
+
+# Prometheus metrics at /metrics (lead_management/metrics.py). With several
+# worker processes set METRICS_DIR to a directory they share, emptied before
+# the server starts; each process writes its samples there every
+# METRICS_FLUSH_INTERVAL seconds. The scraper must send METRICS_TOKEN as a
+# bearer token; without a token /metrics is only served with DEBUG on.
+METRICS_DIR = config('METRICS_DIR', default='')
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=1, cast=float)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# The 'leads' cache holds rendered lead list/dashboard data (see
+# leads/caching.py). It is an LRU-bounded local-memory cache by default;
+# set LEAD_CACHE_BACKEND=file or LEAD_CACHE_URL=redis://... to change it.
+# The 'users' cache (authentication/authentication.py) uses the same
+# kind of backend in a location of its own, so clearing or culling one
+# never touches the other; give it USER_CACHE_URL with a different Redis
+# database when LEAD_CACHE_URL is set. A process-local 'users' cache is
+# only invalidated in the process that saved the user; the others keep
+# serving the old row for up to USER_CACHE_TIMEOUT seconds, so use a shared
+# backend when a deactivation must take effect at once.
+
+LEAD_CACHE_BACKEND = config('LEAD_CACHE_BACKEND', default='locmem')
+
+
+def cache_location(name, prefix):
+    """Backend and location of a cache, from the ``<prefix>_CACHE_*`` variables"""
+    url = config(f'{prefix}_CACHE_URL', default='')
+    max_entries = config(f'{prefix}_CACHE_MAX_ENTRIES', default=5000, cast=int)
+    if url:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': url,
+        }
+    if LEAD_CACHE_BACKEND == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': config(f'{prefix}_CACHE_DIR', default=str(BASE_DIR / '.cache' / name)),
+            'OPTIONS': {'MAX_ENTRIES': max_entries},
+        }
+    return {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': name,
+        # LocMemCache evicts least recently used entries once full
+        'OPTIONS': {'MAX_ENTRIES': max_entries, 'CULL_FREQUENCY': 10},
     }
+
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'leads': {
+        **cache_location('leads', 'LEAD'),
+        'TIMEOUT': config('LEAD_CACHE_TIMEOUT', default=300, cast=int),
+        'KEY_PREFIX': 'leads',
+    },
+    # Authenticated users, see authentication/authentication.py
+    'users': {
+        **cache_location('users', 'USER'),
+        'TIMEOUT': config('USER_CACHE_TIMEOUT', default=60, cast=int),
+        'KEY_PREFIX': 'users',
+    },
 }
 
 
+# Authentication
+# https://docs.djangoproject.com/en/4.2/topics/auth/passwords/
+
+AUTHENTICATION_BACKENDS = [
+    'authentication.backends.EmailBackend',
+    'django.contrib.auth.backends.ModelBackend',
+]
+
+# The first hasher hashes new passwords; the rest only verify existing
+# hashes, which are rehashed with the first on the next successful login.
+# argon2 and bcrypt need the argon2-cffi / bcrypt packages.
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+PASSWORD_PBKDF2_ITERATIONS = config('PASSWORD_PBKDF2_ITERATIONS', default=0, cast=int)
+PASSWORD_HASHER_CLASSES = {
+    'pbkdf2': 'authentication.hashers.ConfiguredPBKDF2PasswordHasher',
+    'argon2': 'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'bcrypt': 'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'scrypt': 'django.contrib.auth.hashers.ScryptPasswordHasher',
+}
+PASSWORD_HASHERS = [PASSWORD_HASHER_CLASSES[PASSWORD_HASHER]] + [
+    path for name, path in PASSWORD_HASHER_CLASSES.items() if name != PASSWORD_HASHER
+] + ['django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher']
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -137,19 +331,36 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'authentication.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
     ],
     'DEFAULT_RENDERER_CLASSES': [
-        'rest_framework.renderers.JSONRenderer',
+        'lead_management.renderers.FastJSONRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'lead_management.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20
 }
 
 # JWT Settings
+# Serve GET/HEAD/OPTIONS requests from the access token's claims alone,
+# without loading the user. Reads then see profile changes and deactivation
+# only once the access token is refreshed, which reloads the user and is
+# refused to inactive ones: up to ACCESS_TOKEN_LIFETIME late.
+JWT_STATELESS_READS = config('JWT_STATELESS_READS', default=False, cast=bool)
+
+# Revoked tokens are checked in memory (authentication/revocation.py); other
+# processes' revocations are picked up within this many seconds
+JWT_REVOCATION_SYNC_INTERVAL = config('JWT_REVOCATION_SYNC_INTERVAL', default=5, cast=float)
+# Also reject revoked access tokens, and revoke the access token on logout
+JWT_CHECK_ACCESS_REVOCATION = config('JWT_CHECK_ACCESS_REVOCATION', default=False, cast=bool)
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
@@ -174,6 +385,7 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'authentication.serializers.UserClaimsTokenRefreshSerializer',
 
     'JTI_CLAIM': 'jti',
 
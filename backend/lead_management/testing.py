@@ -0,0 +1,42 @@
+"""Test and benchmark helpers shared by the apps."""
+
+
+class QueryBudgetMixin:
+    """
+    Check requests against a per-endpoint query budget.
+
+    ``query_budgets`` maps URL names, or a method and URL name such as
+    ``'GET leads:lead-detail'``, to the most queries one request to that
+    endpoint may run. Budgets are upper bounds, so caching and other
+    savings do not break them, while a query added per row does.
+    """
+    query_budgets = {}
+
+    def assertQueryBudget(self, response, budget=None):
+        request = getattr(response, 'wsgi_request', None) or response.asgi_request
+        metrics = request.metrics
+        if budget is None:
+            budget = self.query_budgets.get(
+                f'{request.method} {metrics.route}', self.query_budgets.get(metrics.route)
+            )
+            if budget is None:
+                self.fail(f'No query budget for {request.method} {metrics.route}')
+        if metrics.queries > budget:
+            statements = '\n'.join(
+                f'{count} x {sql}' for sql, count in metrics.statements.most_common()
+            )
+            self.fail(
+                f'{request.method} {metrics.route} ran {metrics.queries} queries, '
+                f'over its budget of {budget}:\n{statements}'
+            )
+
+
+class QueryCounter:
+    """Database execute wrapper that counts the queries it sees"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
@@ -14,9 +14,15 @@ Including another URLconf
     1. Import the include() function: from django.urls import include, path
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
+import hmac
+
+from django.conf import settings
 from django.contrib import admin
 from django.urls import path, include
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET
+
+from .metrics import CONTENT_TYPE, registry
 
 def api_root(request):
     """API root endpoint"""
@@ -30,7 +36,25 @@ def api_root(request):
         }
     })
 
+@require_GET
+def metrics(request):
+    """
+    Prometheus scrape endpoint, see lead_management/metrics.py
+
+    Requires the METRICS_TOKEN bearer token; without one set it is only
+    served with DEBUG on.
+    """
+    if not settings.METRICS_TOKEN:
+        if not settings.DEBUG:
+            return HttpResponse(status=403)
+    elif not hmac.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {settings.METRICS_TOKEN}'
+    ):
+        return HttpResponse(status=401)
+    return HttpResponse(registry.exposition(), content_type=CONTENT_TYPE)
+
 urlpatterns = [
+    path('metrics', metrics, name='metrics'),
     path('admin/', admin.site.urls),
     path('api/', api_root, name='api-root'),
     path('api/auth/', include('authentication.urls')),
@@ -0,0 +1,310 @@
+"""
+Async versions of the lead read and status endpoints, for ASGI servers.
+
+leads/urls.py routes to these instead of leads.views when
+settings.LEAD_ASYNC_VIEWS is set. They return the same payloads, headers
+and status codes as the DRF views. Requests are authenticated with
+CachedJWTAuthentication.aauthenticate(), which only awaits the database on
+a user cache miss. Methods these views do not implement (creating,
+editing and deleting leads) are passed to the sync DRF views.
+
+lead_events() streams live lead changes and is always served from here.
+
+Django 4.2's async ORM still runs each query in a worker thread, so the
+gain is in waiting: an event loop holds many open requests at once instead
+of one thread per request.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.db.models import Count
+from django.http import Http404, StreamingHttpResponse
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.exceptions import APIException, MethodNotAllowed, NotAuthenticated, NotFound
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from authentication.authentication import CachedJWTAuthentication, EventStreamAuthentication
+from lead_management.renderers import FastJSONRenderer
+
+from . import views
+from .caching import async_cached_lead_view
+from .conditional import aget_lead_counter, async_conditional_lead_view
+from .delta import SINCE_PARAM, changes_since, get_page_size as get_sync_page_size
+from .events import broker
+from .models import Lead, LeadCounter, build_statistics
+from .pagination import AsyncPageNumberPagination, LeadCursorPagination
+from .search import afts_available
+from .serializers import (
+    LIST_DEFERRED_FIELDS, LeadReadSerializer, LeadSerializer, LeadStatusUpdateSerializer,
+    requested_fields,
+)
+
+
+def async_api_view(methods, fallback=None, authentication_class=CachedJWTAuthentication):
+    """
+    Run an async view the way @api_view runs a sync one.
+
+    Exempts the view from CSRF checks, authenticates the request with
+    ``authentication_class``, requires a user, hands the view a DRF
+    Request, renders Response objects as JSON and turns API exceptions
+    into error responses. Methods outside ``methods`` go to ``fallback``
+    (a sync view) when given.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in methods and fallback is not None:
+                return await sync_to_async(fallback)(request, *args, **kwargs)
+
+            authenticator = authentication_class()
+            request = Request(
+                request,
+                parsers=[parser() for parser in api_settings.DEFAULT_PARSER_CLASSES],
+                authenticators=(),
+            )
+            try:
+                user_auth = await authenticator.aauthenticate(request)
+                if user_auth is None:
+                    raise NotAuthenticated()
+                request.user, request.auth = user_auth
+                if request.method not in methods:
+                    raise MethodNotAllowed(request.method)
+                response = await view_func(request, *args, **kwargs)
+            except Http404:
+                response = error_response(NotFound())
+            except APIException as exc:
+                response = error_response(exc)
+                if response.status_code == status.HTTP_401_UNAUTHORIZED:
+                    response['WWW-Authenticate'] = authenticator.authenticate_header(request)
+            return render(request, response)
+
+        # Token-authenticated like the DRF views, which csrf_exempt() too;
+        # Django 4.2's csrf_exempt() would hide that this view is async
+        wrapper.csrf_exempt = True
+        return wrapper
+
+    return decorator
+
+
+def error_response(exc):
+    """The response DRF's default exception handler gives for ``exc``"""
+    data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+    return Response(data, status=exc.status_code)
+
+
+def render(request, response):
+    """Render a DRF Response in place, as a DRF view would before returning it"""
+    if isinstance(response, Response):
+        renderer = FastJSONRenderer()
+        response.accepted_renderer = renderer
+        response.accepted_media_type = renderer.media_type
+        response.renderer_context = {'request': request, 'response': response}
+        response.render()
+    return response
+
+
+@async_api_view(['GET', 'HEAD'], fallback=views.LeadListCreateView.as_view())
+@async_conditional_lead_view
+@async_cached_lead_view
+async def lead_list_create(request):
+    """
+    GET: List all leads for the authenticated user
+    POST: Create a new lead (served by LeadListCreateView)
+    """
+    # Reuse the sync view's filtering, ordering and pagination choice
+    if SINCE_PARAM in request.query_params:
+        data = await sync_to_async(changes_since)(
+            request.user, request.query_params[SINCE_PARAM], get_sync_page_size(request)
+        )
+        return Response({'success': True, 'data': data})
+
+    view = views.LeadListCreateView(request=request, args=(), kwargs={}, format_kwarg=None)
+    if request.query_params.get('search'):
+        await afts_available(Lead.objects.db)
+    fields = requested_fields(request, default_exclude=LIST_DEFERRED_FIELDS)
+    queryset = LeadReadSerializer.select_rows(view.get_queryset(), fields)
+
+    paginator = LeadCursorPagination() if view.uses_cursor else AsyncPageNumberPagination()
+    page = await paginator.apaginate_queryset(queryset, request)
+    if page is not None:
+        return paginator.get_paginated_response(
+            LeadReadSerializer(page, many=True, fields=fields).data
+        )
+    rows = [row async for row in queryset]
+    return Response(LeadReadSerializer(rows, many=True, fields=fields).data)
+
+
+@async_api_view(['GET', 'HEAD'], fallback=views.LeadDetailView.as_view())
+@async_conditional_lead_view
+async def lead_detail(request, pk):
+    """
+    GET: Retrieve a specific lead
+    PUT/PATCH/DELETE: served by LeadDetailView
+    """
+    fields = requested_fields(request)
+    queryset = Lead.objects.filter(pk=pk, created_by=request.user)
+    if fields is None:
+        queryset = queryset.select_related('created_by')
+    else:
+        queryset = views.select_lead_fields(queryset, fields)
+    lead = await queryset.afirst()
+    if lead is None:
+        raise Http404
+    return Response(LeadSerializer(lead, fields=fields).data)
+
+
+@async_api_view(['PATCH'])
+async def update_lead_status(request, pk):
+    """
+    Update only the status of a lead
+    """
+    lead = await Lead.objects.select_related('created_by').filter(
+        pk=pk, created_by=request.user
+    ).afirst()
+    if lead is None:
+        return Response(
+            {
+                'success': False,
+                'message': 'Lead not found'
+            },
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    serializer = LeadStatusUpdateSerializer(lead, data=request.data, partial=True)
+    if serializer.is_valid():
+        # The save runs the counter signal handlers, which are sync
+        await sync_to_async(serializer.save)()
+        return Response(
+            {
+                'success': True,
+                'message': 'Lead status updated successfully',
+                'data': LeadSerializer(lead).data
+            }
+        )
+
+    return Response(
+        {
+            'success': False,
+            'message': 'Failed to update lead status',
+            'errors': serializer.errors
+        },
+        status=status.HTTP_400_BAD_REQUEST
+    )
+
+
+@async_api_view(['GET', 'HEAD'])
+@async_conditional_lead_view
+@async_cached_lead_view
+async def leads_by_status(request):
+    """
+    Get leads grouped by status for the dashboard (see views.leads_by_status)
+    """
+    try:
+        limit = int(request.query_params.get('limit', api_settings.PAGE_SIZE))
+    except ValueError:
+        limit = api_settings.PAGE_SIZE
+    limit = max(1, min(limit, LeadCursorPagination.max_page_size))
+
+    fields = requested_fields(request)
+    user_leads = Lead.objects.filter(created_by=request.user)
+    counts = {
+        status_key: total async for status_key, total in
+        user_leads.order_by().values_list('status').annotate(total=Count('id'))
+    }
+
+    leads_data = {}
+    pagination = {}
+    list_url = request.build_absolute_uri(reverse('leads:lead-list-create'))
+    fields_query = views.fields_query_string(request)
+
+    for status_key, status_label in Lead.STATUS_CHOICES:
+        leads = []
+        if counts.get(status_key):
+            column = LeadReadSerializer.select_rows(user_leads.filter(status=status_key), fields)
+            leads = [row async for row in column[:limit + 1]]
+
+        next_link = None
+        if len(leads) > limit:
+            leads = leads[:limit]
+            column_url = (
+                f'{list_url}?status={status_key}&pagination=cursor&page_size={limit}{fields_query}'
+            )
+            next_link = LeadCursorPagination().get_link_after(column_url, leads[-1])
+
+        leads_data[status_key] = LeadReadSerializer(leads, many=True, fields=fields).data
+        pagination[status_key] = {
+            'count': counts.get(status_key, 0),
+            'next': next_link,
+        }
+
+    summary = {
+        'total_leads': sum(counts.values()),
+        'new_leads': counts.get('new_lead', 0),
+        'leads_sent': counts.get('lead_sent', 0),
+        'deals_done': counts.get('deal_done', 0),
+    }
+
+    return Response(
+        {
+            'success': True,
+            'data': leads_data,
+            'pagination': pagination,
+            'summary': summary
+        }
+    )
+
+
+@async_api_view(['GET', 'HEAD'])
+@async_conditional_lead_view
+async def lead_statistics(request):
+    """
+    Get lead statistics for dashboard (see views.lead_statistics)
+    """
+    counter = await aget_lead_counter(request)
+    if counter is not None:
+        stats = counter.as_statistics()
+    else:
+        counts = await sync_to_async(LeadCounter.count_leads)(request.user.pk)
+        stats = build_statistics(**counts)
+
+    return Response(
+        {
+            'success': True,
+            'data': stats
+        }
+    )
+
+
+@async_api_view(['GET'], authentication_class=EventStreamAuthentication)
+async def lead_events(request):
+    """
+    Stream the user's lead changes as Server-Sent Events (see leads.events)
+
+    Browsers' EventSource cannot send an Authorization header; it passes
+    a token from lead_events_token() as ``?stream_token=`` instead, and
+    fetches a new one when the stream fails to reconnect. Resumes after the ``Last-Event-ID`` header, or ``?last_event_id=`` for
+    the first connection. Under WSGI the response cannot stay open, so it
+    only carries the missed events and the client polls by reconnecting.
+    """
+    last_event_id = (
+        request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    )
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    if isinstance(request._request, ASGIRequest):
+        stream = broker.stream(request.user.pk, last_event_id)
+    else:
+        # WSGI servers iterate synchronously
+        stream = [frame async for frame in broker.stream(request.user.pk, last_event_id, live=False)]
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop nginx from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
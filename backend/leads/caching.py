@@ -0,0 +1,135 @@
+"""
+Server-side cache for lead list and dashboard responses.
+
+Entries live in the 'leads' cache (settings.CACHES) under keys built from
+the user, their current data version, the endpoint and the normalized
+query parameters. Every lead write bumps the version in the same
+transaction: saves and deletes through leads.signals, and the import and
+bulk-status paths through LeadCounter.apply(). So a change takes the
+user's old entries out of use at once. The cache evicts them later in
+least-recently-used order.
+"""
+import hashlib
+import threading
+from functools import wraps
+
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+from lead_management.metrics import lead_cache_requests
+
+from .conditional import aget_lead_counter, get_lead_counter
+
+CACHE_ALIAS = 'leads'
+
+# Parameters whose responses are too varied to be worth caching
+UNCACHED_PARAMS = ('search', 'updated_since')
+
+
+class CacheStats:
+    """Process-wide hit/miss counters for the lead response cache"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = self.misses = 0
+
+    def record(self, hit):
+        lead_cache_requests.inc(result='hit' if hit else 'miss')
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+
+cache_stats = CacheStats()
+
+
+def response_cache_key(request, version):
+    """Key for this request's response at data ``version``"""
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        # An empty ?exclude= is meaningful: it turns off the default exclusion
+        for value in values if value != '' or key == 'exclude'
+    )
+    match = request.resolver_match
+    variant = repr((request.get_host(), match.view_name, sorted(match.kwargs.items()), params))
+    digest = hashlib.blake2b(variant.encode(), digest_size=16).hexdigest()
+    return f'response:{request.user.pk}:{version}:{digest}'
+
+
+def is_cacheable(request, counter):
+    return counter is not None and not any(
+        request.query_params.get(param) for param in UNCACHED_PARAMS
+    )
+
+
+def cached_lead_view(view_func):
+    """
+    Serve a GET lead view's response data from the cache when possible.
+
+    Apply it inside DRF's authentication and inside conditional_lead_view,
+    so revalidations are answered with 304 before the cache is consulted.
+    """
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        counter = get_lead_counter(request)
+        if not is_cacheable(request, counter):
+            return view_func(request, *args, **kwargs)
+
+        cache = caches[CACHE_ALIAS]
+        key = response_cache_key(request, counter.version)
+        data = cache.get(key)
+        if data is not None:
+            cache_stats.record(hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        cache_stats.record(hit=False)
+        response = view_func(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
+
+
+def async_cached_lead_view(view_func):
+    """cached_lead_view() for async views"""
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        counter = await aget_lead_counter(request)
+        if not is_cacheable(request, counter):
+            return await view_func(request, *args, **kwargs)
+
+        cache = caches[CACHE_ALIAS]
+        key = response_cache_key(request, counter.version)
+        data = await cache.aget(key)
+        if data is not None:
+            cache_stats.record(hit=True)
+            response = Response(data)
+            response['X-Cache'] = 'HIT'
+            return response
+
+        cache_stats.record(hit=False)
+        response = await view_func(request, *args, **kwargs)
+        if isinstance(response, Response) and response.status_code == status.HTTP_200_OK:
+            await cache.aset(key, response.data)
+            response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
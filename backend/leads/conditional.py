@@ -0,0 +1,99 @@
+"""
+Conditional GET support for the lead read endpoints.
+
+Every change to a user's leads bumps ``LeadCounter.version`` in the same
+transaction (see leads.signals). That version, read with one primary-key
+lookup, yields a strong ETag and Last-Modified for any lead response of
+that user. A matching If-None-Match gets a 304 before the view's own
+queries or serializers run.
+
+Last-Modified only has one-second resolution, so it is left off while
+the second of the last change is still running: a second write within
+it would otherwise answer If-Modified-Since with a stale 304. The ETag
+covers those responses.
+"""
+import hashlib
+from calendar import timegm
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+from django.views.decorators.http import condition
+
+from .models import LeadCounter
+
+
+def get_lead_counter(request):
+    """Return the user's LeadCounter (or None), loaded once per request"""
+    if not hasattr(request, '_lead_counter'):
+        request._lead_counter = LeadCounter.objects.filter(pk=request.user.pk).first()
+    return request._lead_counter
+
+
+async def aget_lead_counter(request):
+    """get_lead_counter() for async views"""
+    if not hasattr(request, '_lead_counter'):
+        request._lead_counter = await LeadCounter.objects.filter(pk=request.user.pk).afirst()
+    return request._lead_counter
+
+
+def lead_etag(request, *args, **kwargs):
+    counter = get_lead_counter(request)
+    if counter is None:
+        return None
+    # The same data renders differently per URL and negotiated format
+    variant = '|'.join([
+        str(request.user.pk), request.get_full_path(), request.META.get('HTTP_ACCEPT', ''),
+    ])
+    digest = hashlib.blake2b(variant.encode(), digest_size=8).hexdigest()
+    return f'"{counter.version}-{digest}"'
+
+
+def lead_last_modified(request, *args, **kwargs):
+    counter = get_lead_counter(request)
+    if counter is None or counter.updated_at >= timezone.now().replace(microsecond=0):
+        return None
+    return counter.updated_at
+
+
+def conditional_lead_view(view_func):
+    """
+    Add ETag/Last-Modified to a GET lead view and answer revalidations
+    with 304. Apply it inside DRF's authentication so request.user is set.
+    """
+    conditional = condition(etag_func=lead_etag, last_modified_func=lead_last_modified)(view_func)
+
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        response = conditional(request, *args, **kwargs)
+        # Let browsers keep a private copy but always revalidate it
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+def async_conditional_lead_view(view_func):
+    """conditional_lead_view() for async views"""
+
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        # Load the counter up front so the sync ETag helpers find it cached
+        await aget_lead_counter(request)
+        etag = lead_etag(request)
+        last_modified = lead_last_modified(request)
+        timestamp = timegm(last_modified.utctimetuple()) if last_modified else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+        if response is None:
+            response = await view_func(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if timestamp and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(timestamp)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
@@ -0,0 +1,293 @@
+"""
+Live lead change events, streamed to clients as Server-Sent Events.
+
+Lead writes call publish_lead_event(), which hands the event to the broker
+once the transaction commits. The broker passes it to the owner's open
+streams in this process and keeps the owner's last LEAD_EVENTS_HISTORY
+events, so a client that reconnects with Last-Event-ID gets what it
+missed. When the events it missed are no longer held, the stream starts
+with a ``reset`` event and the client should refetch its leads.
+
+With LEAD_EVENTS_REDIS_URL set, events are also published on a Redis
+channel and every process delivers the events the others publish, so a
+stream sees writes served by any worker.
+
+An open stream costs one asyncio queue of at most LEAD_EVENTS_QUEUE_SIZE
+shared, pre-encoded events. A client that falls that far behind is
+disconnected and resumes from its Last-Event-ID.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from django.conf import settings
+from django.db import transaction
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - exercised when orjson is absent
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+REDIS_CHANNEL = 'leads:events'
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, separators=(',', ':'), ensure_ascii=False).encode()
+
+
+class LeadEvent:
+    """One change to a user's leads, with its SSE frame encoded once"""
+    __slots__ = ('id', 'user_id', 'type', 'data', 'frame')
+
+    def __init__(self, id, user_id, type, data):
+        self.id = id
+        self.user_id = user_id
+        self.type = type
+        self.data = data
+        self.frame = encode_frame(id, type, data)
+
+
+def encode_frame(id, type, data):
+    frame = f'event: {type}\n'.encode() + b'data: ' + dumps(data) + b'\n\n'
+    return f'id: {id}\n'.encode() + frame if id is not None else frame
+
+
+class History:
+    """A user's recent events, complete for every id after ``since``"""
+    __slots__ = ('since', 'events')
+
+    def __init__(self, since, size):
+        self.since = since
+        self.events = deque(maxlen=size)
+
+    def append(self, event):
+        if len(self.events) == self.events.maxlen:
+            self.since = self.events[0].id
+        self.events.append(event)
+
+    @property
+    def last_id(self):
+        return self.events[-1].id if self.events else self.since
+
+    def after(self, last_event_id):
+        """Events after ``last_event_id``, or None when some may be missing"""
+        if last_event_id < self.since:
+            return None
+        return [event for event in self.events if event.id > last_event_id]
+
+
+class Subscription:
+    """An open stream: a bounded queue fed from any thread"""
+    __slots__ = ('user_id', 'loop', 'queue', 'overflowed')
+
+    def __init__(self, user_id, size):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(size)
+        self.overflowed = False
+
+    def offer(self, event):
+        # Runs on self.loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class RedisFanout:
+    """Share events between processes over a Redis pub/sub channel"""
+
+    def __init__(self, url):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.origin = uuid.uuid4().hex
+        self._listener = None
+
+    def publish(self, event):
+        self.client.publish(REDIS_CHANNEL, dumps({
+            'origin': self.origin,
+            'id': event.id,
+            'user_id': event.user_id,
+            'type': event.type,
+            'data': event.data,
+        }))
+
+    def listen(self, deliver):
+        if self._listener is None:
+            self._listener = threading.Thread(
+                target=self._listen, args=(deliver,), name='lead-events', daemon=True
+            )
+            self._listener.start()
+
+    def _listen(self, deliver):
+        while True:
+            try:
+                pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(REDIS_CHANNEL)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    if payload.pop('origin') != self.origin:
+                        deliver(LeadEvent(**payload))
+            except Exception:
+                logger.exception('Lead event subscription failed, reconnecting')
+                time.sleep(1)
+
+
+class LeadEventBroker:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._streams = {}
+        self._histories = OrderedDict()
+        self._last_id = 0
+        self._fanout = None
+        self._fanout_ready = False
+
+    def get_fanout(self):
+        """The cross-process fan-out, connected on first use, or None"""
+        if not self._fanout_ready:
+            url = settings.LEAD_EVENTS_REDIS_URL
+            self._fanout = RedisFanout(url) if url else None
+            self._fanout_ready = True
+            if self._fanout is not None:
+                self._fanout.listen(self.deliver)
+        return self._fanout
+
+    def next_id(self):
+        """Event ids are microsecond timestamps, so they order across processes"""
+        with self._lock:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            return self._last_id
+
+    def publish(self, user_id, type, data):
+        event = LeadEvent(self.next_id(), user_id, type, data)
+        fanout = self.get_fanout()
+        self.deliver(event)
+        if fanout is not None:
+            try:
+                fanout.publish(event)
+            except Exception:
+                logger.exception('Could not share lead event %s', event.id)
+        return event
+
+    def deliver(self, event):
+        """Record ``event`` and queue it on its user's open streams"""
+        with self._lock:
+            self._history(event.user_id, since=event.id - 1).append(event)
+            streams = list(self._streams.get(event.user_id, ()))
+        for subscription in streams:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.offer, event)
+            except RuntimeError:
+                # The stream's event loop is gone
+                self.unsubscribe(subscription)
+
+    def subscribe(self, user_id, last_event_id=None):
+        """
+        Open a stream for ``user_id``.
+
+        Returns the subscription, the events after ``last_event_id`` to send
+        first (None when some are no longer held) and the id to report with
+        a reset. Must be called from the stream's event loop.
+        """
+        self.get_fanout()
+        subscription = Subscription(user_id, settings.LEAD_EVENTS_QUEUE_SIZE)
+        now = time.time_ns() // 1000
+        with self._lock:
+            history = self._history(user_id, since=max(now, self._last_id))
+            self._streams.setdefault(user_id, set()).add(subscription)
+            backlog = [] if last_event_id is None else history.after(last_event_id)
+            return subscription, backlog, history.last_id
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            streams = self._streams.get(subscription.user_id)
+            if streams is not None:
+                streams.discard(subscription)
+                if not streams:
+                    del self._streams[subscription.user_id]
+
+    def stream_count(self, user_id=None):
+        with self._lock:
+            if user_id is not None:
+                return len(self._streams.get(user_id, ()))
+            return sum(len(streams) for streams in self._streams.values())
+
+    def clear(self):
+        with self._lock:
+            self._streams.clear()
+            self._histories.clear()
+
+    def _history(self, user_id, since):
+        # Called with self._lock held; keeps the most recently used users.
+        # A new history only vouches for events after ``since``.
+        history = self._histories.get(user_id)
+        if history is None:
+            history = History(since, settings.LEAD_EVENTS_HISTORY)
+            self._histories[user_id] = history
+            while len(self._histories) > settings.LEAD_EVENTS_HISTORY_USERS:
+                self._histories.popitem(last=False)
+        else:
+            self._histories.move_to_end(user_id)
+        return history
+
+    async def stream(self, user_id, last_event_id=None, live=True):
+        """
+        Yield SSE frames for ``user_id``: the missed events, then live ones.
+
+        Sends a comment every LEAD_EVENTS_HEARTBEAT seconds and ends after
+        LEAD_EVENTS_MAX_AGE seconds, when the client reconnects. Ending is
+        what frees streams whose client went away, as the server is not
+        told. Without ``live`` it ends after the missed events.
+        """
+        subscription, backlog, last_id = self.subscribe(user_id, last_event_id)
+        try:
+            yield f'retry: {settings.LEAD_EVENTS_RETRY_MS}\n\n'.encode()
+            if backlog is None:
+                yield encode_frame(last_id, 'reset', {})
+                sent = last_id
+            else:
+                for event in backlog:
+                    yield event.frame
+                sent = backlog[-1].id if backlog else last_event_id or 0
+            if not live:
+                return
+
+            loop = asyncio.get_running_loop()
+            closes_at = loop.time() + settings.LEAD_EVENTS_MAX_AGE
+            while True:
+                timeout = min(settings.LEAD_EVENTS_HEARTBEAT, closes_at - loop.time())
+                if timeout <= 0:
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    yield b': ping\n\n'
+                    continue
+                if subscription.overflowed:
+                    # Too far behind; the client resumes from the last event sent
+                    return
+                if event.id > sent:
+                    sent = event.id
+                    yield event.frame
+        finally:
+            self.unsubscribe(subscription)
+
+
+broker = LeadEventBroker()
+
+
+def publish_lead_event(user_id, type, data):
+    """Publish an event for ``user_id`` once the current transaction commits"""
+    transaction.on_commit(lambda: broker.publish(user_id, type, data))
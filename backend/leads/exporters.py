@@ -0,0 +1,57 @@
+"""
+Streaming lead export to CSV or NDJSON.
+
+Rows come from ``values()`` over a server-side cursor (``iterator()``), so
+neither model instances nor the full result set are ever held in memory.
+Rows are encoded a chunk at a time to keep per-row overhead low.
+"""
+import csv
+import io
+import json
+from itertools import islice
+
+EXPORT_FIELDS = (
+    'id', 'name', 'phone', 'email', 'lead_source', 'status', 'notes',
+    'created_at', 'updated_at',
+)
+CHUNK_SIZE = 2000
+
+
+def iter_rows(queryset, fields=EXPORT_FIELDS, chunk_size=CHUNK_SIZE):
+    """Yield lists of up to ``chunk_size`` flat row dicts from ``queryset``"""
+    rows = queryset.values(*fields).iterator(chunk_size=chunk_size)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _plain(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def stream_csv(queryset, fields=EXPORT_FIELDS):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(fields)
+    for chunk in iter_rows(queryset, fields):
+        writer.writerows([_plain(row[field]) for field in fields] for row in chunk)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def stream_ndjson(queryset, fields=EXPORT_FIELDS):
+    for chunk in iter_rows(queryset, fields):
+        yield ''.join(
+            json.dumps({field: _plain(row[field]) for field in fields}) + '\n'
+            for row in chunk
+        )
+
+
+STREAMERS = {
+    'csv': stream_csv,
+    'ndjson': stream_ndjson,
+}
@@ -0,0 +1,135 @@
+"""
+Streaming bulk import of leads from CSV or NDJSON.
+
+Rows are read one at a time, validated with the Lead model's own field
+rules (phone regex, choices, lengths, email format) and written with
+``bulk_create`` in chunks, one transaction per chunk. Only the current
+chunk is held in memory, so uploads of any size import in constant memory.
+"""
+import csv
+import io
+import json
+from collections import Counter
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from .events import publish_lead_event
+from .models import Lead, LeadCounter
+
+IMPORT_FIELDS = ('name', 'phone', 'email', 'lead_source', 'status', 'notes')
+FORMATS = ('csv', 'ndjson')
+
+
+class ImportFormatError(ValueError):
+    """Raised when the upload format cannot be determined or read"""
+
+
+def detect_format(filename='', content_type=''):
+    """Guess the import format from a file name or content type"""
+    filename, content_type = (filename or '').lower(), (content_type or '').lower()
+    if filename.endswith(('.ndjson', '.jsonl')) or 'ndjson' in content_type or 'jsonl' in content_type:
+        return 'ndjson'
+    if filename.endswith('.csv') or 'csv' in content_type:
+        return 'csv'
+    return None
+
+
+def iter_rows(stream, fmt):
+    """
+    Yield ``(row_number, data)`` pairs from a binary ``stream``.
+
+    ``data`` is a dict of raw values, or an error message string when the
+    row itself could not be parsed. Bytes that are not UTF-8 end the
+    import with an error for the row being read; rows before it are kept.
+    """
+    if fmt not in FORMATS:
+        raise ImportFormatError(f"Format must be one of: {', '.join(FORMATS)}")
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    number = 0
+    try:
+        if fmt == 'csv':
+            reader = csv.DictReader(text)
+            while True:
+                try:
+                    row = next(reader)
+                except StopIteration:
+                    return
+                except csv.Error as e:
+                    row = f'Invalid CSV: {e}'
+                number += 1
+                yield number, row
+        else:
+            for number, line in enumerate(text, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError as e:
+                    yield number, f'Invalid JSON: {e}'
+                    continue
+                yield number, row if isinstance(row, dict) else 'Each line must be a JSON object.'
+    except UnicodeDecodeError:
+        # The decoder reads ahead in blocks, so the bad bytes may be a few
+        # rows further on; nothing after them can be trusted
+        yield number + 1, 'File is not valid UTF-8 text; import stopped here.'
+
+
+def build_lead(data, user):
+    """Return an unsaved, validated Lead for ``data`` or raise ValidationError"""
+    values = {}
+    for field in IMPORT_FIELDS:
+        value = data.get(field)
+        if isinstance(value, str):
+            value = value.strip()
+        if value not in (None, ''):
+            values[field] = value
+    lead = Lead(created_by=user, **values)
+    lead.clean_fields(exclude=['created_by'])
+    return lead
+
+
+def import_leads(stream, fmt, user, batch_size=1000, max_errors=100):
+    """
+    Import leads for ``user`` from ``stream`` in format ``fmt``.
+
+    Returns a summary with the number of created and failed rows and the
+    first ``max_errors`` per-row errors.
+    """
+    created = failed = 0
+    errors = []
+    batch = []
+
+    def flush():
+        nonlocal created
+        with transaction.atomic():
+            Lead.objects.bulk_create(batch)
+            # bulk_create skips the signal handlers that maintain counters
+            deltas = Counter((lead.status, lead.lead_source) for lead in batch)
+            LeadCounter.apply(user.pk, deltas)
+            publish_lead_event(user.pk, 'leads.imported', {'count': len(batch)})
+        created += len(batch)
+        batch.clear()
+
+    for number, data in iter_rows(stream, fmt):
+        try:
+            if isinstance(data, str):
+                raise ValidationError({'row': [data]})
+            batch.append(build_lead(data, user))
+        except ValidationError as e:
+            failed += 1
+            if len(errors) < max_errors:
+                errors.append({'row': number, 'errors': e.message_dict})
+            continue
+        if len(batch) >= batch_size:
+            flush()
+
+    if batch:
+        flush()
+
+    return {
+        'created': created,
+        'failed': failed,
+        'errors': errors,
+        'errors_truncated': failed > len(errors),
+    }
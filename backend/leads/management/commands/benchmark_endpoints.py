@@ -0,0 +1,372 @@
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import get_resolver, reverse
+from django.utils import timezone
+
+from authentication.tokens import UserClaimsRefreshToken
+from lead_management.testing import QueryCounter
+from leads.models import Lead, LeadCounter
+
+URLCONFS = {'leads': 'leads.urls', 'authentication': 'authentication.urls'}
+BENCHMARK_PASSWORD = 'benchmark-password-1'
+IMPORT_ROWS = 20
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every lead and authentication endpoint in-process at several data sizes, '
+        'on a throwaway database, and write the results to a JSON file'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000,100000',
+                            help='Comma-separated lead counts of the benchmark user')
+        parser.add_argument('--requests', type=int, default=50,
+                            help='Requests per endpoint (a tenth for password hashing and export)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--cold', action='store_true',
+                            help='Clear the response cache before every request')
+        parser.add_argument('--output', help='JSON file to write (default benchmark-<time>.json)')
+        parser.add_argument('--compare', help='Earlier JSON results to compare against')
+
+    def handle(self, *args, sizes='1000,10000,100000', requests=50, seed=0, cold=False,
+               output=None, compare=None, **options):
+        try:
+            sizes = sorted(int(size) for size in sizes.split(','))
+        except ValueError:
+            raise CommandError('--sizes must be comma-separated integers')
+        baseline = load_results(compare) if compare else None
+        missing = set(route_names()) - {scenario[0] for scenario in SCENARIOS}
+        if missing:
+            raise CommandError(f'No benchmark scenario for: {", ".join(sorted(missing))}')
+
+        started = datetime.now(dt_timezone.utc)
+        runs = []
+        with benchmark_database(), quiet_request_log():
+            owner = User.objects.create_user('benchmark', 'benchmark@example.com', BENCHMARK_PASSWORD)
+            seeded = 0
+            for size in sizes:
+                call_command('seed_leads', owner=owner.username, leads=size - seeded,
+                             seed=seed + size, stdout=StringIO())
+                seeded = size
+                self.stdout.write(f'\n{size} leads')
+                self.stdout.write(
+                    f'{"endpoint":<44}{"req/s":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                    f'{"queries":>9}{"errors":>8}'
+                )
+                results = []
+                for route, label, method, prepare, share in SCENARIOS:
+                    count = max(3, requests // share)
+                    result = run_scenario(owner, route, label, method, prepare, count, cold)
+                    results.append(result)
+                    self.stdout.write(
+                        f'{route + " " + label:<44}{result["requests_per_second"]:>8.1f}'
+                        f'{result["p50_ms"]:>9.1f}{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+                        f'{result["queries_median"]:>9}{result["errors"]:>8}'
+                    )
+                runs.append({'leads': size, 'results': results})
+
+        report = {
+            'started_at': started.isoformat(),
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'async_views': settings.LEAD_ASYNC_VIEWS,
+            'requests': requests,
+            'cold_cache': cold,
+            'seed': seed,
+            'runs': runs,
+        }
+        output = output or f'benchmark-{started:%Y%m%dT%H%M%S}.json'
+        with open(output, 'w') as stream:
+            json.dump(report, stream, indent=2)
+        self.stdout.write(self.style.SUCCESS(f'\nWrote {output}'))
+
+        if baseline:
+            self.write_comparison(baseline, report)
+
+    def write_comparison(self, baseline, report):
+        before = {
+            (run['leads'], result['route'], result['label']): result
+            for run in baseline['runs'] for result in run['results']
+        }
+        self.stdout.write(f'\nChange in p50 latency since {baseline.get("git_commit") or "baseline"}')
+        for run in report['runs']:
+            for result in run['results']:
+                old = before.get((run['leads'], result['route'], result['label']))
+                if old and old['p50_ms']:
+                    change = (result['p50_ms'] - old['p50_ms']) / old['p50_ms'] * 100
+                    self.stdout.write(
+                        f'{run["leads"]:>8} {result["route"] + " " + result["label"]:<44}'
+                        f'{old["p50_ms"]:>9.1f} -> {result["p50_ms"]:>7.1f} ms {change:>+7.1f}%'
+                    )
+
+
+def route_names():
+    """Every named route of the lead and authentication URLconfs"""
+    for namespace, urlconf in URLCONFS.items():
+        for pattern in get_resolver(urlconf).url_patterns:
+            if pattern.name:
+                yield f'{namespace}:{pattern.name}'
+
+
+def run_scenario(owner, route, label, method, prepare, count, cold):
+    """Send ``count`` prepared requests and summarize latency and queries"""
+    client = Client(HTTP_AUTHORIZATION=f'Bearer {UserClaimsRefreshToken.for_user(owner).access_token}')
+    latencies, queries, errors = [], [], 0
+    for path, data in prepare(owner, count):
+        if cold:
+            caches['leads'].clear()
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            if method == 'get':
+                response = client.get(path, data)
+            elif method == 'multipart':
+                response = client.post(path, data)
+            else:
+                response = client.generic(
+                    method.upper(), path, json.dumps(data), content_type='application/json'
+                )
+            if response.streaming:
+                for chunk in response.streaming_content:
+                    pass
+            latencies.append(time.perf_counter() - started)
+        queries.append(counter.count)
+        errors += response.status_code >= 400
+
+    latencies.sort()
+    return {
+        'route': route,
+        'label': label,
+        'method': method.upper() if method != 'multipart' else 'POST',
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': len(latencies) / sum(latencies),
+        'mean_ms': statistics.mean(latencies) * 1000,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'queries_median': int(statistics.median(queries)),
+        'queries_max': max(queries),
+    }
+
+
+def percentile(values, percent):
+    """Nearest-rank percentile of sorted ``values``"""
+    return values[min(len(values) - 1, max(0, round(len(values) * percent / 100) - 1))]
+
+
+@contextmanager
+def benchmark_database():
+    """Run against a freshly migrated database that is dropped afterwards"""
+    old_name = connection.settings_dict['NAME']
+    with tempfile.TemporaryDirectory() as directory:
+        if connection.vendor == 'sqlite':
+            # A file, not the in-memory default, to match a real deployment
+            connection.settings_dict['TEST']['NAME'] = os.path.join(directory, 'benchmark.sqlite3')
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        # Cached responses and users are keyed by ids the new database reuses
+        caches['leads'].clear()
+        caches['users'].clear()
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            caches['leads'].clear()
+            caches['users'].clear()
+
+
+@contextmanager
+def quiet_request_log():
+    """Keep expected 4xx responses and slow-request warnings from flooding the output"""
+    loggers = [logging.getLogger(name) for name in ('django.request', 'lead_management.instrumentation')]
+    levels = [logger.level for logger in loggers]
+    for logger in loggers:
+        logger.setLevel(logging.ERROR)
+    try:
+        yield
+    finally:
+        for logger, level in zip(loggers, levels):
+            logger.setLevel(level)
+
+
+def load_results(path):
+    try:
+        with open(path) as stream:
+            return json.load(stream)
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Cannot read {path}: {e}')
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=settings.BASE_DIR,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# Request builders: (owner, count) -> [(path, data)], prepared before timing
+
+def repeat(route, data=None):
+    return lambda owner, count: [(reverse(route), data or {})] * count
+
+
+def week_of_changes(owner, count):
+    since = (timezone.now() - timedelta(days=7)).isoformat()
+    return [(reverse('leads:lead-list-create'), {'updated_since': since})] * count
+
+
+def lead_ids(owner, count):
+    return list(
+        Lead.objects.filter(created_by=owner).order_by('-created_at').values_list('id', flat=True)[:count]
+    )
+
+
+def lead_urls(route, data=None):
+    def prepare(owner, count):
+        ids = lead_ids(owner, count)
+        return [(reverse(route, args=[ids[i % len(ids)]]), data or {}) for i in range(count)]
+    return prepare
+
+
+def status_changes(owner, count):
+    ids = lead_ids(owner, count)
+    choices = [key for key, label in Lead.STATUS_CHOICES]
+    return [
+        (reverse('leads:update-lead-status', args=[ids[i % len(ids)]]), {'status': choices[i % 3]})
+        for i in range(count)
+    ]
+
+
+def disposable_leads(owner, count):
+    leads = Lead.objects.bulk_create([
+        Lead(name=f'Disposable {i}', phone='+12025550100', email='disposable@example.com',
+             lead_source='other', created_by=owner)
+        for i in range(count)
+    ])
+    LeadCounter.rebuild(owner.pk)
+    return [(reverse('leads:lead-detail', args=[lead.pk]), {}) for lead in leads]
+
+
+def new_leads(owner, count):
+    return [
+        (reverse('leads:lead-list-create'), {
+            'name': f'Created {i}', 'phone': '+12025550101', 'email': f'created{i}@example.com',
+            'lead_source': 'website', 'notes': 'Created by the benchmark',
+        })
+        for i in range(count)
+    ]
+
+
+def imports(owner, count):
+    header = 'name,phone,email,lead_source,status\n'
+    rows = ''.join(
+        f'Imported {i},+12025550102,imported{i}@example.com,referral,new_lead\n'
+        for i in range(IMPORT_ROWS)
+    )
+    return [
+        (reverse('leads:lead-import'), {
+            'file': SimpleUploadedFile('leads.csv', (header + rows).encode(), 'text/csv'),
+        })
+        for _ in range(count)
+    ]
+
+
+def bulk_status_changes(owner, count):
+    ids = lead_ids(owner, 50)
+    return [
+        (reverse('leads:bulk-update-lead-status'), {'ids': ids, 'status': ('lead_sent', 'new_lead')[i % 2]})
+        for i in range(count)
+    ]
+
+
+def registrations(owner, count):
+    stamp = time.monotonic_ns()
+    return [
+        (reverse('authentication:register'), {
+            'username': f'bench-{stamp}-{i}', 'email': f'bench-{stamp}-{i}@example.com',
+            'password': BENCHMARK_PASSWORD, 'password_confirm': BENCHMARK_PASSWORD,
+            'first_name': 'Bench', 'last_name': 'Mark',
+        })
+        for i in range(count)
+    ]
+
+
+def logins(owner, count):
+    return [
+        (reverse('authentication:login'), {'email': owner.email, 'password': BENCHMARK_PASSWORD})
+    ] * count
+
+
+def refresh_tokens(route, field):
+    def prepare(owner, count):
+        return [
+            (reverse(route), {field: str(UserClaimsRefreshToken.for_user(owner))})
+            for _ in range(count)
+        ]
+    return prepare
+
+
+def password_changes(owner, count):
+    # Alternate between two passwords, ending on the original
+    other = BENCHMARK_PASSWORD + 'x'
+    pairs = [(BENCHMARK_PASSWORD, other), (other, BENCHMARK_PASSWORD)]
+    count += count % 2
+    return [
+        (reverse('authentication:change-password'), dict(zip(('old_password', 'new_password'), pairs[i % 2])))
+        for i in range(count)
+    ]
+
+
+# (route, label, method, request builder, divisor of --requests)
+SCENARIOS = [
+    ('leads:lead-list-create', 'list', 'get', repeat('leads:lead-list-create'), 1),
+    ('leads:lead-list-create', 'list cursor', 'get',
+     repeat('leads:lead-list-create', {'pagination': 'cursor'}), 1),
+    ('leads:lead-list-create', 'search', 'get',
+     repeat('leads:lead-list-create', {'search': 'patel'}), 1),
+    ('leads:lead-list-create', 'delta sync', 'get', week_of_changes, 1),
+    ('leads:lead-list-create', 'create', 'post', new_leads, 1),
+    ('leads:lead-detail', 'get', 'get', lead_urls('leads:lead-detail'), 1),
+    ('leads:lead-detail', 'update', 'patch', lead_urls('leads:lead-detail', {'notes': 'Updated'}), 1),
+    ('leads:lead-detail', 'delete', 'delete', disposable_leads, 1),
+    ('leads:update-lead-status', 'patch', 'patch', status_changes, 1),
+    ('leads:bulk-update-lead-status', '50 leads', 'patch', bulk_status_changes, 1),
+    ('leads:lead-import', f'{IMPORT_ROWS} rows', 'multipart', imports, 1),
+    ('leads:lead-export', 'csv', 'get', repeat('leads:lead-export'), 10),
+    ('leads:leads-by-status', 'get', 'get', repeat('leads:leads-by-status'), 1),
+    ('leads:lead-statistics', 'get', 'get', repeat('leads:lead-statistics'), 1),
+    ('leads:lead-events', 'replay', 'get', repeat('leads:lead-events'), 1),
+    ('leads:lead-events-token', 'post', 'post', repeat('leads:lead-events-token'), 1),
+    ('authentication:register', 'post', 'post', registrations, 10),
+    ('authentication:login', 'post', 'post', logins, 10),
+    ('authentication:logout', 'post', 'post', refresh_tokens('authentication:logout', 'refresh_token'), 1),
+    ('authentication:token-refresh', 'post', 'post', refresh_tokens('authentication:token-refresh', 'refresh'), 1),
+    ('authentication:token-verify', 'get', 'get', repeat('authentication:token-verify'), 1),
+    ('authentication:profile', 'get', 'get', repeat('authentication:profile'), 1),
+    ('authentication:change-password', 'post', 'post', password_changes, 10),
+]
@@ -0,0 +1,76 @@
+import random
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from lead_management.renderers import FastJSONRenderer, orjson
+from leads.models import Lead
+from leads.serializers import LeadReadSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare JSON renderers on leads_by_status shaped payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000],
+                            help='Number of leads per payload')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, sizes=(1000, 10000, 100000), repeat=5, **options):
+        if orjson is None:
+            self.stderr.write('orjson is not installed; FastJSONRenderer uses the stdlib')
+
+        renderers = {'JSONRenderer': JSONRenderer(), 'FastJSONRenderer': FastJSONRenderer()}
+        self.stdout.write(f'{"leads":>8}  {"renderer":<18}{"bytes":>12}{"ms":>10}{"MB/s":>9}')
+        for size in sizes:
+            payload = self.build_payload(size)
+            for label, renderer in renderers.items():
+                best = None
+                for _ in range(repeat):
+                    started = time.perf_counter()
+                    body = renderer.render(payload)
+                    elapsed = time.perf_counter() - started
+                    best = elapsed if best is None else min(best, elapsed)
+                self.stdout.write(
+                    f'{size:>8}  {label:<18}{len(body):>12}{best * 1000:>10.1f}'
+                    f'{len(body) / best / 1e6:>9.0f}'
+                )
+
+    @staticmethod
+    def build_payload(size):
+        """A leads_by_status response body with ``size`` serialized leads"""
+        rng = random.Random(size)
+        now = timezone.now()
+        serializer = LeadReadSerializer()
+        statuses = [key for key, label in Lead.STATUS_CHOICES]
+        sources = [key for key, label in Lead.LEAD_SOURCE_CHOICES]
+        data = {key: [] for key in statuses}
+        for i in range(size):
+            created = now - timedelta(minutes=i)
+            row = {
+                'id': i + 1,
+                'name': f'Lead {i}',
+                'phone': f'+1{rng.randrange(10 ** 9, 10 ** 10)}',
+                'email': f'lead{i}@example.com',
+                'lead_source': rng.choice(sources),
+                'status': rng.choice(statuses),
+                'notes': 'Follow up next week' if i % 3 else None,
+                'created_by': 1,
+                'created_by__username': 'bench',
+                'created_at': created,
+                'updated_at': created,
+            }
+            data[row['status']].append(serializer.to_representation(row))
+        return {
+            'success': True,
+            'data': data,
+            'summary': {
+                'total_leads': size,
+                'new_leads': len(data['new_lead']),
+                'leads_sent': len(data['lead_sent']),
+                'deals_done': len(data['deal_done']),
+            },
+        }
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from leads.models import Lead, LeadCounter
+from leads.search import IContainsSearchBackend, get_search_backend
+
+FIRST_NAMES = ['James', 'Mary', 'Robert', 'Patricia', 'John', 'Jennifer', 'Michael', 'Linda',
+               'David', 'Elizabeth', 'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis',
+              'Rodriguez', 'Martinez', 'Hernandez', 'Lopez', 'Gonzalez', 'Wilson', 'Anderson']
+DOMAINS = ['example.com', 'mail.com', 'acme.io', 'corp.net', 'startup.dev']
+
+
+class Command(BaseCommand):
+    help = 'Compare lead search latency of the indexed backend against icontains'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--leads', type=int, default=0,
+                            help='Seed this many synthetic leads for the benchmark user first')
+        parser.add_argument('--user', default='search-benchmark',
+                            help='Username whose leads are searched')
+        parser.add_argument('--repeat', type=int, default=20,
+                            help='Timed runs per query and backend')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, leads=0, user='search-benchmark', repeat=20, seed=0, **options):
+        owner, created = User.objects.get_or_create(
+            username=user, defaults={'email': f'{user}@example.com'}
+        )
+        if leads:
+            self.seed(owner, leads, random.Random(seed))
+        if connection.vendor == 'sqlite':
+            # Without statistics SQLite guesses that created_by matches a
+            # handful of rows and probes the FTS index once per lead.
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+
+        total = Lead.objects.filter(created_by=owner).count()
+        queries = ['jo', 'smith', 'jennifer garcia', 'acme', '555']
+        backends = {
+            'icontains': IContainsSearchBackend(),
+            'indexed': get_search_backend(),
+        }
+        self.stdout.write(f'{total} leads for {owner.username}, {repeat} runs per query')
+        self.stdout.write(f'{"query":<18}{"backend":<12}{"matches":>9}{"p50 ms":>10}{"p95 ms":>10}')
+
+        for query in queries:
+            for label, backend in backends.items():
+                timings = []
+                for _ in range(repeat):
+                    queryset = backend.search(Lead.objects.filter(created_by=owner), query)
+                    queryset = queryset.order_by('-search_rank', *Lead._meta.ordering)
+                    started = time.perf_counter()
+                    list(queryset.values_list('id', flat=True)[:20])
+                    timings.append((time.perf_counter() - started) * 1000)
+                matches = backend.search(Lead.objects.filter(created_by=owner), query).count()
+                timings.sort()
+                p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+                self.stdout.write(
+                    f'{query:<18}{label:<12}{matches:>9}'
+                    f'{statistics.median(timings):>10.2f}{p95:>10.2f}'
+                )
+
+    def seed(self, owner, count, rng, batch_size=5000):
+        statuses = [key for key, label in Lead.STATUS_CHOICES]
+        sources = [key for key, label in Lead.LEAD_SOURCE_CHOICES]
+        for start in range(0, count, batch_size):
+            batch = []
+            for i in range(start, min(start + batch_size, count)):
+                first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+                batch.append(Lead(
+                    name=f'{first} {last}',
+                    email=f'{first.lower()}.{last.lower()}{i}@{rng.choice(DOMAINS)}',
+                    phone=f'+1{rng.randrange(10 ** 9, 10 ** 10)}',
+                    lead_source=rng.choice(sources),
+                    status=rng.choice(statuses),
+                    created_by=owner,
+                ))
+            with transaction.atomic():
+                Lead.objects.bulk_create(batch)
+        # bulk_create skips the signal handlers
+        LeadCounter.rebuild(owner.pk)
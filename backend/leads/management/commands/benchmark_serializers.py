@@ -0,0 +1,50 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from lead_management.testing import QueryCounter
+from leads.models import Lead
+from leads.serializers import LeadReadSerializer, LeadSerializer
+
+
+class Command(BaseCommand):
+    help = 'Compare LeadSerializer with LeadReadSerializer in rows per second'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', required=True, help='Username whose leads are serialized')
+        parser.add_argument('--limit', type=int, default=10000, help='Leads per run')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, user, limit=10000, repeat=3, **options):
+        try:
+            owner = User.objects.get(username=user)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{user}" does not exist')
+
+        leads = Lead.objects.filter(created_by=owner)[:limit]
+        variants = {
+            'LeadSerializer': lambda: LeadSerializer(leads.all(), many=True).data,
+            'LeadSerializer+select_related': lambda: LeadSerializer(
+                leads.select_related('created_by'), many=True
+            ).data,
+            'LeadReadSerializer': lambda: LeadReadSerializer(
+                LeadReadSerializer.select_rows(leads), many=True
+            ).data,
+        }
+
+        self.stdout.write(f'{"serializer":<32}{"rows":>8}{"queries":>9}{"rows/s":>12}')
+        for label, serialize in variants.items():
+            best = None
+            for _ in range(repeat):
+                queries = QueryCounter()
+                with connection.execute_wrapper(queries):
+                    started = time.perf_counter()
+                    rows = len(serialize())
+                    elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            self.stdout.write(
+                f'{label:<32}{rows:>8}{queries.count:>9}{rows / best if best else 0:>12.0f}'
+            )
+
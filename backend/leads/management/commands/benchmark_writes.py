@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections, transaction
+
+PROFILES = {
+    # Django's stock SQLite setup, as before the tuned profile
+    'stock': {'ENGINE': 'django.db.backends.sqlite3', 'OPTIONS': {}},
+    'tuned': None,  # DATABASES['default'] as configured
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare concurrent SQLite write throughput of the stock and tuned database profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=200, help='Transactions per thread')
+
+    def handle(self, *args, threads=8, writes=200, **options):
+        tuned = settings.DATABASES['default']
+        if 'sqlite' not in tuned['ENGINE']:
+            raise CommandError('The default database is not SQLite')
+
+        self.stdout.write(f'{threads} threads x {writes} transactions, each an insert plus a counter update')
+        self.stdout.write(f'{"profile":<8}{"writes/s":>10}{"failed":>8}')
+        for name, profile in PROFILES.items():
+            profile = profile or {'ENGINE': tuned['ENGINE'], 'OPTIONS': tuned['OPTIONS']}
+            with tempfile.TemporaryDirectory() as directory:
+                alias = f'benchmark_{name}'
+                connections.settings[alias] = {
+                    **connections.settings['default'],
+                    **profile,
+                    'NAME': os.path.join(directory, 'benchmark.sqlite3'),
+                }
+                try:
+                    rate, failed = self.measure(alias, threads, writes)
+                finally:
+                    connections[alias].close()
+                    del connections.settings[alias]
+            self.stdout.write(f'{name:<8}{rate:>10.0f}{failed:>8}')
+
+    def measure(self, alias, threads, writes):
+        with connections[alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY, payload TEXT)')
+            cursor.execute('CREATE TABLE counter (id INTEGER PRIMARY KEY, total INTEGER)')
+            cursor.execute('INSERT INTO counter VALUES (1, 0)')
+
+        failures = []
+
+        def work():
+            connection = connections[alias]
+            try:
+                for i in range(writes):
+                    try:
+                        # Read then write, like a lead save and its counter update
+                        with transaction.atomic(using=alias), connection.cursor() as cursor:
+                            cursor.execute('SELECT total FROM counter WHERE id = 1')
+                            cursor.fetchone()
+                            cursor.execute('INSERT INTO item (payload) VALUES (%s)', [f'row {i}'])
+                            cursor.execute('UPDATE counter SET total = total + 1 WHERE id = 1')
+                    except OperationalError:
+                        failures.append(1)
+            finally:
+                connection.close()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        done = threads * writes - len(failures)
+        return done / elapsed, len(failures)
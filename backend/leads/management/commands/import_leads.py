@@ -0,0 +1,40 @@
+import json
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from leads.importers import FORMATS, detect_format, import_leads
+
+
+class Command(BaseCommand):
+    help = 'Bulk import leads for a user from a CSV or NDJSON file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--user', required=True, help='Username that will own the leads')
+        parser.add_argument('--format', choices=FORMATS, help='Defaults to the file extension')
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, path, user, format=None, batch_size=1000, **options):
+        try:
+            owner = User.objects.get(username=user)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{user}" does not exist')
+
+        fmt = format or detect_format(path)
+        if fmt is None:
+            raise CommandError('Cannot tell the format from the file name; pass --format')
+
+        started = time.perf_counter()
+        with open(path, 'rb') as stream:
+            result = import_leads(stream, fmt, owner, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+
+        for error in result['errors']:
+            self.stderr.write(f"Row {error['row']}: {json.dumps(error['errors'])}")
+        rate = result['created'] / elapsed if elapsed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {result['created']} leads ({result['failed']} failed) "
+            f"in {elapsed:.2f}s, {rate:.0f} leads/s"
+        ))
@@ -0,0 +1,145 @@
+import asyncio
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db.backends.signals import connection_created
+
+from authentication.tokens import UserClaimsRefreshToken
+
+DEFAULT_PATHS = ['/api/leads/', '/api/leads/by-status/', '/api/leads/statistics/']
+
+
+class Command(BaseCommand):
+    help = (
+        'Load test the lead endpoints in-process through the WSGI or ASGI handler. '
+        'Run once per server, e.g. "load_test --server wsgi" and '
+        '"LEAD_ASYNC_VIEWS=1 load_test --server asgi".'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--server', choices=['wsgi', 'asgi'], default='wsgi')
+        parser.add_argument('--user', required=True, help='Username the requests authenticate as')
+        parser.add_argument('--path', action='append', dest='paths',
+                            help=f'Path to request, repeatable (default: {" ".join(DEFAULT_PATHS)})')
+        parser.add_argument('--requests', type=int, default=2000, help='Total requests')
+        parser.add_argument('--concurrency', type=int, default=100,
+                            help='Requests in flight (WSGI: worker threads)')
+        parser.add_argument('--db-latency', type=float, default=0,
+                            help='Milliseconds added to every query, to stand in for a remote database')
+
+    def handle(self, *args, server, user, paths=None, requests=2000, concurrency=100,
+               db_latency=0, **options):
+        try:
+            owner = User.objects.get(username=user)
+        except User.DoesNotExist:
+            raise CommandError(f'User "{user}" does not exist')
+        if server == 'asgi' and not settings.LEAD_ASYNC_VIEWS:
+            self.stderr.write('Note: LEAD_ASYNC_VIEWS is off, so ASGI runs the sync views')
+        if db_latency:
+            self.add_db_latency(db_latency / 1000)
+
+        token = str(UserClaimsRefreshToken.for_user(owner).access_token)
+        paths = paths or DEFAULT_PATHS
+        targets = [paths[i % len(paths)] for i in range(requests)]
+
+        started = time.perf_counter()
+        if server == 'wsgi':
+            results = self.run_wsgi(targets, token, concurrency)
+        else:
+            results = asyncio.run(self.run_asgi(targets, token, concurrency))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(latency for status, latency in results)
+        errors = sum(1 for status, latency in results if status >= 400)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+        self.stdout.write(
+            f'{server}: {requests} requests, concurrency {concurrency}, '
+            f'views {"async" if settings.LEAD_ASYNC_VIEWS else "sync"}\n'
+            f'  requests/s {requests / elapsed:10.1f}\n'
+            f'  p50 ms     {statistics.median(latencies) * 1000:10.1f}\n'
+            f'  p99 ms     {p99 * 1000:10.1f}\n'
+            f'  errors     {errors:10d}'
+        )
+
+    @staticmethod
+    def add_db_latency(seconds):
+        def slow_execute(execute, sql, params, many, context):
+            time.sleep(seconds)
+            return execute(sql, params, many, context)
+
+        def install(sender, connection, **kwargs):
+            connection.execute_wrappers.append(slow_execute)
+
+        connection_created.connect(install, weak=False)
+
+    def run_wsgi(self, targets, token, concurrency):
+        application = get_wsgi_application()
+
+        def request(path):
+            environ = {
+                'REQUEST_METHOD': 'GET',
+                'PATH_INFO': path,
+                'QUERY_STRING': '',
+                'SERVER_NAME': 'localhost',
+                'SERVER_PORT': '80',
+                'HTTP_HOST': 'localhost',
+                'HTTP_AUTHORIZATION': f'Bearer {token}',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': BytesIO(),
+                'wsgi.errors': self.stderr,
+            }
+            status = []
+            started = time.perf_counter()
+            body = application(environ, lambda code, headers, exc_info=None: status.append(code))
+            for chunk in body:
+                pass
+            body.close()
+            return int(status[0].split()[0]), time.perf_counter() - started
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(request, targets))
+
+    async def run_asgi(self, targets, token, concurrency):
+        application = get_asgi_application()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def request(path):
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'GET',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', b'localhost'),
+                    (b'authorization', f'Bearer {token}'.encode()),
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': ('localhost', 80),
+            }
+            status = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status.append(message['status'])
+
+            async with semaphore:
+                started = time.perf_counter()
+                await application(scope, receive, send)
+                return status[0], time.perf_counter() - started
+
+        return await asyncio.gather(*(request(path) for path in targets))
@@ -0,0 +1,29 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from leads.models import LeadTombstone
+
+
+class Command(BaseCommand):
+    help = 'Delete deleted-lead markers older than LEAD_TOMBSTONE_RETENTION_DAYS in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, batch_size=1000, **options):
+        # Cursors this old get 410 from ?updated_since=, so nothing reads these
+        cutoff = timezone.now() - timedelta(days=settings.LEAD_TOMBSTONE_RETENTION_DAYS)
+        expired = LeadTombstone.objects.filter(deleted_at__lt=cutoff).order_by('pk')
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('pk', flat=True)[:batch_size])
+            if not ids:
+                break
+            with transaction.atomic():
+                LeadTombstone.objects.filter(pk__in=ids).delete()
+            deleted += len(ids)
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} tombstone(s)'))
@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, F
+
+from leads.models import Lead, LeadCounter
+
+
+class Command(BaseCommand):
+    help = 'Rebuild, or verify, the materialized per-user lead counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Only compare stored counters with a fresh count and report differences',
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='users', metavar='USER_ID',
+            help='Limit to this user id (may be repeated)',
+        )
+
+    def handle(self, *args, verify=False, users=None, **options):
+        expected = self.count_all(users)
+
+        if verify:
+            stored = LeadCounter.objects.all()
+            if users:
+                stored = stored.filter(pk__in=users)
+            stored = {
+                counter.pk: self.as_counts(counter.total, counter.by_status, counter.by_source)
+                for counter in stored
+            }
+            # Users without a counter row are fine: statistics fall back to a
+            # live count and the row is built on their next lead write.
+            mismatched = [
+                user_id for user_id in sorted(stored)
+                if stored[user_id] != expected.get(user_id)
+            ]
+            for user_id in mismatched:
+                self.stdout.write(
+                    f'User {user_id}: stored {stored.get(user_id)} != actual {expected.get(user_id)}'
+                )
+            if mismatched:
+                raise CommandError(f'{len(mismatched)} lead counter(s) out of date')
+            self.stdout.write(self.style.SUCCESS(f'{len(stored)} lead counter(s) verified'))
+            return
+
+        counters = [
+            LeadCounter(user_id=user_id, **counts) for user_id, counts in expected.items()
+        ]
+        with transaction.atomic():
+            LeadCounter.objects.bulk_create(
+                counters,
+                batch_size=500,
+                update_conflicts=True,
+                unique_fields=['user'],
+                update_fields=['total', 'by_status', 'by_source', 'updated_at'],
+            )
+            # Invalidate any ETags handed out for the old counts
+            LeadCounter.objects.filter(pk__in=expected).update(version=F('version') + 1)
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {len(counters)} lead counter(s)'))
+
+    def count_all(self, users=None):
+        """Count leads per user, status and source in one grouped query"""
+        user_ids = User.objects.values_list('pk', flat=True)
+        leads = Lead.objects.order_by()
+        if users:
+            user_ids = user_ids.filter(pk__in=users)
+            leads = leads.filter(created_by__in=users)
+
+        by_status = defaultdict(lambda: defaultdict(int))
+        by_source = defaultdict(lambda: defaultdict(int))
+        rows = leads.values_list('created_by', 'status', 'lead_source').annotate(n=Count('id'))
+        for user_id, status, source, n in rows:
+            by_status[user_id][status] += n
+            by_source[user_id][source] += n
+
+        return {
+            user_id: self.as_counts(
+                sum(by_status[user_id].values()), by_status[user_id], by_source[user_id]
+            )
+            for user_id in user_ids
+        }
+
+    @staticmethod
+    def as_counts(total, by_status, by_source):
+        """Normalize counts so every choice is present, for comparison and storage"""
+        return {
+            'total': total,
+            'by_status': {key: by_status.get(key, 0) for key, label in Lead.STATUS_CHOICES},
+            'by_source': {key: by_source.get(key, 0) for key, label in Lead.LEAD_SOURCE_CHOICES},
+        }
@@ -0,0 +1,77 @@
+import time
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from lead_management.profiling import HOT_FUNCTIONS, print_stats, stored_profiles
+
+
+class Command(BaseCommand):
+    help = (
+        'List the request profiles stored by ?profile=1, or summarize one with its '
+        'hottest functions. Pass --delete-older-than to clean up.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('profile_id', nargs='?', help='Profile to summarize')
+        parser.add_argument('--route', help='Only list profiles of this URL name, e.g. leads:leads-by-status')
+        parser.add_argument('--limit', type=int, default=HOT_FUNCTIONS, help='Rows to show')
+        parser.add_argument('--sort', default='cumulative', help='pstats sort key for cProfile profiles')
+        parser.add_argument('--delete-older-than', type=float, metavar='DAYS')
+
+    def handle(self, *args, profile_id=None, route=None, limit=HOT_FUNCTIONS, sort='cumulative',
+               delete_older_than=None, **options):
+        directory = Path(settings.REQUEST_PROFILE_DIR)
+        profiles = stored_profiles(directory)
+        if delete_older_than is not None:
+            return self.delete(directory, profiles, delete_older_than)
+        if profile_id:
+            matches = [profile for profile in profiles if profile['id'] == profile_id]
+            if not matches:
+                raise CommandError(f'No profile "{profile_id}" in {directory}')
+            return self.summarize(directory, matches[0], limit, sort)
+
+        if route:
+            profiles = [profile for profile in profiles if profile['route'] == route]
+        if not profiles:
+            self.stdout.write(f'No profiles in {directory}')
+            return
+        self.stdout.write(f'{"id":<26}{"when":<21}{"method":<8}{"status":>6}{"ms":>10}  route')
+        for profile in profiles[:limit]:
+            self.stdout.write(
+                f'{profile["id"]:<26}{format_time(profile["created_at"]):<21}{profile["method"]:<8}'
+                f'{profile["status"]:>6}{profile["duration_ms"]:>10.1f}  {profile["route"]}'
+            )
+
+    def summarize(self, directory, profile, limit, sort):
+        self.stdout.write(
+            f'{profile["method"]} {profile["path"]} ({profile["route"]}) -> {profile["status"]} '
+            f'in {profile["duration_ms"]:.1f} ms, {format_time(profile["created_at"])}, '
+            f'{profile["profiler"]}, user {profile["user_id"]}'
+        )
+        self.stdout.write(f'\n{"self ms":>10}{"total ms":>10}{"calls":>8}  function')
+        for row in profile['hot_functions'][:limit]:
+            cumulative = row.get('cumulative_ms')
+            calls = row.get('calls')
+            self.stdout.write(
+                f'{row["self_ms"]:>10.2f}{"" if cumulative is None else f"{cumulative:.2f}":>10}'
+                f'{"" if calls is None else calls:>8}  {row["function"]}'
+            )
+        if profile['profiler'] == 'cprofile':
+            self.stdout.write(print_stats(directory / profile['file'], sort, limit))
+
+    def delete(self, directory, profiles, days):
+        cutoff = time.time() - days * 86400
+        deleted = 0
+        for profile in profiles:
+            if profile['created_at'] < cutoff:
+                (directory / profile['file']).unlink(missing_ok=True)
+                (directory / f'{profile["id"]}.json').unlink(missing_ok=True)
+                deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} profile(s)'))
+
+
+def format_time(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
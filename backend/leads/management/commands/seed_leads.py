@@ -0,0 +1,150 @@
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, time as dt_time, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from leads.models import Lead, LeadCounter
+
+# Rough shares seen in a sales pipeline; order follows the model choices
+STATUS_WEIGHTS = {'new_lead': 50, 'lead_sent': 30, 'deal_done': 20}
+SOURCE_WEIGHTS = {
+    'website': 25, 'social_media': 15, 'referral': 12, 'cold_call': 8, 'email_marketing': 10,
+    'google_ads': 12, 'facebook_ads': 8, 'linkedin': 6, 'other': 4,
+}
+FIRST_NAMES = [
+    'Olivia', 'Liam', 'Emma', 'Noah', 'Amelia', 'Oliver', 'Sophia', 'Elijah', 'Mia', 'James',
+    'Priya', 'Arjun', 'Chen', 'Wei', 'Fatima', 'Omar', 'Lucia', 'Mateo', 'Yuki', 'Hana',
+]
+LAST_NAMES = [
+    'Smith', 'Johnson', 'Williams', 'Brown', 'Garcia', 'Miller', 'Davis', 'Martinez', 'Lopez',
+    'Patel', 'Sharma', 'Wang', 'Li', 'Khan', 'Ali', 'Rossi', 'Silva', 'Tanaka', 'Kim', 'Novak',
+]
+STATUSES, STATUS_CUM_WEIGHTS = list(STATUS_WEIGHTS), list(accumulate(STATUS_WEIGHTS.values()))
+SOURCES, SOURCE_CUM_WEIGHTS = list(SOURCE_WEIGHTS), list(accumulate(SOURCE_WEIGHTS.values()))
+DOMAINS = ['example.com', 'example.org', 'example.net', 'mail.example.com']
+NOTE_SENTENCES = [
+    'Asked for a pricing sheet.', 'Follow up next week.', 'Interested in the premium plan.',
+    'Decision maker is the CFO.', 'Requested a demo.', 'Budget approved for next quarter.',
+    'Comparing us with two competitors.', 'Prefers email over calls.', 'Left a voicemail.',
+    'Met at the trade show.',
+]
+HISTORY_DAYS = 365
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate synthetic users and leads with bulk_create. The same --seed and '
+        '--until give the same data.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Users to create')
+        parser.add_argument('--leads', type=int, default=10000, help='Leads to create in total')
+        parser.add_argument('--owner', help='Add the leads to this existing user instead of creating users')
+        parser.add_argument('--prefix', default='seed', help='Username prefix for created users')
+        parser.add_argument('--password', default='seed-password', help='Password of created users')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--until', help='Leads date from the year before this day, YYYY-MM-DD (default today)')
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, users=10, leads=10000, owner=None, prefix='seed', password='seed-password',
+               seed=0, until=None, batch_size=5000, **options):
+        rng = random.Random(seed)
+        try:
+            day = datetime.strptime(until, '%Y-%m-%d').date() if until else timezone.now().date()
+        except ValueError:
+            raise CommandError('--until must be a date like 2025-01-31')
+        until = datetime.combine(day, dt_time.min, tzinfo=dt_timezone.utc)
+
+        started = time.perf_counter()
+        if owner:
+            try:
+                owners = [User.objects.get(username=owner)]
+            except User.DoesNotExist:
+                raise CommandError(f'User "{owner}" does not exist')
+        else:
+            owners = create_users(users, prefix, password)
+
+        # A few users own most leads, as in real accounts
+        owner_weights = list(accumulate(rng.paretovariate(1.5) for _ in owners))
+        created = 0
+        with explicit_timestamps():
+            while created < leads:
+                size = min(batch_size, leads - created)
+                batch = [
+                    build_lead(rng, rng.choices(owners, cum_weights=owner_weights)[0], until)
+                    for _ in range(size)
+                ]
+                with transaction.atomic():
+                    Lead.objects.bulk_create(batch)
+                created += size
+
+        # bulk_create skips the signal handlers that maintain counters
+        for user in owners:
+            LeadCounter.rebuild(user.pk)
+
+        elapsed = time.perf_counter() - started
+        new_users = 0 if owner else len(owners)
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {new_users} users and {created} leads '
+            f'in {elapsed:.2f}s, {created / elapsed if elapsed else 0:.0f} leads/s'
+        ))
+
+
+def create_users(count, prefix, password):
+    usernames = [f'{prefix}-{number:04d}' for number in range(1, count + 1)]
+    taken = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+    if taken:
+        raise CommandError(f'Users already exist: {", ".join(sorted(taken)[:5])}; pick another --prefix')
+    # One hash for all: hashing is deliberately slow
+    hashed = make_password(password)
+    User.objects.bulk_create([
+        User(username=username, email=f'{username}@example.com', password=hashed)
+        for username in usernames
+    ])
+    return list(User.objects.filter(username__in=usernames).order_by('pk'))
+
+
+def build_lead(rng, owner, until):
+    first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+    status = rng.choices(STATUSES, cum_weights=STATUS_CUM_WEIGHTS)[0]
+    # Skewed towards recent leads; worked leads were touched after creation
+    created_at = until - timedelta(seconds=HISTORY_DAYS * 86400 * rng.random() ** 2)
+    updated_at = created_at
+    if status != 'new_lead':
+        updated_at += (until - created_at) * rng.random()
+    notes = None
+    if rng.random() < 0.4:
+        notes = ' '.join(rng.choices(NOTE_SENTENCES, k=rng.randint(1, 6)))
+    return Lead(
+        name=f'{first} {last}',
+        phone=f'+1{rng.randint(2000000000, 9999999999)}',
+        email=f'{first}.{last}{rng.randint(1, 999)}@{rng.choice(DOMAINS)}'.lower(),
+        lead_source=rng.choices(SOURCES, cum_weights=SOURCE_CUM_WEIGHTS)[0],
+        status=status,
+        notes=notes,
+        created_by=owner,
+        created_at=created_at,
+        updated_at=updated_at,
+    )
+
+
+@contextmanager
+def explicit_timestamps():
+    """Let bulk_create store the generated created_at/updated_at values"""
+    fields = [Lead._meta.get_field('created_at'), Lead._meta.get_field('updated_at')]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='lead',
+            options={'ordering': ['-created_at', '-id'], 'verbose_name': 'Lead', 'verbose_name_plural': 'Leads'},
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_by', '-created_at', '-id'], name='lead_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_by', 'status', '-created_at', '-id'], name='lead_user_status_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_by', '-updated_at', '-id'], name='lead_user_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_by', 'name', 'id'], name='lead_user_name_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-17 03:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('leads', '0002_lead_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadCounter',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='lead_counter', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('total', models.IntegerField(default=0)),
+                ('by_status', models.JSONField(default=dict)),
+                ('by_source', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Lead counter',
+                'verbose_name_plural': 'Lead counters',
+            },
+        ),
+    ]
@@ -0,0 +1,80 @@
+from django.db import OperationalError, migrations
+
+# The SQL is spelled out rather than imported from leads.search, so this
+# migration keeps doing what it did when it was written. SQLite drops the
+# triggers when a migration remakes leads_lead; such a migration must run
+# SQLITE_FTS_INSTALL again (copy it, do not import it).
+
+SQLITE_FTS_INSTALL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS leads_lead_fts USING fts5("
+    "name, email, phone, notes, content='leads_lead', content_rowid='id', prefix='2 3')",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_ai",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_ad",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_au",
+    "CREATE TRIGGER leads_lead_fts_ai AFTER INSERT ON leads_lead BEGIN "
+    "INSERT INTO leads_lead_fts(rowid, name, email, phone, notes) "
+    "VALUES (new.id, new.name, new.email, new.phone, new.notes); END",
+    "CREATE TRIGGER leads_lead_fts_ad AFTER DELETE ON leads_lead BEGIN "
+    "INSERT INTO leads_lead_fts(leads_lead_fts, rowid, name, email, phone, notes) "
+    "VALUES ('delete', old.id, old.name, old.email, old.phone, old.notes); END",
+    "CREATE TRIGGER leads_lead_fts_au AFTER UPDATE OF name, email, phone, notes ON leads_lead BEGIN "
+    "INSERT INTO leads_lead_fts(leads_lead_fts, rowid, name, email, phone, notes) "
+    "VALUES ('delete', old.id, old.name, old.email, old.phone, old.notes); "
+    "INSERT INTO leads_lead_fts(rowid, name, email, phone, notes) "
+    "VALUES (new.id, new.name, new.email, new.phone, new.notes); END",
+    "INSERT INTO leads_lead_fts(leads_lead_fts) VALUES ('rebuild')",
+]
+
+SQLITE_FTS_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS leads_lead_fts_ai",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_ad",
+    "DROP TRIGGER IF EXISTS leads_lead_fts_au",
+    "DROP TABLE IF EXISTS leads_lead_fts",
+]
+
+# Match the UPPER(...) LIKE UPPER(...) that icontains generates
+POSTGRES_TRIGRAM_INSTALL = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    f'CREATE INDEX IF NOT EXISTS lead_{field}_trgm_idx ON leads_lead '
+    f'USING gin ((UPPER("{field}"::text)) gin_trgm_ops)'
+    for field in ('name', 'email', 'phone', 'notes')
+]
+
+POSTGRES_TRIGRAM_UNINSTALL = [
+    f'DROP INDEX IF EXISTS lead_{field}_trgm_idx' for field in ('name', 'email', 'phone', 'notes')
+]
+
+
+def run(schema_editor, statements):
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def install_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            run(schema_editor, SQLITE_FTS_INSTALL)
+        except OperationalError:
+            # SQLite built without FTS5; searches fall back to icontains
+            pass
+    elif vendor == 'postgresql':
+        run(schema_editor, POSTGRES_TRIGRAM_INSTALL)
+
+
+def uninstall_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        run(schema_editor, SQLITE_FTS_UNINSTALL)
+    elif vendor == 'postgresql':
+        run(schema_editor, POSTGRES_TRIGRAM_UNINSTALL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0003_lead_counter'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search_index, uninstall_search_index),
+    ]
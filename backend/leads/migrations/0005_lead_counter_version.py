@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-17 04:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0004_lead_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leadcounter',
+            name='version',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
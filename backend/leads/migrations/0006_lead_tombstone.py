@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:12
+
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0005_lead_counter_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadTombstone',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('lead_id', models.BigIntegerField()),
+                ('user_id', models.IntegerField()),
+                ('deleted_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user_id', 'deleted_at'], name='tombstone_user_deleted_idx')],
+            },
+        ),
+    ]
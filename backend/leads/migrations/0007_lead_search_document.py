@@ -0,0 +1,26 @@
+# Generated by Django 4.2.7 on 2026-10-17 05:48
+
+from django.db import migrations, models
+import django.db.models.deletion
+import leads.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('leads', '0006_lead_tombstone'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadSearchDocument',
+            fields=[
+                ('lead', models.OneToOneField(db_column='rowid', db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, related_name='search_document', serialize=False, to='leads.lead')),
+                ('document', leads.models.FullTextDocumentField(db_column='leads_lead_fts')),
+            ],
+            options={
+                'db_table': 'leads_lead_fts',
+                'managed': False,
+            },
+        ),
+    ]
@@ -1,4 +1,6 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
 from django.contrib.auth.models import User
 from django.core.validators import RegexValidator
 
@@ -22,6 +24,12 @@ class Lead(models.Model):
         ('other', 'Other'),
     ]
     
+    STATUS_COLORS = {
+        'new_lead': '#6B7280',  # Gray
+        'lead_sent': '#3B82F6',  # Blue
+        'deal_done': '#10B981',  # Green
+    }
+    
     phone_regex = RegexValidator(
         regex=r'^\+?1?\d{9,15}$',
         message="Phone number must be entered in the format: '+999999999'. Up to 15 digits allowed."
@@ -40,19 +48,222 @@ class Lead(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
-        ordering = ['-created_at']
+        ordering = ['-created_at', '-id']
         verbose_name = 'Lead'
         verbose_name_plural = 'Leads'
+        # Every API query is scoped to ``created_by`` first, so each index
+        # leads with it and ends with the sort key plus ``id`` as tie-breaker.
+        indexes = [
+            models.Index(fields=['created_by', '-created_at', '-id'], name='lead_user_created_idx'),
+            models.Index(fields=['created_by', 'status', '-created_at', '-id'], name='lead_user_status_created_idx'),
+            models.Index(fields=['created_by', '-updated_at', '-id'], name='lead_user_updated_idx'),
+            models.Index(fields=['created_by', 'name', 'id'], name='lead_user_name_idx'),
+        ]
+    
+    # Fields that feed LeadCounter; their last saved values are remembered
+    # on each instance so updates can move counts without re-reading the row.
+    COUNTED_FIELDS = ('created_by_id', 'status', 'lead_source')
     
     def __str__(self):
         return f"{self.name} - {self.get_status_display()}"
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_counted_values()
+        return instance
+    
+    def remember_counted_values(self):
+        """Snapshot the counted fields that are loaded on this instance"""
+        self._counted_values = {
+            field: self.__dict__[field]
+            for field in self.COUNTED_FIELDS if field in self.__dict__
+        }
+    
+    def save(self, *args, **kwargs):
+        # Run the write and the post_save counter update (leads.signals) in
+        # one transaction so they commit or roll back together.
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        with transaction.atomic(using=using):
+            super().save(*args, **kwargs)
+    
     @property
     def status_color(self):
         """Return the color associated with the lead status"""
-        colors = {
-            'new_lead': '#6B7280',  # Gray
-            'lead_sent': '#3B82F6',  # Blue
-            'deal_done': '#10B981',  # Green
+        return self.STATUS_COLORS.get(self.status, '#6B7280')
+
+
+
+class LeadCounter(models.Model):
+    """
+    Materialized per-user lead totals by status and by lead source.
+    
+    Kept in step with Lead writes by the handlers in leads.signals, and by
+    explicit calls from set-based write paths that bypass signals. Every
+    change to any of the user's leads also bumps ``version``, which, with
+    ``updated_at``, identifies the current state of the user's lead data.
+    """
+    user = models.OneToOneField(
+        User, on_delete=models.CASCADE, primary_key=True, related_name='lead_counter'
+    )
+    total = models.IntegerField(default=0)
+    by_status = models.JSONField(default=dict)
+    by_source = models.JSONField(default=dict)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Lead counter'
+        verbose_name_plural = 'Lead counters'
+    
+    def __str__(self):
+        return f"{self.user} - {self.total} leads"
+    
+    def as_statistics(self):
+        """Return the lead_statistics payload for these counts"""
+        return build_statistics(self.total, self.by_status, self.by_source)
+    
+    @staticmethod
+    def count_leads(user_id, using=None):
+        """Count a user's leads in a single conditional-aggregation query"""
+        aggregates = {'total': Count('id')}
+        for key, label in Lead.STATUS_CHOICES:
+            aggregates[f'status__{key}'] = Count('id', filter=Q(status=key))
+        for key, label in Lead.LEAD_SOURCE_CHOICES:
+            aggregates[f'source__{key}'] = Count('id', filter=Q(lead_source=key))
+        
+        row = Lead.objects.using(using).filter(created_by_id=user_id).aggregate(**aggregates)
+        return {
+            'total': row['total'],
+            'by_status': {key: row[f'status__{key}'] for key, label in Lead.STATUS_CHOICES},
+            'by_source': {key: row[f'source__{key}'] for key, label in Lead.LEAD_SOURCE_CHOICES},
         }
-        return colors.get(self.status, '#6B7280')
+    
+    @classmethod
+    def rebuild(cls, user_id):
+        """Recount a user's leads from scratch and store the result"""
+        using = router.db_for_write(cls)
+        with transaction.atomic(using=using):
+            # Lock the row, creating it if missing, before counting, so lead
+            # writes committed meanwhile wait for the recount instead of
+            # being overwritten by a stale count
+            counter, created = cls.objects.using(using).select_for_update().get_or_create(pk=user_id)
+            for field, value in cls.count_leads(user_id, using).items():
+                setattr(counter, field, value)
+            counter.version += 1
+            counter.save()
+            return counter
+    
+    @classmethod
+    def touch(cls, user_id, rebuild_missing=True):
+        """Bump a user's data version for a change that moves no counts"""
+        updated = cls.objects.filter(pk=user_id).update(
+            version=F('version') + 1, updated_at=timezone.now()
+        )
+        if not updated and rebuild_missing:
+            cls.rebuild(user_id)
+    
+    @classmethod
+    def apply(cls, user_id, deltas, rebuild_missing=True):
+        """
+        Add ``deltas`` ({(status, lead_source): change}) to a user's counts.
+        
+        Must run after the lead write, in the same transaction. A user
+        without a counter row yet is recounted instead (which already sees
+        the write), unless ``rebuild_missing`` is False.
+        """
+        deltas = {key: change for key, change in deltas.items() if change}
+        if not deltas:
+            return None
+        
+        with transaction.atomic(using=router.db_for_write(cls)):
+            counter = cls.objects.select_for_update().filter(pk=user_id).first()
+            if counter is None:
+                return cls.rebuild(user_id) if rebuild_missing else None
+            
+            for (status, source), change in deltas.items():
+                counter.total += change
+                counter.by_status[status] = counter.by_status.get(status, 0) + change
+                counter.by_source[source] = counter.by_source.get(source, 0) + change
+            counter.version += 1
+            counter.save(update_fields=['total', 'by_status', 'by_source', 'version', 'updated_at'])
+            return counter
+
+
+class FullTextDocumentField(models.TextField):
+    """
+    The hidden column an SQLite FTS5 table has under its own name; used
+    as the left side of MATCH and as the argument of bm25().
+    """
+
+
+@FullTextDocumentField.register_lookup
+class FullTextMatch(models.Lookup):
+    lookup_name = 'match'
+    
+    def as_sql(self, compiler, connection):
+        lhs, lhs_params = self.process_lhs(compiler, connection)
+        rhs, rhs_params = self.process_rhs(compiler, connection)
+        return f'{lhs} MATCH {rhs}', lhs_params + rhs_params
+
+
+class LeadSearchDocument(models.Model):
+    """
+    A lead's row in ``leads_lead_fts``, the SQLite FTS5 index searched by
+    leads.search.
+    
+    Unmanaged: migration 0004 creates the table and the triggers that keep
+    it in step with ``leads_lead``, and it exists on SQLite only. Mapped
+    so searches can join it through the ORM; never written to directly.
+    """
+    lead = models.OneToOneField(
+        Lead, on_delete=models.DO_NOTHING, primary_key=True, db_column='rowid',
+        db_constraint=False, related_name='search_document',
+    )
+    document = FullTextDocumentField(db_column='leads_lead_fts')
+    
+    class Meta:
+        managed = False
+        db_table = 'leads_lead_fts'
+
+
+class LeadTombstone(models.Model):
+    """
+    Marker left by a deleted lead, so clients syncing changes with
+    ``?updated_since=`` (leads.delta) learn about the delete.
+    
+    ``user_id`` is a plain column rather than a foreign key, so deleting a
+    user and their leads does not trip over the markers being written.
+    Old markers are removed by the prune_tombstones command.
+    """
+    lead_id = models.BigIntegerField()
+    user_id = models.IntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+    
+    def __str__(self):
+        return f"Lead {self.lead_id} deleted at {self.deleted_at}"
+
+
+def build_statistics(total, by_status, by_source):
+    """Shape raw lead counts into the lead_statistics response"""
+    stats = {
+        'total_leads': total,
+        'new_leads': by_status.get('new_lead', 0),
+        'leads_sent': by_status.get('lead_sent', 0),
+        'deals_done': by_status.get('deal_done', 0),
+        'conversion_rate': 0,
+        'leads_by_source': {
+            key: by_source.get(key, 0) for key, label in Lead.LEAD_SOURCE_CHOICES
+        },
+    }
+    
+    # Calculate conversion rate (deals done / total leads * 100)
+    if total > 0:
+        stats['conversion_rate'] = round((stats['deals_done'] / total) * 100, 2)
+    
+    return stats
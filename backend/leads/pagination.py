@@ -0,0 +1,192 @@
+import base64
+import binascii
+import json
+
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage
+from django.db import connections
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class LeadCursorPagination(BasePagination):
+    """
+    Keyset pagination over the queryset ordering, e.g. (created_at, id).
+
+    Instead of OFFSET, every page seeks directly to the row after the last
+    one seen, so page cost stays constant however deep the client scrolls.
+    The exact COUNT(*) is skipped; ``?with_count=estimate`` returns a cheap
+    approximate count instead.
+    """
+    cursor_query_param = 'cursor'
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    count_query_param = 'with_count'
+    # Upper bound for the capped count used when no planner estimate exists
+    count_estimate_limit = 1000
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page_queryset = self.prepare(queryset, request)
+        if self.wants_count:
+            self.count = self.estimate_count(queryset)
+        return self.set_page(list(page_queryset))
+
+    async def apaginate_queryset(self, queryset, request):
+        """paginate_queryset() for async views"""
+        page_queryset = self.prepare(queryset, request)
+        if self.wants_count:
+            self.count = await sync_to_async(self.estimate_count)(queryset)
+        return self.set_page([row async for row in page_queryset])
+
+    def prepare(self, queryset, request):
+        """Read the request's paging options and return the page query"""
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        self.field = ordering[0].lstrip('-')
+        self.descending = ordering[0].startswith('-')
+
+        self.count = None
+        self.wants_count = request.query_params.get(self.count_query_param) == 'estimate'
+
+        self.cursor = self.decode_cursor(request)
+        self.reverse = bool(self.cursor and self.cursor['r'])
+        if self.cursor:
+            queryset = self.seek(queryset, self.cursor['v'], self.cursor['id'])
+            if self.reverse:
+                queryset = queryset.reverse()
+        return queryset[:self.page_size + 1]
+
+    def set_page(self, rows):
+        """Trim the fetched rows to the page and work out the links"""
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+
+        self.page = rows
+        return rows
+
+    def seek(self, queryset, value, pk):
+        """
+        Restrict to rows strictly after (value, pk) in the paging direction.
+
+        Written as ``field <= value AND NOT (field = value AND id >= pk)``
+        rather than an OR so the database can seek the composite index on
+        ``field`` and only filter the tie rows.
+        """
+        field = self.field
+        value = queryset.model._meta.get_field(field).to_python(value)
+        op = 'lt' if self.descending != self.reverse else 'gt'
+        return queryset.filter(**{f'{field}__{op}e': value}).exclude(
+            **{field: value, f'id__{"gt" if op == "lt" else "lt"}e': pk}
+        )
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def estimate_count(self, queryset):
+        """
+        Approximate row count without a full COUNT(*).
+
+        PostgreSQL reports the planner's row estimate; other databases get a
+        count capped at ``count_estimate_limit`` rows.
+        """
+        queryset = queryset.order_by()
+        connection = connections[queryset.db]
+        if connection.vendor == 'postgresql':
+            sql, params = queryset.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            return int(plan[0]['Plan']['Plan Rows'])
+        return queryset[:self.count_estimate_limit].count()
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            cursor = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')))
+            if not isinstance(cursor, dict) or not {'v', 'id', 'r'} <= cursor.keys():
+                raise ValueError
+            return cursor
+        except (TypeError, ValueError, UnicodeError, binascii.Error):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        # Rows may be model instances or values() dicts
+        if isinstance(row, dict):
+            value, pk = row[self.field], row['id']
+        else:
+            value, pk = getattr(row, self.field), row.pk
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        cursor = {'v': value, 'id': pk, 'r': int(reverse)}
+        encoded = base64.urlsafe_b64encode(json.dumps(cursor, separators=(',', ':')).encode('ascii'))
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded.decode('ascii'))
+
+    def get_link_after(self, base_url, row, field='created_at'):
+        """Link to the page following ``row``, for callers outside a list view"""
+        self.base_url, self.field = base_url, field
+        return self.encode_cursor(row, reverse=False)
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.count is not None:
+            payload = {'count': self.count, 'count_is_estimate': True, **payload}
+        return Response(payload)
+
+
+class AsyncPageNumberPagination(PageNumberPagination):
+    """PageNumberPagination with an apaginate_queryset() for async views"""
+
+    async def apaginate_queryset(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+
+        # Page over the row numbers, then fetch only the rows on the page
+        paginator = self.django_paginator_class(range(await queryset.acount()), page_size)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            msg = self.invalid_page_message.format(page_number=page_number, message=str(exc))
+            raise NotFound(msg)
+
+        offset = (self.page.number - 1) * page_size
+        self.page.object_list = [row async for row in queryset[offset:offset + page_size]]
+        self.request = request
+        return list(self.page)
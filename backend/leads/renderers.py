@@ -0,0 +1,28 @@
+import json
+
+from rest_framework.renderers import BaseRenderer
+
+
+class StreamingExportRenderer(BaseRenderer):
+    """
+    Declares an export media type for content negotiation.
+
+    Export views stream their rows themselves (see leads.exporters); the
+    renderer only handles the non-streamed error responses, as JSON.
+    """
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return json.dumps(data, default=str).encode(self.charset)
+
+
+class CSVRenderer(StreamingExportRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+
+class NDJSONRenderer(StreamingExportRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
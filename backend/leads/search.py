@@ -0,0 +1,134 @@
+"""
+Search backends for the leads ``search`` parameter.
+
+The backend is picked from ``settings.LEAD_SEARCH_BACKEND`` (a dotted path),
+or from the database vendor when that is unset:
+
+* SQLite: an FTS5 table, ``leads_lead_fts``, kept in sync with
+  ``leads_lead`` by triggers (see migration 0004).
+* PostgreSQL: pg_trgm GIN indexes on the searched columns, so the
+  ``icontains`` lookups become index scans, ranked by trigram similarity.
+* Anything else: the original unindexed ``icontains`` scan.
+
+Every backend filters to matching leads and annotates a ``search_rank``
+where higher means more relevant.
+"""
+import re
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.db.models import F, FloatField, Func, Q, Value
+from django.utils.module_loading import import_string
+
+FTS_TABLE = 'leads_lead_fts'
+SEARCH_FIELDS = ('name', 'email', 'phone')
+NOTES_FIELD = 'notes'
+
+
+class IContainsSearchBackend:
+    """Case-insensitive substring match on every searched column"""
+
+    def search(self, queryset, query, include_notes=False):
+        return self.filter_contains(queryset, query, include_notes).annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    @staticmethod
+    def filter_contains(queryset, query, include_notes=False):
+        fields = SEARCH_FIELDS + ((NOTES_FIELD,) if include_notes else ())
+        condition = Q()
+        for field in fields:
+            condition |= Q(**{f'{field}__icontains': query})
+        return queryset.filter(condition)
+
+
+class SQLiteFTSSearchBackend(IContainsSearchBackend):
+    """
+    Prefix search through the FTS5 shadow table, ranked by bm25.
+
+    Each whitespace separated term becomes a prefix term, so ``jo exa``
+    matches "John <john@example.com>". Falls back to ``icontains`` when the
+    FTS table is missing (e.g. SQLite built without FTS5).
+
+    The planner needs table statistics (ANALYZE / PRAGMA optimize) to drive
+    the join from the FTS match rather than from the per-user index.
+    """
+
+    def search(self, queryset, query, include_notes=False):
+        match = self.build_match(query, include_notes)
+        if match is None or not fts_available(queryset.db):
+            return super().search(queryset, query, include_notes)
+
+        # Join the FTS table so SQLite drives the query from the MATCH and
+        # computes bm25() once per hit. bm25() is negative, more relevant
+        # rows being more negative.
+        return queryset.filter(search_document__document__match=match).annotate(
+            search_rank=-Func(F('search_document__document'), function='bm25', output_field=FloatField())
+        )
+
+    @staticmethod
+    def build_match(query, include_notes=False):
+        """Turn free text into an FTS5 expression of quoted prefix terms"""
+        terms = re.findall(r'\w+', query)
+        if not terms:
+            return None
+        expression = ' '.join(f'"{term}"*' for term in terms)
+        if include_notes:
+            return expression
+        return f'{{{" ".join(SEARCH_FIELDS)}}} : ({expression})'
+
+
+class PostgresTrigramSearchBackend(IContainsSearchBackend):
+    """
+    ``icontains`` served by pg_trgm GIN indexes, ranked by similarity.
+
+    Prefix matches on the name rank above other matches.
+    """
+
+    def search(self, queryset, query, include_notes=False):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models import Case, When
+        from django.db.models.functions import Greatest
+
+        fields = SEARCH_FIELDS + ((NOTES_FIELD,) if include_notes else ())
+        similarity = Greatest(*[TrigramWordSimilarity(query, field) for field in fields])
+        prefix_bonus = Case(
+            When(name__istartswith=query, then=Value(1.0)),
+            default=Value(0.0),
+            output_field=FloatField(),
+        )
+        queryset = self.filter_contains(queryset, query, include_notes)
+        return queryset.annotate(search_rank=similarity + prefix_bonus)
+
+
+VENDOR_BACKENDS = {
+    'sqlite': SQLiteFTSSearchBackend,
+    'postgresql': PostgresTrigramSearchBackend,
+}
+
+_fts_available = {}
+
+
+def fts_available(alias):
+    """Whether the FTS5 table exists on the ``alias`` database (cached)"""
+    if alias not in _fts_available:
+        connection = connections[alias]
+        _fts_available[alias] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_available[alias]
+
+
+async def afts_available(alias):
+    """fts_available() for async views; only the first call queries"""
+    if alias not in _fts_available:
+        await sync_to_async(fts_available)(alias)
+    return _fts_available[alias]
+
+
+def get_search_backend(using='default'):
+    """Return the configured search backend instance"""
+    path = getattr(settings, 'LEAD_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    vendor = connections[using].vendor
+    return VENDOR_BACKENDS.get(vendor, IContainsSearchBackend)()
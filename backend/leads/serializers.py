@@ -1,9 +1,66 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
+from lead_management.instrumentation import TimedListSerializer, TimedSerializerMixin
 from .models import Lead
 
+# The values() columns behind each LeadSerializer output field
+LEAD_FIELD_COLUMNS = {
+    'id': ('id',),
+    'name': ('name',),
+    'phone': ('phone',),
+    'email': ('email',),
+    'lead_source': ('lead_source',),
+    'lead_source_display': ('lead_source',),
+    'status': ('status',),
+    'status_display': ('status',),
+    'status_color': ('status',),
+    'notes': ('notes',),
+    'created_by': ('created_by',),
+    'created_by_name': ('created_by', 'created_by__username'),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+}
+LEAD_FIELDS = tuple(LEAD_FIELD_COLUMNS)
 
-class LeadSerializer(serializers.ModelSerializer):
+# Left out of lead lists unless asked for with ?fields= or ?exclude=
+LIST_DEFERRED_FIELDS = ('notes',)
+
+
+def requested_fields(request, available=LEAD_FIELDS, default_exclude=()):
+    """
+    The fields picked with ?fields= or ?exclude= (comma separated), in
+    ``available`` order, or None for all of them.
+    
+    ``default_exclude`` applies when neither is given; an empty ?exclude=
+    turns it off. ``id`` is always included.
+    """
+    params = request.query_params
+    param = 'fields' if 'fields' in params else 'exclude'
+    if param in params:
+        names = {name.strip() for name in params[param].split(',') if name.strip()}
+        unknown = names.difference(available)
+        if unknown:
+            raise serializers.ValidationError({
+                param: [f"Unknown field(s): {', '.join(sorted(unknown))}. "
+                        f"Choose from: {', '.join(available)}"]
+            })
+    else:
+        names = set(default_exclude)
+    
+    if param == 'fields':
+        return [field for field in available if field in names or field == 'id']
+    if not names:
+        return None
+    return [field for field in available if field not in names or field == 'id']
+
+
+def lead_columns(fields):
+    """The values()/only() columns needed to serialize ``fields``"""
+    columns = {column for field in fields for column in LEAD_FIELD_COLUMNS[field]}
+    return [column for column in LeadReadSerializer.VALUES_FIELDS if column in columns]
+
+
+class LeadSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     status_display = serializers.CharField(source='get_status_display', read_only=True)
     lead_source_display = serializers.CharField(source='get_lead_source_display', read_only=True)
     status_color = serializers.CharField(read_only=True)
@@ -17,6 +74,14 @@ class LeadSerializer(serializers.ModelSerializer):
             'created_by', 'created_by_name', 'created_at', 'updated_at'
         ]
         read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
+        list_serializer_class = TimedListSerializer
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        # ``fields`` limits the output to those field names
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
     
     def create(self, validated_data):
         # Set the created_by field to the current user
@@ -41,6 +106,73 @@ class LeadSerializer(serializers.ModelSerializer):
         return value
 
 
+class LeadReadSerializer(TimedSerializerMixin, serializers.BaseSerializer):
+    """
+    Read-only twin of LeadSerializer for list, dashboard and bulk responses.
+    
+    Works on ``values()`` rows selected by ``select_rows()``, which joins the
+    creator's username in the same query, and looks display labels and
+    colors up in tables built once from the model choices. The output is
+    identical to LeadSerializer's. Pass ``fields`` to both select_rows()
+    and the serializer to fetch and return only those fields.
+    """
+    VALUES_FIELDS = (
+        'id', 'name', 'phone', 'email', 'lead_source', 'status', 'notes',
+        'created_by', 'created_by__username', 'created_at', 'updated_at',
+    )
+    STATUS_DISPLAY = dict(Lead.STATUS_CHOICES)
+    LEAD_SOURCE_DISPLAY = dict(Lead.LEAD_SOURCE_CHOICES)
+    STATUS_COLORS = Lead.STATUS_COLORS
+    DEFAULT_COLOR = '#6B7280'
+    EMPTY_ROW = dict.fromkeys(VALUES_FIELDS)
+    datetime_field = serializers.DateTimeField()
+    
+    class Meta:
+        list_serializer_class = TimedListSerializer
+    
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field_names = fields
+    
+    @classmethod
+    def select_rows(cls, queryset, fields=None):
+        if fields is None:
+            return queryset.values(*cls.VALUES_FIELDS)
+        # Keep the sort keys too: cursor links are built from them
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        sort_fields = [name.lstrip('-') for name in ordering]
+        columns = lead_columns(fields)
+        return queryset.values(*columns, *(
+            name for name in sort_fields if name in cls.VALUES_FIELDS and name not in columns
+        ))
+    
+    def to_representation(self, row):
+        if self.field_names is not None:
+            data = self.to_full_representation({**self.EMPTY_ROW, **row})
+            return {name: data[name] for name in self.field_names}
+        return self.to_full_representation(row)
+    
+    def to_full_representation(self, row):
+        status, source = row['status'], row['lead_source']
+        to_datetime = self.datetime_field.to_representation
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'phone': row['phone'],
+            'email': row['email'],
+            'lead_source': source,
+            'lead_source_display': self.LEAD_SOURCE_DISPLAY.get(source, source),
+            'status': status,
+            'status_display': self.STATUS_DISPLAY.get(status, status),
+            'status_color': self.STATUS_COLORS.get(status, self.DEFAULT_COLOR),
+            'notes': row['notes'],
+            'created_by': row['created_by'],
+            'created_by_name': row['created_by__username'],
+            'created_at': to_datetime(row['created_at']),
+            'updated_at': to_datetime(row['updated_at']),
+        }
+
+
 class LeadStatusUpdateSerializer(serializers.ModelSerializer):
     """Serializer specifically for updating lead status"""
     
@@ -53,4 +185,28 @@ class LeadStatusUpdateSerializer(serializers.ModelSerializer):
         valid_statuses = [choice[0] for choice in Lead.STATUS_CHOICES]
         if value not in valid_statuses:
             raise serializers.ValidationError(f"Status must be one of: {', '.join(valid_statuses)}")
-        return value 
\ No newline at end of file
+        return value
+
+
+class LeadFilterSerializer(serializers.Serializer):
+    """The lead list filters, for endpoints that take them in the body"""
+    status = serializers.ChoiceField(choices=Lead.STATUS_CHOICES, required=False)
+    search = serializers.CharField(required=False)
+    include_notes = serializers.BooleanField(required=False, default=False)
+
+
+class LeadBulkStatusUpdateSerializer(serializers.Serializer):
+    """Serializer for moving many leads, chosen by id or by filter, to one status"""
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        required=False,
+        allow_empty=False,
+        max_length=10000,
+    )
+    filter = LeadFilterSerializer(required=False)
+    status = serializers.ChoiceField(choices=Lead.STATUS_CHOICES)
+    
+    def validate(self, attrs):
+        if ('ids' in attrs) == ('filter' in attrs):
+            raise serializers.ValidationError("Provide either 'ids' or 'filter'.")
+        return attrs
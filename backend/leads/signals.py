@@ -0,0 +1,122 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .events import publish_lead_event
+from .models import Lead, LeadCounter, LeadTombstone
+from .serializers import LeadReadSerializer
+
+EVENT_FIELDS = (
+    'id', 'name', 'phone', 'email', 'lead_source', 'status', 'notes', 'created_at', 'updated_at',
+)
+
+
+@receiver(pre_save, sender=Lead)
+def load_counted_values(sender, instance, raw, **kwargs):
+    """Make sure an update knows the counted values currently stored"""
+    if raw or instance._state.adding:
+        return
+    remembered = getattr(instance, '_counted_values', {})
+    if len(remembered) < len(Lead.COUNTED_FIELDS):
+        stored = Lead.objects.filter(pk=instance.pk).values(*Lead.COUNTED_FIELDS).first()
+        instance._counted_values = stored or {}
+
+
+@receiver(post_save, sender=Lead)
+def count_saved_lead(sender, instance, created, raw, update_fields, **kwargs):
+    """Move the lead between counter buckets, or just bump the data version"""
+    if raw:
+        # Fixture loading may overwrite rows we know nothing about
+        LeadCounter.rebuild(instance.created_by_id)
+    elif created:
+        LeadCounter.apply(
+            instance.created_by_id, {(instance.status, instance.lead_source): 1}
+        )
+    else:
+        old = getattr(instance, '_counted_values', {})
+        written = Lead.COUNTED_FIELDS if update_fields is None else {
+            Lead._meta.get_field(name).attname for name in update_fields
+        }
+        new = {
+            field: getattr(instance, field) if field in written else old.get(field)
+            for field in Lead.COUNTED_FIELDS
+        }
+        if not old or new == old:
+            LeadCounter.touch(instance.created_by_id)
+        else:
+            old_key = (old['status'], old['lead_source'])
+            new_key = (new['status'], new['lead_source'])
+            if old['created_by_id'] == new['created_by_id']:
+                LeadCounter.apply(new['created_by_id'], {old_key: -1, new_key: 1})
+            else:
+                LeadCounter.apply(old['created_by_id'], {old_key: -1})
+                LeadCounter.apply(new['created_by_id'], {new_key: 1})
+        if old:
+            instance._counted_values = new
+            return
+    instance.remember_counted_values()
+
+
+@receiver(post_delete, sender=Lead)
+def count_deleted_lead(sender, instance, **kwargs):
+    """Remove a deleted lead from its owner's counts"""
+    stored = getattr(instance, '_counted_values', {})
+    values = {field: stored.get(field, getattr(instance, field)) for field in Lead.COUNTED_FIELDS}
+    # Never create a counter row here: when the owner is being deleted the
+    # counter row may already be gone and must stay gone.
+    LeadCounter.apply(
+        values['created_by_id'],
+        {(values['status'], values['lead_source']): -1},
+        rebuild_missing=False,
+    )
+
+
+@receiver(pre_save, sender=Lead)
+def remember_previous_values(sender, instance, raw, **kwargs):
+    """Keep the stored owner and status for the change event"""
+    if not raw:
+        instance._previous_values = dict(getattr(instance, '_counted_values', {}))
+
+
+@receiver(post_save, sender=Lead)
+def publish_saved_lead(sender, instance, created, raw, update_fields, **kwargs):
+    """Tell the owner's live streams about a created or changed lead"""
+    if raw:
+        return
+    previous = getattr(instance, '_previous_values', {}) if not created else {}
+    data = {'lead': lead_event_data(instance)}
+    if created:
+        event_type = 'lead.created'
+    elif previous.get('status', instance.status) != instance.status and (
+        update_fields is None or 'status' in update_fields
+    ):
+        event_type = 'lead.status_changed'
+        data['previous_status'] = previous['status']
+    else:
+        event_type = 'lead.updated'
+    owner_id = previous.get('created_by_id', instance.created_by_id)
+    if owner_id != instance.created_by_id:
+        publish_lead_event(owner_id, 'lead.deleted', {'id': instance.pk})
+    publish_lead_event(instance.created_by_id, event_type, data)
+
+
+@receiver(post_delete, sender=Lead)
+def record_deleted_lead(sender, instance, **kwargs):
+    """Leave a tombstone for clients syncing with ?updated_since="""
+    LeadTombstone.objects.create(lead_id=instance.pk, user_id=instance.created_by_id)
+
+
+@receiver(post_delete, sender=Lead)
+def publish_deleted_lead(sender, instance, **kwargs):
+    publish_lead_event(instance.created_by_id, 'lead.deleted', {'id': instance.pk})
+
+
+def lead_event_data(lead):
+    """
+    The lead as LeadSerializer shows it, less the owner fields. Events only
+    go to the owner, and the owner's username would cost a query.
+    """
+    row = {field: getattr(lead, field) for field in EVENT_FIELDS}
+    row['created_by'] = row['created_by__username'] = None
+    data = LeadReadSerializer(row).data
+    del data['created_by'], data['created_by_name']
+    return data
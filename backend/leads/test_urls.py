@@ -0,0 +1,22 @@
+"""
+The lead URLs with the async views that LEAD_ASYNC_VIEWS switches to, for
+tests that run against them with ``ROOT_URLCONF='leads.test_urls'``.
+"""
+from django.urls import include, path
+
+from . import async_views, urls as lead_urls
+
+ASYNC_VIEWS = {
+    'lead-list-create': async_views.lead_list_create,
+    'lead-detail': async_views.lead_detail,
+    'update-lead-status': async_views.update_lead_status,
+    'leads-by-status': async_views.leads_by_status,
+    'lead-statistics': async_views.lead_statistics,
+}
+
+urlpatterns = [
+    path('api/leads/', include(([
+        path(str(pattern.pattern), ASYNC_VIEWS.get(pattern.name, pattern.callback), name=pattern.name)
+        for pattern in lead_urls.urlpatterns
+    ], 'leads'))),
+]
@@ -1,3 +1,1482 @@
-from django.test import TestCase
+import asyncio
+import csv
+import json
+import os
+import pstats
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from functools import partial
+from io import BytesIO, StringIO
+from unittest import skipUnless
+from unittest.mock import patch
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, connections
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.exceptions import ParseError
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from authentication.tokens import EventStreamToken, UserClaimsRefreshToken
+from lead_management.db.middleware import replica_routing_middleware
+from lead_management.parsers import FastJSONParser
+from lead_management import metrics, profiling
+from lead_management.renderers import FastJSONRenderer
+from lead_management.testing import QueryBudgetMixin
+
+from .exporters import EXPORT_FIELDS
+from . import urls as lead_urls
+from .caching import cache_stats
+from .events import broker, encode_frame
+from .importers import import_leads
+from .models import Lead, LeadCounter, LeadTombstone
+from .serializers import LeadReadSerializer, LeadSerializer
+from .views import LeadListCreateView
+
+
+def make_lead(user, **kwargs):
+    """Create a lead for ``user`` with sensible defaults"""
+    defaults = {
+        'name': 'Test Lead',
+        'phone': '+1234567890',
+        'email': 'lead@example.com',
+        'lead_source': 'website',
+    }
+    defaults.update(kwargs)
+    return Lead.objects.create(created_by=user, **defaults)
+
+
+def explain(queryset):
+    """Return the SQLite query plan for ``queryset`` as a single string"""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return '\n'.join(row[-1] for row in cursor.fetchall())
+
+
+class LeadIndexPlanTests(TestCase):
+    """The per-user list, filter and sort paths must be served by an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('planner', 'planner@example.com', 'pass12345')
+
+    def setUp(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are SQLite specific')
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = explain(queryset)
+        self.assertIn(index_name, plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+
+    def test_default_ordering_uses_user_created_index(self):
+        queryset = Lead.objects.filter(created_by=self.user)
+        self.assertUsesIndex(queryset, 'lead_user_created_idx')
+
+    def test_status_filter_uses_user_status_index(self):
+        queryset = Lead.objects.filter(created_by=self.user, status='lead_sent')
+        self.assertUsesIndex(queryset, 'lead_user_status_created_idx')
+
+    def test_supported_orderings_use_an_index(self):
+        expected = {
+            'created_at': 'lead_user_created_idx',
+            '-created_at': 'lead_user_created_idx',
+            'updated_at': 'lead_user_updated_idx',
+            '-updated_at': 'lead_user_updated_idx',
+            'name': 'lead_user_name_idx',
+            '-name': 'lead_user_name_idx',
+        }
+        for ordering, index_name in expected.items():
+            with self.subTest(ordering=ordering):
+                queryset = Lead.objects.filter(created_by=self.user).order_by(
+                    *LeadListCreateView.ORDERINGS[ordering]
+                )
+                self.assertUsesIndex(queryset, index_name)
+
+
+class LeadListOrderingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('sorter', 'sorter@example.com', 'pass12345')
+        for name in ['Charlie', 'Alice', 'Bob']:
+            make_lead(cls.user, name=name)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-list-create')
+
+    def test_orders_by_name(self):
+        response = self.client.get(self.url, {'ordering': 'name'})
+        self.assertEqual(response.status_code, 200)
+        names = [lead['name'] for lead in response.data['results']]
+        self.assertEqual(names, ['Alice', 'Bob', 'Charlie'])
+
+    def test_rejects_unindexed_ordering(self):
+        response = self.client.get(self.url, {'ordering': 'email'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ordering', response.data)
+
+
+class LeadCursorPaginationTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('scroller', 'scroller@example.com', 'pass12345')
+        for i in range(7):
+            make_lead(cls.user, name=f'Lead {i}', status='lead_sent' if i % 2 else 'new_lead')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-list-create')
+
+    def collect(self, params):
+        """Follow ``next`` links from the first page, returning every page"""
+        pages = []
+        response = self.client.get(self.url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_walks_every_lead_once_in_order(self):
+        pages = self.collect({'pagination': 'cursor', 'page_size': 3})
+        ids = [lead['id'] for page in pages for lead in page['results']]
+        expected = list(
+            Lead.objects.filter(created_by=self.user).values_list('id', flat=True)
+        )
+        self.assertEqual(ids, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertNotIn('count', pages[0])
+
+    def test_previous_link_returns_the_prior_page(self):
+        pages = self.collect({'pagination': 'cursor', 'page_size': 3})
+        response = self.client.get(pages[1]['previous'])
+        self.assertEqual(response.data['results'], pages[0]['results'])
+        self.assertIsNone(response.data['previous'])
+
+    def test_honors_status_filter_and_estimated_count(self):
+        pages = self.collect({
+            'pagination': 'cursor', 'page_size': 2,
+            'status': 'lead_sent', 'with_count': 'estimate',
+        })
+        statuses = {lead['status'] for page in pages for lead in page['results']}
+        self.assertEqual(statuses, {'lead_sent'})
+        self.assertEqual(pages[0]['count'], 3)
+        self.assertTrue(pages[0]['count_is_estimate'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get(self.url, {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class LeadsByStatusTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('board', 'board@example.com', 'pass12345')
+        for i in range(5):
+            make_lead(cls.user, name=f'New {i}')
+        for i in range(2):
+            make_lead(cls.user, name=f'Done {i}', status='deal_done')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:leads-by-status')
+        caches['leads'].clear()
+
+    def test_columns_are_limited_and_summary_is_complete(self):
+        response = self.client.get(self.url, {'limit': 3})
+        self.assertEqual(response.status_code, 200)
+        data, pagination = response.data['data'], response.data['pagination']
+        self.assertEqual(len(data['new_lead']), 3)
+        self.assertEqual(len(data['deal_done']), 2)
+        self.assertEqual(data['lead_sent'], [])
+        self.assertIsNotNone(pagination['new_lead']['next'])
+        self.assertIsNone(pagination['deal_done']['next'])
+        self.assertEqual(response.data['summary'], {
+            'total_leads': 7, 'new_leads': 5, 'leads_sent': 0, 'deals_done': 2,
+        })
+
+    def test_load_more_continues_the_column(self):
+        response = self.client.get(self.url, {'limit': 3})
+        more = self.client.get(response.data['pagination']['new_lead']['next'])
+        names = [lead['name'] for lead in response.data['data']['new_lead']]
+        names += [lead['name'] for lead in more.data['results']]
+        self.assertEqual(names, [f'New {i}' for i in reversed(range(5))])
+        # The cards show notes, so the next page keeps them
+        self.assertEqual(
+            set(more.data['results'][0]), set(response.data['data']['new_lead'][0])
+        )
+
+    def test_query_count_does_not_grow_with_data(self):
+        # Auth is forced, so this is the data version lookup, one grouped
+        # COUNT and one query per non-empty column.
+        with self.assertNumQueries(4):
+            self.client.get(self.url)
+        for i in range(20):
+            make_lead(self.user, status='lead_sent')
+        with self.assertNumQueries(5):
+            self.client.get(self.url)
+
+
+class LeadCounterTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('counter', 'counter@example.com', 'pass12345')
+        cls.other = User.objects.create_user('other', 'other@example.com', 'pass12345')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def assertCountersCorrect(self):
+        call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+
+    def test_counters_follow_create_update_and_delete(self):
+        lead = make_lead(self.user)
+        make_lead(self.user, lead_source='referral')
+        self.client.patch(
+            reverse('leads:update-lead-status', args=[lead.pk]), {'status': 'deal_done'}
+        )
+        counter = LeadCounter.objects.get(pk=self.user.pk)
+        self.assertEqual(counter.total, 2)
+        self.assertEqual(counter.by_status['deal_done'], 1)
+        self.assertEqual(counter.by_source['referral'], 1)
+
+        lead = Lead.objects.get(pk=lead.pk)
+        lead.created_by = self.other
+        lead.save()
+        Lead.objects.filter(lead_source='referral').delete()
+        self.assertEqual(LeadCounter.objects.get(pk=self.user.pk).total, 0)
+        self.assertEqual(LeadCounter.objects.get(pk=self.other.pk).total, 1)
+        self.assertCountersCorrect()
+
+    def test_verify_reports_stale_counters(self):
+        make_lead(self.user)
+        LeadCounter.objects.filter(pk=self.user.pk).update(total=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+        call_command('rebuild_lead_counters', stdout=StringIO())
+        self.assertCountersCorrect()
+
+    def test_rebuild_counts_under_the_row_lock(self):
+        make_lead(self.user)
+        LeadCounter.objects.filter(pk=self.user.pk).delete()
+        with CaptureQueriesContext(connection) as queries:
+            counter = LeadCounter.rebuild(self.user.pk)
+        self.assertEqual((counter.total, counter.version), (1, 1))
+        statements = [query['sql'] for query in queries]
+        insert = next(i for i, sql in enumerate(statements) if sql.startswith('INSERT'))
+        count = next(i for i, sql in enumerate(statements) if 'COUNT(' in sql)
+        self.assertLess(insert, count)
+        counter = LeadCounter.rebuild(self.user.pk)
+        self.assertEqual((counter.total, counter.version), (1, 2))
+
+    def test_statistics_use_one_query(self):
+        make_lead(self.user, status='deal_done')
+        make_lead(self.user)
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('leads:lead-statistics'))
+        self.assertEqual(response.data['data']['total_leads'], 2)
+        self.assertEqual(response.data['data']['conversion_rate'], 50.0)
+
+        LeadCounter.objects.all().delete()
+        with self.assertNumQueries(2):
+            fallback = self.client.get(reverse('leads:lead-statistics'))
+        self.assertEqual(fallback.data, response.data)
+
+    def test_deleting_owner_does_not_recreate_counter(self):
+        make_lead(self.other)
+        self.other.delete()
+        self.assertFalse(LeadCounter.objects.filter(pk=self.other.pk).exists())
+
+
+class LeadSearchTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('searcher', 'searcher@example.com', 'pass12345')
+        cls.john = make_lead(cls.user, name='John Smith', email='john@example.com')
+        cls.jane = make_lead(
+            cls.user, name='Jane Doe', email='jane@acme.io', phone='+1987654321',
+            notes='Met John at the expo',
+        )
+        make_lead(cls.user, name='Bob Stone', email='bob@other.org')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-list-create')
+
+    def search(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return [lead['name'] for lead in response.data['results']]
+
+    def test_matches_prefixes_across_columns(self):
+        self.assertEqual(self.search(search='jo'), ['John Smith'])
+        self.assertEqual(self.search(search='acm'), ['Jane Doe'])
+        self.assertEqual(self.search(search='+19876'), ['Jane Doe'])
+
+    def test_notes_are_searched_only_on_request(self):
+        self.assertEqual(self.search(search='john'), ['John Smith'])
+        self.assertEqual(
+            sorted(self.search(search='john', search_notes='true')),
+            ['Jane Doe', 'John Smith'],
+        )
+
+    def test_index_follows_updates_and_deletes(self):
+        lead = Lead.objects.get(pk=self.john.pk)
+        lead.name = 'Jonathan Smith'
+        lead.save()
+        self.assertEqual(self.search(search='jonathan'), ['Jonathan Smith'])
+        lead.delete()
+        self.assertEqual(self.search(search='jo'), [])
+
+    @override_settings(LEAD_SEARCH_BACKEND='leads.search.IContainsSearchBackend')
+    def test_icontains_backend_matches_substrings(self):
+        self.assertEqual(self.search(search='ohn'), ['John Smith'])
+
+
+class LeadImportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('importer', 'importer@example.com', 'pass12345')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-import')
+
+    def upload(self, name, content, **data):
+        if isinstance(content, str):
+            content = content.encode()
+        upload = SimpleUploadedFile(name, content)
+        return self.client.post(self.url, {'file': upload, **data}, format='multipart')
+
+    def test_imports_csv_and_reports_invalid_rows(self):
+        content = (
+            'name,phone,email,lead_source,status\n'
+            'Ann,+1234567890,ann@example.com,website,\n'
+            'Bad Phone,12ab,bad@example.com,website,\n'
+            'Cy,+1234567891,cy@example.com,referral,deal_done\n'
+            'Dee,+1234567892,dee@example.com,carrier_pigeon,\n'
+        )
+        response = self.upload('leads.csv', content)
+        self.assertEqual(response.status_code, 201)
+        data = response.data['data']
+        self.assertEqual((data['created'], data['failed']), (2, 2))
+        self.assertEqual([error['row'] for error in data['errors']], [2, 4])
+        self.assertIn('phone', data['errors'][0]['errors'])
+        self.assertIn('lead_source', data['errors'][1]['errors'])
+        self.assertEqual(
+            LeadCounter.objects.get(pk=self.user.pk).as_statistics()['deals_done'], 1
+        )
+
+    def test_imports_ndjson_in_batches(self):
+        lines = [
+            json.dumps({'name': f'Lead {i}', 'phone': '+1234567890',
+                        'email': f'l{i}@example.com', 'lead_source': 'other'})
+            for i in range(5)
+        ]
+        lines.insert(2, '{not json')
+        with patch('leads.views.import_leads', partial(import_leads, batch_size=2)):
+            response = self.upload('leads.ndjson', '\n'.join(lines))
+        self.assertEqual(response.data['data']['created'], 5)
+        self.assertEqual(response.data['data']['errors'][0]['row'], 3)
+        self.assertEqual(Lead.objects.filter(created_by=self.user).count(), 5)
+        self.assertEqual(LeadCounter.objects.get(pk=self.user.pk).total, 5)
+
+    def test_reports_undecodable_and_malformed_rows(self):
+        content = (
+            b'name,phone,email,lead_source\n'
+            b'Ann,+1234567890,ann@example.com,website\n'
+            b'Huge,+1234567891,huge@example.com,' + b'x' * csv.field_size_limit() + b'\n'
+            b'Bo,+1234567892,bo@example.com,website\n'
+        )
+        response = self.upload('leads.csv', content)
+        self.assertEqual(response.status_code, 201)
+        data = response.data['data']
+        self.assertEqual((data['created'], data['failed']), (2, 1))
+        self.assertEqual(data['errors'][0]['row'], 2)
+
+        content = 'name,phone,email,lead_source\nJosé,+1234567893,j@example.com,website\n'
+        response = self.upload('latin1.csv', content.encode('latin-1'))
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual((data['created'], data['failed']), (0, 1))
+        self.assertIn('UTF-8', data['errors'][0]['errors']['row'][0])
+
+    def test_rejects_unknown_format(self):
+        response = self.upload('leads.txt', 'name\n')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('format', response.data['errors'])
+
+
+class BulkStatusUpdateTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('bulk', 'bulk@example.com', 'pass12345')
+        cls.other = User.objects.create_user('bystander', 'bystander@example.com', 'pass12345')
+        cls.sent = [make_lead(cls.user, name=f'Sent {i}', status='lead_sent') for i in range(3)]
+        cls.new = make_lead(cls.user, name='Fresh')
+        cls.foreign = make_lead(cls.other, status='lead_sent')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:bulk-update-lead-status')
+
+    def test_updates_listed_ids_owned_by_user(self):
+        ids = [self.sent[0].pk, self.new.pk, self.foreign.pk]
+        before = Lead.objects.get(pk=self.sent[0].pk).updated_at
+        response = self.client.patch(self.url, {'ids': ids, 'status': 'deal_done'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        data = response.data['data']
+        self.assertEqual(sorted(data['updated_ids']), sorted([self.sent[0].pk, self.new.pk]))
+        self.assertEqual(data['statistics']['deals_done'], 2)
+        self.assertEqual(Lead.objects.get(pk=self.foreign.pk).status, 'lead_sent')
+        self.assertGreater(Lead.objects.get(pk=self.sent[0].pk).updated_at, before)
+        call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+
+    def test_updates_by_filter(self):
+        response = self.client.patch(
+            self.url, {'filter': {'status': 'lead_sent'}, 'status': 'deal_done'}, format='json'
+        )
+        self.assertEqual(response.data['data']['updated_count'], 3)
+        self.assertEqual(
+            Lead.objects.filter(created_by=self.user, status='deal_done').count(), 3
+        )
+        call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+
+    def test_updates_by_search_filter_in_one_statement(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                self.url, {'filter': {'search': 'Sent'}, 'status': 'deal_done'}, format='json'
+            )
+        self.assertEqual(response.data['data']['updated_count'], 3)
+        updates = [q['sql'] for q in queries if q['sql'].startswith('UPDATE "leads_lead"')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Lead.objects.get(pk=self.new.pk).status, 'new_lead')
+        call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+
+    def test_requires_exactly_one_selector(self):
+        response = self.client.patch(self.url, {'status': 'deal_done'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class LeadExportTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('exporter', 'exporter@example.com', 'pass12345')
+        make_lead(cls.user, name='Ann', notes='Line one\nline "two"')
+        make_lead(cls.user, name='Ben', status='deal_done')
+        make_lead(User.objects.create_user('stranger'), name='Not mine')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-export')
+
+    def content(self, response):
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_streams_csv_by_default(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response['Content-Type'], 'text/csv')
+        rows = list(csv.DictReader(StringIO(self.content(response))))
+        self.assertEqual([row['name'] for row in rows], ['Ben', 'Ann'])
+        self.assertEqual(rows[1]['notes'], 'Line one\nline "two"')
+
+    def test_streams_filtered_ndjson(self):
+        response = self.client.get(self.url, {'format': 'ndjson', 'status': 'deal_done'})
+        rows = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual([row['name'] for row in rows], ['Ben'])
+        self.assertEqual(set(rows[0]), set(EXPORT_FIELDS))
+
+    def test_exports_chosen_columns(self):
+        response = self.client.get(self.url, {'fields': 'name,status'})
+        self.assertEqual(self.content(response).splitlines()[0], 'id,name,status')
+        response = self.client.get(self.url, {'format': 'ndjson', 'exclude': 'notes'})
+        row = json.loads(self.content(response).splitlines()[0])
+        self.assertEqual(set(row), set(EXPORT_FIELDS) - {'notes'})
+
+
+class LeadReadSerializerTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('reader', 'reader@example.com', 'pass12345')
+        make_lead(cls.user, status='lead_sent', lead_source='linkedin', notes='Call back')
+        make_lead(cls.user)
+
+    def setUp(self):
+        caches['leads'].clear()
+
+    def test_matches_model_serializer_output(self):
+        queryset = Lead.objects.filter(created_by=self.user)
+        fast = LeadReadSerializer(LeadReadSerializer.select_rows(queryset), many=True).data
+        self.assertEqual(fast, LeadSerializer(queryset, many=True).data)
+
+    def test_list_query_count_is_flat(self):
+        self.client.force_authenticate(self.user)
+        url = reverse('leads:lead-list-create')
+        # Data version, COUNT(*) for page number pagination, then the page
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        for i in range(5):
+            make_lead(self.user)
+        with self.assertNumQueries(3):
+            self.client.get(url)
+
+
+class FastJSONTests(TestCase):
+
+    def test_renderer_matches_stdlib_renderer(self):
+        payload = {
+            'success': True,
+            'data': [{'id': 1, 'name': 'Zoë  ', 'amount': Decimal('12.50'), 'notes': None}],
+            3: 'int key',
+        }
+        self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+    def test_renderer_encodes_aware_datetimes_as_utc_z(self):
+        moment = datetime(2025, 1, 2, 3, 4, 5, tzinfo=dt_timezone.utc)
+        self.assertEqual(FastJSONRenderer().render({'at': moment}), b'{"at":"2025-01-02T03:04:05Z"}')
+
+    def test_parser_round_trips_and_rejects_bad_json(self):
+        parser = FastJSONParser()
+        self.assertEqual(parser.parse(BytesIO(b'{"ids": [1, 2]}')), {'ids': [1, 2]})
+        with self.assertRaises(ParseError):
+            parser.parse(BytesIO(b'{"ids": NaN}'))
+
+
+class ConditionalGetTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('etag', 'etag@example.com', 'pass12345')
+        cls.lead = make_lead(cls.user)
+        # Older than the current second, so Last-Modified is sent
+        LeadCounter.objects.filter(pk=cls.user.pk).update(
+            updated_at=timezone.now() - timedelta(minutes=1)
+        )
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_revalidation_returns_304_with_a_single_query(self):
+        for url in [
+            reverse('leads:lead-list-create'),
+            reverse('leads:leads-by-status'),
+            reverse('leads:lead-statistics'),
+            reverse('leads:lead-detail', args=[self.lead.pk]),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('Last-Modified', response)
+                with self.assertNumQueries(1):
+                    cached = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.status_code, 304)
+
+    def test_etag_changes_on_edit_and_delete(self):
+        url = reverse('leads:lead-list-create')
+        etags = [self.client.get(url)['ETag']]
+        lead = Lead.objects.get(pk=self.lead.pk)
+        lead.notes = 'Edited'
+        lead.save()
+        etags.append(self.client.get(url)['ETag'])
+        lead.delete()
+        etags.append(self.client.get(url)['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etags[0])
+        self.assertEqual(response.status_code, 200)
+
+    def test_no_last_modified_within_the_second_of_a_change(self):
+        url = reverse('leads:lead-list-create')
+        first = self.client.get(url)
+        lead = Lead.objects.get(pk=self.lead.pk)
+        lead.notes = 'Edited'
+        lead.save()
+        response = self.client.get(url)
+        self.assertNotIn('Last-Modified', response)
+        self.assertIn('ETag', response)
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=first['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_etag_differs_per_query(self):
+        url = reverse('leads:lead-list-create')
+        self.assertNotEqual(
+            self.client.get(url)['ETag'], self.client.get(url, {'status': 'new_lead'})['ETag']
+        )
+
+
+class ResponseCacheTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('cache', 'cache@example.com', 'pass12345')
+        cls.lead = make_lead(cls.user, name='Cached Lead')
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+        caches['leads'].clear()
+        cache_stats.reset()
+
+    def test_repeat_request_is_served_from_cache(self):
+        for url in [reverse('leads:lead-list-create'), reverse('leads:leads-by-status')]:
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first['X-Cache'], 'MISS')
+                # Only the data version lookup remains
+                with self.assertNumQueries(1):
+                    second = self.client.get(url)
+                self.assertEqual(second['X-Cache'], 'HIT')
+                self.assertEqual(second.json(), first.json())
+        self.assertEqual((cache_stats.hits, cache_stats.misses), (2, 2))
+
+    def test_writes_invalidate_cached_responses(self):
+        url = reverse('leads:lead-list-create')
+        self.client.get(url)
+        self.client.patch(
+            reverse('leads:update-lead-status', args=[self.lead.pk]), {'status': 'deal_done'}
+        )
+        response = self.client.get(url)
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['results'][0]['status'], 'deal_done')
+
+    def test_query_parameters_are_part_of_the_key(self):
+        url = reverse('leads:lead-list-create')
+        self.client.get(url, {'status': 'new_lead'})
+        response = self.client.get(url, {'status': 'deal_done'})
+        self.assertEqual(response['X-Cache'], 'MISS')
+        self.assertEqual(response.data['count'], 0)
+
+    def test_searches_are_not_cached(self):
+        url = reverse('leads:lead-list-create')
+        self.client.get(url, {'search': 'cached'})
+        response = self.client.get(url, {'search': 'cached'})
+        self.assertNotIn('X-Cache', response)
+
+
+class AsyncViewTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('async', 'async@example.com', 'pass12345')
+        cls.other = User.objects.create_user('async-other', 'other@example.com', 'pass12345')
+        cls.lead = make_lead(cls.user, name='Async Lead', status='lead_sent')
+        make_lead(cls.user, name='Second')
+        make_lead(cls.other, name='Not mine')
+
+    def setUp(self):
+        caches['leads'].clear()
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_both(self, url, params=None):
+        """The sync view's response, then the async view's"""
+        sync = self.client.get(url, params)
+        with override_settings(ROOT_URLCONF='leads.test_urls'):
+            return sync, self.client.get(url, params)
+
+    def test_responses_match_the_sync_views(self):
+        for url, params in [
+            (reverse('leads:lead-list-create'), None),
+            (reverse('leads:lead-list-create'), {'ordering': 'name', 'page_size': 1}),
+            (reverse('leads:lead-list-create'), {'pagination': 'cursor', 'page_size': 1}),
+            (reverse('leads:lead-list-create'), {'search': 'async'}),
+            (reverse('leads:lead-list-create'), {'fields': 'name,status', 'exclude': 'x'}),
+            (reverse('leads:lead-detail', args=[self.lead.pk]), None),
+            (reverse('leads:lead-detail', args=[self.lead.pk]), {'fields': 'notes'}),
+            (reverse('leads:leads-by-status'), {'limit': 1}),
+            (reverse('leads:leads-by-status'), {'limit': 1, 'exclude': 'notes'}),
+            (reverse('leads:lead-statistics'), None),
+        ]:
+            with self.subTest(url=url, params=params):
+                caches['leads'].clear()
+                sync, response = self.get_both(url, params)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), sync.json())
+                self.assertEqual(response['ETag'], sync['ETag'])
+
+    def test_errors_match_the_sync_views(self):
+        for url, params in [
+            (reverse('leads:lead-detail', args=[999999]), None),
+            (reverse('leads:lead-list-create'), {'ordering': 'phone'}),
+            (reverse('leads:lead-list-create'), {'page': 99}),
+        ]:
+            with self.subTest(url=url, params=params):
+                sync, response = self.get_both(url, params)
+                self.assertEqual(response.status_code, sync.status_code)
+                self.assertEqual(response.json(), sync.json())
+        self.client.credentials()
+        sync, response = self.get_both(reverse('leads:lead-statistics'))
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], sync['WWW-Authenticate'])
+
+    @override_settings(ROOT_URLCONF='leads.test_urls')
+    def test_writes(self):
+        # As a browser would send them, without a CSRF cookie
+        self.client = self.client_class(enforce_csrf_checks=True)
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        response = self.client.patch(
+            reverse('leads:update-lead-status', args=[self.lead.pk]), {'status': 'deal_done'}
+        )
+        self.assertEqual(response.data['data']['status'], 'deal_done')
+        self.assertEqual(LeadCounter.objects.get(pk=self.user.pk).by_status['deal_done'], 1)
+
+        # Methods without an async version go to the sync views
+        response = self.client.post(reverse('leads:lead-list-create'), {
+            'name': 'Created', 'phone': '+1234567890', 'email': 'c@example.com',
+            'lead_source': 'website',
+        })
+        self.assertEqual(response.status_code, 201)
+        response = self.client.patch(reverse('leads:lead-detail', args=[self.lead.pk]), {'notes': 'Edited'})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.delete(reverse('leads:lead-detail', args=[self.lead.pk]))
+        self.assertEqual(response.status_code, 204)
+
+    @override_settings(ROOT_URLCONF='leads.test_urls')
+    def test_revalidation_returns_304(self):
+        url = reverse('leads:lead-list-create')
+        response = self.client.get(url)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+
+class FieldSelectionTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('fields', 'fields@example.com', 'pass12345')
+        cls.lead = make_lead(cls.user, name='Sparse', notes='A long note')
+        make_lead(cls.user, name='Second')
+
+    def setUp(self):
+        caches['leads'].clear()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, params=None):
+        """The response and the SQL of its last query"""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+        return response, queries[-1]['sql']
+
+    def test_list_defers_notes_by_default(self):
+        url = reverse('leads:lead-list-create')
+        response, sql = self.get(url)
+        self.assertEqual(
+            set(response.data['results'][0]), set(LeadSerializer.Meta.fields) - {'notes'}
+        )
+        self.assertNotIn('"notes"', sql)
+        response, sql = self.get(url, {'exclude': ''})
+        self.assertEqual(response.data['results'][1]['notes'], 'A long note')
+
+    def test_list_fields_trim_payload_and_columns(self):
+        url = reverse('leads:lead-list-create')
+        response, sql = self.get(url, {'fields': 'name,status_display'})
+        self.assertEqual(response.data['results'][1], {
+            'id': self.lead.pk, 'name': 'Sparse', 'status_display': 'New Lead',
+        })
+        self.assertNotIn('"email"', sql)
+        self.assertNotIn('auth_user', sql)
+
+        # Cursor links still work without the sort key in the output
+        response, sql = self.get(url, {'fields': 'name', 'pagination': 'cursor', 'page_size': 1})
+        response, sql = self.get(response.data['next'])
+        self.assertEqual(response.data['results'], [{'id': self.lead.pk, 'name': 'Sparse'}])
+
+    def test_unknown_fields_are_rejected(self):
+        response = self.client.get(reverse('leads:lead-list-create'), {'fields': 'name,secret'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('secret', str(response.data['fields']))
+
+    def test_detail_loads_only_requested_columns(self):
+        url = reverse('leads:lead-detail', args=[self.lead.pk])
+        with self.assertNumQueries(2):  # the ETag's counter lookup, then the lead
+            response, sql = self.get(url, {'fields': 'name,created_by_name'})
+        self.assertEqual(response.data, {'id': self.lead.pk, 'name': 'Sparse', 'created_by_name': 'fields'})
+        self.assertNotIn('"notes"', sql)
+
+    def test_by_status_columns(self):
+        url = reverse('leads:leads-by-status')
+        response, sql = self.get(url)
+        self.assertEqual(response.data['data']['new_lead'][1]['notes'], 'A long note')
+        response, sql = self.get(url, {'fields': 'name', 'limit': 1})
+        self.assertEqual(response.data['data']['new_lead'], [{'id': self.lead.pk + 1, 'name': 'Second'}])
+        self.assertIn('fields=name', response.data['pagination']['new_lead']['next'])
+
+
+@override_settings(LEAD_SYNC_OVERLAP=0)
+class DeltaSyncTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('delta', 'delta@example.com', 'pass12345')
+        cls.other = User.objects.create_user('delta-other', 'other@example.com', 'pass12345')
+        cls.leads = [make_lead(cls.user, name=f'Lead {number}') for number in range(5)]
+        make_lead(cls.other)
+
+    def setUp(self):
+        caches['leads'].clear()
+        self.client.force_authenticate(self.user)
+        self.url = reverse('leads:lead-list-create')
+
+    def sync(self, cursor, **params):
+        response = self.client.get(self.url, {'updated_since': cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data['data']
+
+    def test_pages_through_changes_oldest_first(self):
+        cursor, seen = '2000-01-01T00:00:00Z', []
+        with override_settings(LEAD_TOMBSTONE_RETENTION_DAYS=365 * 100):
+            while True:
+                data = self.sync(cursor, page_size=2)
+                seen += [lead['id'] for lead in data['leads']]
+                cursor = data['cursor']
+                if not data['has_more']:
+                    break
+        self.assertEqual(seen, [lead.pk for lead in self.leads])
+        self.assertEqual(self.sync(cursor), {
+            'leads': [], 'deleted': [], 'cursor': cursor, 'has_more': False,
+        })
+
+    def test_returns_updates_and_deletes_since_the_cursor(self):
+        cursor = self.sync(timezone.now().isoformat())['cursor']
+        first, second = self.leads[:2]
+        first.notes = 'Called'
+        first.save()
+        self.client.delete(reverse('leads:lead-detail', args=[second.pk]))
+
+        data = self.sync(cursor)
+        self.assertEqual([lead['id'] for lead in data['leads']], [first.pk])
+        self.assertEqual(data['leads'][0]['notes'], 'Called')
+        self.assertEqual(data['deleted'], [second.pk])
+        # The ETag's counter lookup, then one probe each for leads and deletes
+        with self.assertNumQueries(3):
+            self.assertEqual(self.sync(data['cursor'])['leads'], [])
+
+    def test_rejects_bad_and_expired_cursors(self):
+        response = self.client.get(self.url, {'updated_since': 'nonsense'})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(self.url, {'updated_since': '2000-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, 410)
+
+    def test_lookups_use_indexes(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Query plan assertions are SQLite specific')
+        now = timezone.now()
+        plan = explain(
+            Lead.objects.filter(created_by=self.user, updated_at__gte=now)
+            .exclude(updated_at=now, id__lte=1).order_by('updated_at', 'id')
+        )
+        self.assertIn('lead_user_updated_idx', plan)
+        self.assertNotIn('TEMP B-TREE', plan)
+        plan = explain(LeadTombstone.objects.filter(user_id=self.user.pk, deleted_at__gte=now))
+        self.assertIn('tombstone_user_deleted_idx', plan)
+
+
+async def read_frames(stream, count):
+    """The next ``count`` chunks of an SSE stream"""
+    return [await asyncio.wait_for(stream.__anext__(), 1) for _ in range(count)]
+
+
+class LeadEventTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('events', 'events@example.com', 'pass12345')
+        cls.lead = make_lead(cls.user, name='Event Lead')
+
+    def setUp(self):
+        broker.clear()
+        self.token = str(UserClaimsRefreshToken.for_user(self.user).access_token)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def published(self, request):
+        """The (type, data) events published by ``request()`` once it commits"""
+        with patch.object(broker, 'publish', wraps=broker.publish) as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                request()
+        return [(call.args[1], call.args[2]) for call in publish.call_args_list]
+
+    def test_writes_publish_events_after_commit(self):
+        events = self.published(lambda: self.client.patch(
+            reverse('leads:update-lead-status', args=[self.lead.pk]), {'status': 'deal_done'}
+        ))
+        expected = LeadSerializer(Lead.objects.get(pk=self.lead.pk)).data
+        del expected['created_by'], expected['created_by_name']
+        self.assertEqual(events, [('lead.status_changed', {
+            'lead': expected,
+            'previous_status': 'new_lead',
+        })])
+
+        events = self.published(lambda: self.client.patch(
+            reverse('leads:lead-detail', args=[self.lead.pk]), {'notes': 'Called'}
+        ))
+        self.assertEqual([event_type for event_type, data in events], ['lead.updated'])
+        events = self.published(lambda: self.client.delete(
+            reverse('leads:lead-detail', args=[self.lead.pk])
+        ))
+        self.assertEqual(events, [('lead.deleted', {'id': self.lead.pk})])
+
+        lead = make_lead(self.user)
+        events = self.published(lambda: self.client.patch(
+            reverse('leads:bulk-update-lead-status'), {'ids': [lead.pk], 'status': 'lead_sent'},
+            format='json',
+        ))
+        self.assertEqual(events, [('leads.status_changed', {'ids': [lead.pk], 'status': 'lead_sent'})])
+
+        # Nothing is published for a rolled back write
+        with patch.object(broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=False):
+                make_lead(self.user)
+        publish.assert_not_called()
+
+    async def test_resume_from_last_event_id(self):
+        first, second, third = [
+            broker.publish(self.user.pk, 'lead.updated', {'id': number}) for number in range(3)
+        ]
+        frames = [frame async for frame in broker.stream(self.user.pk, first.id, live=False)]
+        self.assertEqual(frames[1:], [second.frame, third.frame])
+        self.assertIn(f'id: {third.id}\nevent: lead.updated\ndata: {{"id":2}}'.encode(), frames[2])
+
+        # Events from before what the broker holds cannot be resumed
+        frames = [frame async for frame in broker.stream(self.user.pk, first.id - 2, live=False)]
+        self.assertEqual(frames[1:], [f'id: {third.id}\nevent: reset\ndata: {{}}\n\n'.encode()])
+
+    @override_settings(LEAD_EVENTS_QUEUE_SIZE=2)
+    async def test_slow_consumers_are_disconnected(self):
+        stream = broker.stream(self.user.pk)
+        await read_frames(stream, 1)
+        event = broker.publish(self.user.pk, 'lead.updated', {'id': 1})
+        self.assertEqual(await read_frames(stream, 1), [event.frame])
+        self.assertEqual(broker.stream_count(self.user.pk), 1)
+
+        for number in range(5):
+            broker.publish(self.user.pk, 'lead.updated', {'id': number})
+        with self.assertRaises(StopAsyncIteration):
+            await read_frames(stream, 1)
+        self.assertEqual(broker.stream_count(), 0)
+
+    @override_settings(LEAD_EVENTS_HEARTBEAT=0.01)
+    async def test_event_stream_endpoint(self):
+        url = reverse('leads:lead-events')
+        stream_token = str(EventStreamToken.for_user(self.user))
+        response = await self.async_client.get(url, {'stream_token': stream_token})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertEqual(await read_frames(stream, 2), [b'retry: 3000\n\n', b': ping\n\n'])
+        event = broker.publish(self.user.pk, 'lead.updated', {'id': 1})
+        broker.publish(self.user.pk + 1, 'lead.updated', {'id': 2})
+        frames = await read_frames(stream, 2)
+        self.assertIn(event.frame, frames)
+        self.assertEqual(len([frame for frame in frames if frame.startswith(b'id:')]), 1)
+        await stream.aclose()
+
+        response = await self.async_client.get(url)
+        self.assertEqual(response.status_code, 401)
+        # Access tokens are not taken from the URL
+        response = await self.async_client.get(url, {'stream_token': self.token})
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_token_is_issued_and_only_opens_the_stream(self):
+        response = self.client.post(reverse('leads:lead-events-token'))
+        self.assertEqual(response.data['data']['expires_in'], settings.LEAD_EVENTS_TOKEN_SECONDS)
+        stream_token = response.data['data']['token']
+        self.client.credentials()
+        response = self.client.get(reverse('leads:lead-events'), {'stream_token': stream_token})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(
+            reverse('leads:lead-list-create'), HTTP_AUTHORIZATION=f'Bearer {stream_token}'
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_frames_without_orjson(self):
+        with patch('leads.events.orjson', None):
+            frame = encode_frame(7, 'lead.updated', {'name': 'Zoë', 'id': 1})
+        self.assertEqual(frame, 'id: 7\nevent: lead.updated\ndata: {"name":"Zoë","id":1}\n\n'.encode())
+
+    def test_wsgi_replays_missed_events_and_closes(self):
+        event = broker.publish(self.user.pk, 'lead.updated', {'id': 1})
+        response = self.client.get(reverse('leads:lead-events'), HTTP_LAST_EVENT_ID=str(event.id - 1))
+        self.assertEqual(
+            b''.join(response.streaming_content), b'retry: 3000\n\n' + event.frame
+        )
+
+
+class QueryBudgetTests(QueryBudgetMixin, APITestCase):
+    """
+    Query budgets per lead endpoint, on a cold cache with a dozen leads,
+    so a query per row goes over. Streamed exports are only counted up to
+    the first row.
+    """
+    query_budgets = {
+        'GET leads:lead-list-create': 5,
+        'POST leads:lead-list-create': 8,
+        'GET leads:lead-detail': 3,
+        'PATCH leads:lead-detail': 6,
+        'DELETE leads:lead-detail': 8,
+        'leads:update-lead-status': 9,
+        'leads:bulk-update-lead-status': 9,
+        'leads:lead-import': 8,
+        'leads:lead-export': 1,
+        'leads:leads-by-status': 5,
+        'leads:lead-statistics': 2,
+        'leads:lead-events': 1,
+        'leads:lead-events-token': 1,
+    }
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('budget', 'budget@example.com', 'pass12345')
+        cls.leads = [
+            make_lead(cls.user, name=f'Lead {i}', status=status, notes='Call back')
+            for i, status in enumerate(['new_lead', 'lead_sent', 'deal_done'] * 4)
+        ]
+
+    def setUp(self):
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def request(self, method, url, data=None, **kwargs):
+        caches['leads'].clear()
+        caches['users'].clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            return getattr(self.client, method)(url, data, **kwargs)
+
+    def test_every_route_has_a_budget(self):
+        names = {f'leads:{pattern.name}' for pattern in lead_urls.urlpatterns}
+        self.assertEqual(names, {key.split()[-1] for key in self.query_budgets})
+
+    def test_endpoints_stay_within_budget(self):
+        lead = self.leads[0]
+        detail = reverse('leads:lead-detail', args=[lead.pk])
+        upload = SimpleUploadedFile('leads.csv', b'name,phone,email,lead_source\nAnn,+1234567890,a@example.com,website\n')
+        for method, url, data, kwargs in [
+            ('get', reverse('leads:lead-list-create'), None, {}),
+            ('get', reverse('leads:lead-list-create'), {'pagination': 'cursor'}, {}),
+            ('get', reverse('leads:lead-list-create'), {'search': 'lead'}, {}),
+            ('get', reverse('leads:lead-list-create'), {'fields': 'name,created_by_name'}, {}),
+            ('post', reverse('leads:lead-list-create'), {
+                'name': 'New', 'phone': '+1234567890', 'email': 'n@example.com', 'lead_source': 'website',
+            }, {}),
+            ('get', detail, None, {}),
+            ('get', detail, {'fields': 'name,created_by_name'}, {}),
+            ('patch', detail, {'notes': 'Updated'}, {}),
+            ('patch', reverse('leads:update-lead-status', args=[lead.pk]), {'status': 'deal_done'}, {}),
+            ('patch', reverse('leads:bulk-update-lead-status'), {
+                'ids': [lead.pk for lead in self.leads], 'status': 'lead_sent',
+            }, {'format': 'json'}),
+            ('post', reverse('leads:lead-import'), {'file': upload}, {'format': 'multipart'}),
+            ('get', reverse('leads:lead-export'), None, {}),
+            ('get', reverse('leads:leads-by-status'), None, {}),
+            ('get', reverse('leads:lead-statistics'), None, {}),
+            ('get', reverse('leads:lead-events'), None, {}),
+            ('post', reverse('leads:lead-events-token'), None, {}),
+            ('delete', detail, None, {}),
+        ]:
+            with self.subTest(method=method, url=url, data=data):
+                response = self.request(method, url, data, **kwargs)
+                self.assertLess(response.status_code, 300)
+                self.assertQueryBudget(response)
+
+    def test_budget_failure_lists_the_queries(self):
+        response = self.request('get', reverse('leads:lead-detail', args=[self.leads[0].pk]))
+        with self.assertRaises(AssertionError) as failure:
+            self.assertQueryBudget(response, budget=0)
+        self.assertIn('GET leads:lead-detail ran 3 queries, over its budget of 0:\n', str(failure.exception))
+        self.assertIn('1 x SELECT "leads_lead"."id"', str(failure.exception))
+
+
+class RequestMetricsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('metrics', 'metrics@example.com', 'pass12345')
+        for i in range(3):
+            make_lead(cls.user, name=f'Lead {i}')
+
+    def setUp(self):
+        caches['leads'].clear()
+        caches['users'].clear()
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_server_timing_header(self):
+        response = self.client.get(reverse('leads:lead-list-create'))
+        metrics = response.wsgi_request.metrics
+        self.assertEqual(metrics.route, 'leads:lead-list-create')
+        self.assertRegex(
+            response['Server-Timing'],
+            rf'^db;dur=[\d.]+;desc="{metrics.queries} queries", serialize;dur=[\d.]+, '
+            r'render;dur=[\d.]+, total;dur=[\d.]+$'
+        )
+        self.assertGreater(metrics.serialize, 0)
+        self.assertGreater(metrics.render, 0)
+        with override_settings(SERVER_TIMING=False):
+            self.assertNotIn('Server-Timing', self.client.get(reverse('leads:lead-statistics')))
+
+    def test_async_views_are_measured(self):
+        with override_settings(ROOT_URLCONF='leads.test_urls'):
+            response = self.client.get(reverse('leads:lead-list-create'))
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.wsgi_request.metrics.queries, 0)
+
+    @override_settings(N_PLUS_ONE_QUERIES=3)
+    def test_repeated_queries_are_logged(self):
+        url = reverse('leads:lead-list-create')
+        with patch.object(LeadReadSerializer, 'select_rows', lambda queryset, fields=None: queryset), \
+                patch.object(LeadReadSerializer, 'to_representation', lambda self, lead: lead.created_by.username), \
+                self.assertLogs('lead_management.instrumentation', 'WARNING') as logs:
+            self.client.get(url)
+        self.assertIn('Possible N+1 queries in GET leads:lead-list-create: 4 runs of SELECT "auth_user"', logs.output[0])
+        self.assertEqual(logs.records[0].event, 'n_plus_one')
+
+    @override_settings(SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged(self):
+        with self.assertLogs('lead_management.instrumentation', 'WARNING') as logs:
+            self.client.get(reverse('leads:lead-statistics'))
+        record = logs.records[0]
+        self.assertEqual((record.event, record.route, record.status), ('slow_request', 'leads:lead-statistics', 200))
+
+
+class RequestProfilingTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user('staff', 'staff@example.com', 'pass12345', is_staff=True)
+        cls.user = User.objects.create_user('plain', 'plain@example.com', 'pass12345')
+        make_lead(cls.staff, notes='Profiled')
+
+    def setUp(self):
+        caches['leads'].clear()
+        caches['users'].clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(
+            REQUEST_PROFILING=True, REQUEST_PROFILE_DIR=self.directory, REQUEST_PROFILER='cprofile'
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def get(self, user, **kwargs):
+        token = UserClaimsRefreshToken.for_user(user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        return self.client.get(reverse('leads:leads-by-status'), **kwargs)
+
+    def test_staff_requests_are_stored_and_summarized(self):
+        response = self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        profile_id = response['X-Profile-Id']
+        self.assertEqual(
+            sorted(os.listdir(self.directory)), [f'{profile_id}.json', f'{profile_id}.prof']
+        )
+        with open(os.path.join(self.directory, f'{profile_id}.json')) as summary_file:
+            summary = json.load(summary_file)
+        self.assertEqual((summary['route'], summary['status']), ('leads:leads-by-status', 200))
+        self.assertTrue(summary['hot_functions'])
+
+        out = StringIO()
+        call_command('request_profiles', stdout=out)
+        self.assertIn(f'{profile_id}', out.getvalue())
+        self.assertIn('leads:leads-by-status', out.getvalue())
+        out = StringIO()
+        call_command('request_profiles', profile_id, limit=5, stdout=out)
+        self.assertIn('function calls', out.getvalue())
+        with self.assertRaises(CommandError):
+            call_command('request_profiles', 'missing', stdout=StringIO())
+
+    def test_download_returns_the_profile(self):
+        response = self.get(self.staff, data={'profile': 'download'})
+        self.assertIn('attachment;', response['Content-Disposition'])
+        path = os.path.join(self.directory, 'download.prof')
+        with open(path, 'wb') as profile_file:
+            profile_file.write(response.content)
+        self.assertTrue(pstats.Stats(path).stats)
+        self.assertEqual(os.listdir(self.directory), ['download.prof'])
+
+    def test_download_keeps_cors_headers(self):
+        response = self.get(
+            self.staff, data={'profile': 'download'}, HTTP_ORIGIN='http://localhost:3000'
+        )
+        self.assertIn('attachment;', response['Content-Disposition'])
+        self.assertEqual(response['Access-Control-Allow-Origin'], 'http://localhost:3000')
+
+    def test_one_request_is_profiled_at_a_time(self):
+        with profiling._profiling:
+            response = self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('X-Profile-Skipped', response)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_only_staff_can_profile(self):
+        response = self.get(self.user, HTTP_X_PROFILE='1')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_disabled_by_default(self):
+        with override_settings(REQUEST_PROFILING=False):
+            self.client = self.client_class()
+            response = self.get(self.staff, HTTP_X_PROFILE='1')
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+class MetricsTests(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('metered', 'metered@example.com', 'pass12345')
+        make_lead(cls.user, status='deal_done')
+        make_lead(cls.user)
+
+    def setUp(self):
+        caches['leads'].clear()
+        metrics.registry.clear()
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def scrape(self):
+        scraper = self.client_class(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            response = scraper.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode()
+
+    def test_requests_are_recorded(self):
+        for _ in range(2):
+            self.client.get(reverse('leads:leads-by-status'))
+        self.client.get('/api/leads/no-such-page/')
+        text = self.scrape()
+        route = 'route="leads:leads-by-status",method="GET"'
+        self.assertIn(f'http_request_duration_seconds_bucket{{{route},le="+Inf"}} 2\n', text)
+        self.assertIn(f'http_request_duration_seconds_count{{{route}}} 2\n', text)
+        self.assertIn(f'http_responses_total{{{route},status="200"}} 2\n', text)
+        self.assertIn('http_responses_total{route="unmatched",method="GET",status="404"} 1\n', text)
+        self.assertIn('db_queries_per_request_count{route="leads:leads-by-status"} 2\n', text)
+        self.assertIn('# TYPE db_query_duration_seconds histogram\n', text)
+        self.assertIn('lead_cache_requests_total{result="hit"} 1\n', text)
+        self.assertIn('lead_cache_hit_ratio 0.5\n', text)
+        self.assertIn('leads{status="deal_done"} 1\nleads{status="lead_sent"} 0\nleads{status="new_lead"} 1\n', text)
+
+    def test_lead_totals_take_one_query(self):
+        other = User.objects.create_user('metrics-other', 'mo@example.com', 'pass12345')
+        make_lead(other, status='deal_done')
+        with self.assertNumQueries(1):
+            samples = list(metrics.collect_leads({}))
+        self.assertIn((metrics.leads.name, ('deal_done',), 2), samples)
+
+    def test_unknown_methods_share_a_label(self):
+        self.client.generic('PROPFIND', reverse('leads:leads-by-status'))
+        self.client.generic('X-SCAN-1', reverse('leads:leads-by-status'))
+        text = self.scrape()
+        self.assertIn('http_responses_total{route="leads:leads-by-status",method="other",status="405"} 2\n', text)
+        self.assertNotIn('PROPFIND', text)
+
+    def test_histogram_buckets_are_cumulative(self):
+        for value in (0.002, 0.02, 20):
+            metrics.request_duration.observe(value, route='r', method='GET')
+        lines = [line for line in self.scrape().splitlines() if 'route="r"' in line]
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="0.005"} 1', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="0.025"} 2', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="10.0"} 2', lines)
+        self.assertIn('http_request_duration_seconds_bucket{route="r",method="GET",le="+Inf"} 3', lines)
+        self.assertIn('http_request_duration_seconds_sum{route="r",method="GET"} 20.022', lines)
+
+    def test_threads_record_without_sharing_state(self):
+        def work():
+            for _ in range(1000):
+                metrics.login_attempts.inc(outcome='success')
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertIn('login_attempts_total{outcome="success"} 4000\n', self.scrape())
+
+    def test_processes_share_a_directory(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            # Another worker's flushed samples
+            with open(os.path.join(directory, '1.json'), 'w') as other:
+                json.dump([['login_attempts_total', ['failure'], 5]], other)
+            metrics.login_attempts.inc(outcome='failure')
+            text = self.scrape()
+            self.assertIn(f'{os.getpid()}.json', os.listdir(directory))
+        self.assertIn('login_attempts_total{outcome="failure"} 6\n', text)
+
+    def test_token_is_required(self):
+        with override_settings(METRICS_TOKEN='scrape-secret'):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 401)
+        self.assertIn('# TYPE leads gauge', self.scrape())
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        with override_settings(DEBUG=True):
+            self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_ended_threads_are_folded_together(self):
+        for _ in range(5):
+            thread = threading.Thread(target=metrics.login_attempts.inc, kwargs={'outcome': 'success'})
+            thread.start()
+            thread.join()
+        metrics.login_attempts.inc(outcome='success')
+        self.assertIn('login_attempts_total{outcome="success"} 6\n', self.scrape())
+        self.assertTrue(all(thread.is_alive() for thread in metrics.registry._shards))
+
+    def test_samples_are_flushed_without_requests(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(METRICS_DIR=directory, METRICS_FLUSH_INTERVAL=0.01):
+            metrics.login_attempts.inc(outcome='failure')
+            metrics.registry.start_flusher()
+            path = os.path.join(directory, f'{os.getpid()}.json')
+            for _ in range(200):
+                if os.path.exists(path):
+                    break
+                time.sleep(0.01)
+            with open(path) as samples:
+                self.assertIn(['login_attempts_total', ['failure'], 1], json.load(samples))
+
+
+class SeedLeadsTests(TestCase):
+
+    def seed(self, prefix, seed=1):
+        call_command(
+            'seed_leads', users=3, leads=300, prefix=prefix, seed=seed, until='2025-06-01', stdout=StringIO()
+        )
+        return list(
+            Lead.objects.filter(created_by__username__startswith=prefix)
+            .order_by('pk')
+            .values_list('name', 'email', 'status', 'lead_source', 'created_at', 'updated_at')
+        )
+
+    def test_same_seed_gives_same_leads(self):
+        self.assertEqual(self.seed('a'), self.seed('b'))
+        self.assertNotEqual(self.seed('c', seed=2), self.seed('d'))
+
+    def test_leads_are_dated_and_counted(self):
+        leads = self.seed('a')
+        until = datetime(2025, 6, 1, tzinfo=dt_timezone.utc)
+        self.assertTrue(all(
+            until - timedelta(days=365) <= created <= updated <= until for *_, created, updated in leads
+        ))
+        self.assertGreater(sum(1 for lead in leads if lead[2] == 'new_lead'), 100)
+        call_command('rebuild_lead_counters', verify=True, stdout=StringIO())
+
+    def test_existing_users_are_not_reused(self):
+        self.seed('a')
+        with self.assertRaises(CommandError):
+            self.seed('a')
+
+
+@skipUnless(connection.vendor == 'sqlite', 'SQLite profile')
+class SQLiteProfileTests(TestCase):
+
+    def test_connection_pragmas_are_applied(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(
+                cursor.fetchone()[0], settings.DATABASES['default']['OPTIONS']['pragmas']['busy_timeout']
+            )
+
+
+@override_settings(READ_REPLICAS=['replica'])
+class ReadReplicaTests(APITransactionTestCase):
+    """Routing against a second SQLite file standing in for a replica"""
+    # 'replica' only exists once setUpClass has added it
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = {
+            **connections.settings['default'],
+            'NAME': os.path.join(cls.directory.name, 'replica.sqlite3'),
+        }
+        call_command('migrate', database='replica', verbosity=0)
+        # Primary pins must be visible to every process
+        cls.shared_users_cache = override_settings(CACHES={
+            **settings.CACHES,
+            'users': {
+                'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+                'LOCATION': os.path.join(cls.directory.name, 'users'),
+                'KEY_PREFIX': 'users',
+            },
+        })
+        cls.shared_users_cache.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.shared_users_cache.disable()
+        connections['replica'].close()
+        del connections.settings['replica']
+        cls.directory.cleanup()
+
+    def setUp(self):
+        caches['users'].clear()
+        caches['leads'].clear()
+        # The "replicated" user; leads differ so each read shows its source
+        self.user = User.objects.create_user('replica', 'replica@example.com', 'pass12345')
+        User.objects.using('replica').create(
+            pk=self.user.pk, username='replica', email='replica@example.com', password='!'
+        )
+        self.lead = make_lead(self.user, name='On primary')
+        Lead.objects.using('replica').create(
+            created_by_id=self.user.pk, name='On replica', phone='+1234567890',
+            email='r@example.com', lead_source='website',
+        )
+        token = UserClaimsRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.url = reverse('leads:lead-list-create')
+
+    def names(self):
+        return [lead['name'] for lead in self.client.get(self.url).data['results']]
+
+    def test_reads_go_to_the_replica(self):
+        self.assertEqual(self.names(), ['On replica'])
+
+    def test_replica_is_chosen_once_per_request(self):
+        with patch('lead_management.db.routers.random.choice', return_value='replica') as choice:
+            response = self.client.get(self.url)
+        self.assertGreater(response.wsgi_request.metrics.queries, 1)
+        self.assertEqual(choice.call_count, 1)
+
+    def test_process_local_users_cache_is_refused(self):
+        with override_settings(CACHES={
+            **settings.CACHES, 'users': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        }):
+            with self.assertRaises(ImproperlyConfigured):
+                replica_routing_middleware(lambda request: None)
+
+    def test_writer_reads_from_primary_until_the_pin_expires(self):
+        response = self.client.patch(
+            reverse('leads:update-lead-status', args=[self.lead.pk]), {'status': 'deal_done'}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.names(), ['On primary'])
+        caches['users'].clear()
+        self.assertEqual(self.names(), ['On replica'])
@@ -1,17 +1,41 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 
 app_name = 'leads'
 
+if settings.LEAD_ASYNC_VIEWS:
+    # Async read and status endpoints for ASGI deployments
+    lead_list_create = async_views.lead_list_create
+    lead_detail = async_views.lead_detail
+    update_lead_status = async_views.update_lead_status
+    leads_by_status = async_views.leads_by_status
+    lead_statistics = async_views.lead_statistics
+else:
+    lead_list_create = views.LeadListCreateView.as_view()
+    lead_detail = views.LeadDetailView.as_view()
+    update_lead_status = views.update_lead_status
+    leads_by_status = views.leads_by_status
+    lead_statistics = views.lead_statistics
+
 urlpatterns = [
     # Lead CRUD operations
-    path('', views.LeadListCreateView.as_view(), name='lead-list-create'),
-    path('<int:pk>/', views.LeadDetailView.as_view(), name='lead-detail'),
+    path('', lead_list_create, name='lead-list-create'),
+    path('<int:pk>/', lead_detail, name='lead-detail'),
+    
+    # Bulk operations
+    path('import/', views.import_leads_view, name='lead-import'),
+    path('export/', views.export_leads, name='lead-export'),
+    path('bulk-status/', views.bulk_update_lead_status, name='bulk-update-lead-status'),
     
     # Status update endpoint
-    path('<int:pk>/status/', views.update_lead_status, name='update-lead-status'),
+    path('<int:pk>/status/', update_lead_status, name='update-lead-status'),
     
     # Dashboard endpoints
-    path('by-status/', views.leads_by_status, name='leads-by-status'),
-    path('statistics/', views.lead_statistics, name='lead-statistics'),
+    path('by-status/', leads_by_status, name='leads-by-status'),
+    path('statistics/', lead_statistics, name='lead-statistics'),
+    
+    # Live lead changes (Server-Sent Events)
+    path('events/', async_views.lead_events, name='lead-events'),
+    path('events/token/', views.lead_events_token, name='lead-events-token'),
 ] 
\ No newline at end of file
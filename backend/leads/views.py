@@ -2,38 +2,153 @@ from django.shortcuts import render
 from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.decorators import api_view, permission_classes
-from django.db.models import Q
-from .models import Lead
-from .serializers import LeadSerializer, LeadStatusUpdateSerializer
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
+from rest_framework.settings import api_settings
+from collections import Counter
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Count
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.urls import reverse
+from authentication.tokens import EventStreamToken
+from .models import Lead, LeadCounter, build_statistics
+from .serializers import (
+    LIST_DEFERRED_FIELDS, LeadBulkStatusUpdateSerializer, LeadReadSerializer, LeadSerializer,
+    LeadStatusUpdateSerializer, lead_columns, requested_fields,
+)
+from .pagination import LeadCursorPagination
+from .search import get_search_backend
+from .importers import FORMATS, detect_format, import_leads
+from .exporters import EXPORT_FIELDS, STREAMERS
+from .renderers import CSVRenderer, NDJSONRenderer
+from .conditional import conditional_lead_view, get_lead_counter
+from .caching import cached_lead_view
+from .delta import SINCE_PARAM, changes_since, get_page_size as get_sync_page_size
+from .events import publish_lead_event
+
+
+def filter_leads(queryset, status=None, search=None, include_notes=False):
+    """Apply the shared lead list filters (status and search) to ``queryset``"""
+    if status:
+        queryset = queryset.filter(status=status)
+    
+    # Search functionality (see leads.search), notes only on request
+    if search:
+        queryset = get_search_backend(queryset.db).search(queryset, search, include_notes)
+    
+    return queryset
+
+
+def fields_query_string(request):
+    """
+    The request's ?fields=/?exclude= choice, to carry over into links to
+    the lead list. Without one, an empty ?exclude= keeps the fields the
+    list would otherwise defer (LIST_DEFERRED_FIELDS).
+    """
+    params = {
+        param: request.query_params[param]
+        for param in ('fields', 'exclude') if param in request.query_params
+    }
+    return f'&{urlencode(params or {"exclude": ""})}'
+
+
+def select_lead_fields(queryset, fields):
+    """Load only the columns LeadSerializer needs to output ``fields``"""
+    columns = lead_columns(fields)
+    if 'created_by__username' in columns:
+        queryset = queryset.select_related('created_by')
+    return queryset.only(*columns)
 
 
 class LeadListCreateView(generics.ListCreateAPIView):
     """
     GET: List all leads for the authenticated user
     POST: Create a new lead
+    
+    Pass ?pagination=cursor (or a ?cursor= from a previous page) to use
+    keyset pagination instead of the default page numbers.
     """
     serializer_class = LeadSerializer
     permission_classes = [IsAuthenticated]
     
+    # Accepted ?ordering= values. Each one matches a composite index in
+    # Lead.Meta.indexes (descending variants scan the index backwards),
+    # with ``id`` as a tie-breaker so pages are stable.
+    ORDERINGS = {
+        'created_at': ['created_at', 'id'],
+        '-created_at': ['-created_at', '-id'],
+        'updated_at': ['updated_at', 'id'],
+        '-updated_at': ['-updated_at', '-id'],
+        'name': ['name', 'id'],
+        '-name': ['-name', '-id'],
+    }
+    
+    @property
+    def uses_cursor(self):
+        params = self.request.query_params
+        return params.get('pagination') == 'cursor' or 'cursor' in params
+    
+    @property
+    def pagination_class(self):
+        if self.uses_cursor:
+            return LeadCursorPagination
+        return api_settings.DEFAULT_PAGINATION_CLASS
+    
     def get_queryset(self):
-        queryset = Lead.objects.filter(created_by=self.request.user)
+        params = self.request.query_params
+        search = params.get('search', None)
+        queryset = filter_leads(
+            Lead.objects.filter(created_by=self.request.user),
+            status=params.get('status', None),
+            search=search,
+            include_notes=params.get('search_notes') in ('1', 'true'),
+        )
         
-        # Filter by status if provided
-        status_filter = self.request.query_params.get('status', None)
-        if status_filter:
-            queryset = queryset.filter(status=status_filter)
+        # Ordering, restricted to index-backed sort keys. Searches rank by
+        # relevance unless an ordering is given or keyset pagination needs
+        # a stable sort key.
+        ordering = self.request.query_params.get('ordering', None)
+        if search and not ordering and not self.uses_cursor:
+            queryset = queryset.order_by('-search_rank', *Lead._meta.ordering)
+        elif ordering:
+            if ordering not in self.ORDERINGS:
+                raise ValidationError({
+                    'ordering': [f"Ordering must be one of: {', '.join(self.ORDERINGS)}"]
+                })
+            queryset = queryset.order_by(*self.ORDERINGS[ordering])
         
-        # Search functionality
-        search = self.request.query_params.get('search', None)
-        if search:
-            queryset = queryset.filter(
-                Q(name__icontains=search) |
-                Q(email__icontains=search) |
-                Q(phone__icontains=search)
+        return queryset
+    
+    @method_decorator(conditional_lead_view)
+    @method_decorator(cached_lead_view)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+    
+    def list(self, request, *args, **kwargs):
+        if SINCE_PARAM in request.query_params:
+            data = changes_since(
+                request.user, request.query_params[SINCE_PARAM], get_sync_page_size(request)
             )
+            return Response({'success': True, 'data': data})
         
-        return queryset
+        # Serialize flat values() rows rather than model instances, selecting
+        # only the columns behind the requested fields
+        fields = requested_fields(request, default_exclude=LIST_DEFERRED_FIELDS)
+        queryset = LeadReadSerializer.select_rows(
+            self.filter_queryset(self.get_queryset()), fields
+        )
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(
+                LeadReadSerializer(page, many=True, fields=fields).data
+            )
+        return Response(LeadReadSerializer(queryset, many=True, fields=fields).data)
     
     def create(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -67,7 +182,22 @@ class LeadDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     
     def get_queryset(self):
-        return Lead.objects.filter(created_by=self.request.user)
+        # created_by_name would otherwise load the user in a second query
+        return Lead.objects.filter(created_by=self.request.user).select_related('created_by')
+    
+    @method_decorator(conditional_lead_view)
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
+    
+    def retrieve(self, request, *args, **kwargs):
+        fields = requested_fields(request)
+        if fields is None:
+            return super().retrieve(request, *args, **kwargs)
+        
+        queryset = select_lead_fields(self.get_queryset().select_related(None), fields)
+        instance = generics.get_object_or_404(queryset, pk=kwargs['pk'])
+        self.check_object_permissions(request, instance)
+        return Response(LeadSerializer(instance, fields=fields).data)
     
     def update(self, request, *args, **kwargs):
         partial = kwargs.pop('partial', False)
@@ -111,7 +241,7 @@ def update_lead_status(request, pk):
     Update only the status of a lead
     """
     try:
-        lead = Lead.objects.get(pk=pk, created_by=request.user)
+        lead = Lead.objects.select_related('created_by').get(pk=pk, created_by=request.user)
     except Lead.DoesNotExist:
         return Response(
             {
@@ -145,37 +275,225 @@ def update_lead_status(request, pk):
     )
 
 
+@api_view(['PATCH'])
+@permission_classes([IsAuthenticated])
+def bulk_update_lead_status(request):
+    """
+    Move many leads to one status with a set-based UPDATE
+    
+    Accepts either ``ids`` or a ``filter`` ({"status", "search"}) plus the
+    target ``status``. Leads already in that status are left untouched.
+    """
+    serializer = LeadBulkStatusUpdateSerializer(data=request.data)
+    if not serializer.is_valid():
+        return Response(
+            {
+                'success': False,
+                'message': 'Failed to update lead status',
+                'errors': serializer.errors
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    target = serializer.validated_data['status']
+    ids = serializer.validated_data.get('ids')
+    queryset = Lead.objects.filter(created_by=request.user)
+    if ids is None:
+        batches = [filter_leads(queryset, **serializer.validated_data['filter'])]
+    else:
+        # Split only where the backend limits query parameters
+        ops = connections[router.db_for_write(Lead)].ops
+        batch_size = ops.bulk_batch_size(['id'], ids) or 1
+        batches = [
+            queryset.filter(id__in=ids[start:start + batch_size])
+            for start in range(0, len(ids), batch_size)
+        ]
+    
+    with transaction.atomic(using=router.db_for_write(Lead)):
+        # The old statuses are read first, for the counters and the event;
+        # the rows stay locked until the UPDATE
+        rows = []
+        for batch in batches:
+            rows.extend(
+                batch.exclude(status=target).order_by()
+                .select_for_update().values_list('id', 'status', 'lead_source')
+            )
+        updated_ids = [row[0] for row in rows]
+        if updated_ids:
+            now = timezone.now()
+            for batch in batches:
+                batch.exclude(status=target).update(status=target, updated_at=now)
+        
+        # QuerySet.update() skips the signal handlers that maintain counters
+        deltas = Counter()
+        for lead_id, old_status, source in rows:
+            deltas[(old_status, source)] -= 1
+            deltas[(target, source)] += 1
+        counter = LeadCounter.apply(request.user.pk, deltas)
+        if updated_ids:
+            publish_lead_event(request.user.pk, 'leads.status_changed', {
+                'ids': updated_ids,
+                'status': target,
+            })
+    
+    if counter is None:
+        counter = LeadCounter.objects.filter(pk=request.user.pk).first()
+    stats = (
+        counter.as_statistics() if counter is not None
+        else build_statistics(**LeadCounter.count_leads(request.user.pk))
+    )
+    
+    return Response(
+        {
+            'success': True,
+            'message': f'{len(updated_ids)} leads updated successfully',
+            'data': {
+                'status': target,
+                'updated_count': len(updated_ids),
+                'updated_ids': updated_ids,
+                'statistics': stats,
+            }
+        }
+    )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([MultiPartParser])
+def import_leads_view(request):
+    """
+    Bulk import leads from an uploaded CSV or NDJSON ``file``
+    
+    The format comes from a ``format`` form field, or else from the file
+    name or content type. Valid rows are created in batches; invalid
+    rows are reported per row and skipped.
+    """
+    upload = request.FILES.get('file')
+    if upload is None:
+        return Response(
+            {
+                'success': False,
+                'message': 'Failed to import leads',
+                'errors': {'file': ['This field is required.']}
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    fmt = request.data.get('format') or detect_format(upload.name, upload.content_type)
+    if fmt not in FORMATS:
+        return Response(
+            {
+                'success': False,
+                'message': 'Failed to import leads',
+                'errors': {'format': [f"Format must be one of: {', '.join(FORMATS)}"]}
+            },
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    result = import_leads(upload.file, fmt, request.user)
+    return Response(
+        {
+            'success': True,
+            'message': f"Imported {result['created']} leads, {result['failed']} rows failed",
+            'data': result
+        },
+        status=status.HTTP_201_CREATED if result['created'] else status.HTTP_200_OK
+    )
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+@renderer_classes([CSVRenderer, NDJSONRenderer])
+def export_leads(request):
+    """
+    Stream all of the user's leads as CSV (default) or NDJSON
+    
+    Pick the format with ?format=csv|ndjson or the Accept header. Takes
+    the same status/search filters as the lead list, and ?fields= or
+    ?exclude= to choose the columns.
+    """
+    params = request.query_params
+    queryset = filter_leads(
+        Lead.objects.filter(created_by=request.user),
+        status=params.get('status', None),
+        search=params.get('search', None),
+        include_notes=params.get('search_notes') in ('1', 'true'),
+    )
+    
+    fields = requested_fields(request, available=EXPORT_FIELDS) or EXPORT_FIELDS
+    
+    fmt = request.accepted_renderer.format
+    response = StreamingHttpResponse(
+        STREAMERS[fmt](queryset, fields), content_type=request.accepted_renderer.media_type
+    )
+    response['Content-Disposition'] = f'attachment; filename="leads.{fmt}"'
+    return response
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_lead_view
+@cached_lead_view
 def leads_by_status(request):
     """
     Get leads grouped by status for the dashboard
+    
+    Each column holds at most ?limit= leads (default PAGE_SIZE) and a
+    ``next`` cursor link into the lead list for loading more. The summary
+    comes from one grouped COUNT, so the number of queries is fixed.
+    Columns are serialized from values() rows with the creator joined in.
     """
+    try:
+        limit = int(request.query_params.get('limit', api_settings.PAGE_SIZE))
+    except ValueError:
+        limit = api_settings.PAGE_SIZE
+    limit = max(1, min(limit, LeadCursorPagination.max_page_size))
+    
+    # The dashboard cards show notes, so they are not deferred here
+    fields = requested_fields(request)
     user_leads = Lead.objects.filter(created_by=request.user)
+    counts = dict(
+        user_leads.order_by().values_list('status').annotate(total=Count('id'))
+    )
     
-    leads_data = {
-        'new_lead': [],
-        'lead_sent': [],
-        'deal_done': []
-    }
+    leads_data = {}
+    pagination = {}
+    list_url = request.build_absolute_uri(reverse('leads:lead-list-create'))
+    fields_query = fields_query_string(request)
     
     for status_key, status_label in Lead.STATUS_CHOICES:
-        leads = user_leads.filter(status=status_key)
-        serializer = LeadSerializer(leads, many=True)
-        leads_data[status_key] = serializer.data
+        leads = []
+        if counts.get(status_key):
+            column = LeadReadSerializer.select_rows(user_leads.filter(status=status_key), fields)
+            leads = list(column[:limit + 1])
+        
+        next_link = None
+        if len(leads) > limit:
+            leads = leads[:limit]
+            column_url = (
+                f'{list_url}?status={status_key}&pagination=cursor&page_size={limit}{fields_query}'
+            )
+            next_link = LeadCursorPagination().get_link_after(column_url, leads[-1])
+        
+        leads_data[status_key] = LeadReadSerializer(leads, many=True, fields=fields).data
+        pagination[status_key] = {
+            'count': counts.get(status_key, 0),
+            'next': next_link,
+        }
     
     # Calculate summary statistics
     summary = {
-        'total_leads': user_leads.count(),
-        'new_leads': user_leads.filter(status='new_lead').count(),
-        'leads_sent': user_leads.filter(status='lead_sent').count(),
-        'deals_done': user_leads.filter(status='deal_done').count(),
+        'total_leads': sum(counts.values()),
+        'new_leads': counts.get('new_lead', 0),
+        'leads_sent': counts.get('lead_sent', 0),
+        'deals_done': counts.get('deal_done', 0),
     }
     
     return Response(
         {
             'success': True,
             'data': leads_data,
+            'pagination': pagination,
             'summary': summary
         }
     )
@@ -183,25 +501,20 @@ def leads_by_status(request):
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
+@conditional_lead_view
 def lead_statistics(request):
     """
     Get lead statistics for dashboard
-    """
-    user_leads = Lead.objects.filter(created_by=request.user)
-    
-    stats = {
-        'total_leads': user_leads.count(),
-        'new_leads': user_leads.filter(status='new_lead').count(),
-        'leads_sent': user_leads.filter(status='lead_sent').count(),
-        'deals_done': user_leads.filter(status='deal_done').count(),
-        'conversion_rate': 0,
-    }
     
-    # Calculate conversion rate (deals done / total leads * 100)
-    if stats['total_leads'] > 0:
-        stats['conversion_rate'] = round(
-            (stats['deals_done'] / stats['total_leads']) * 100, 2
-        )
+    Served from the user's LeadCounter row (one primary-key lookup), or from
+    a single aggregation query when the counters have not been built yet.
+    """
+    counter = get_lead_counter(request)
+    if counter is not None:
+        stats = counter.as_statistics()
+    else:
+        counts = LeadCounter.count_leads(request.user.pk)
+        stats = build_statistics(**counts)
     
     return Response(
         {
@@ -209,3 +522,25 @@ def lead_statistics(request):
             'data': stats
         }
     )
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def lead_events_token(request):
+    """
+    Issue a short-lived token for opening the lead event stream
+    
+    Pass it to /api/leads/events/ as ``?stream_token=``. It is good for
+    LEAD_EVENTS_TOKEN_SECONDS and for nothing else, so logs that record
+    the stream URL do not hold a usable access token.
+    """
+    token = EventStreamToken.for_user(request.user)
+    return Response(
+        {
+            'success': True,
+            'data': {
+                'token': str(token),
+                'expires_in': settings.LEAD_EVENTS_TOKEN_SECONDS,
+            }
+        }
+    )